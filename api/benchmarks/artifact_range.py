@@ -0,0 +1,163 @@
+"""
+Time-to-first-byte of seeks into an artifact, served from storage or from
+the local disk cache.
+
+A minimal S3 stand-in serves a generated object with an artificial latency
+per request in place of MinIO. Run from the `api` directory:
+
+    PYTHONPATH=. python benchmarks/artifact_range.py --size 8 --seeks 200 --latency 5
+
+Each seek requests `bytes=N-` at a random offset like a scrubbing player,
+reads `--read` bytes and drops the connection.
+"""
+import os
+import sys
+import time
+import random
+import hashlib
+import logging
+import argparse
+import tempfile
+import threading
+import statistics
+import http.client
+
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BUCKET = "task-storage"
+KEY = "benchmark-run/instrumental.mp3"
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Answers the few S3 calls made by the storage client for one object.
+    """
+    protocol_version = "HTTP/1.1"
+    data = b""
+    etag = ""
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_object_headers(self, length: int) -> None:
+        self.send_header("Content-Length", str(length))
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("ETag", f'"{self.etag}"')
+        self.send_header("Last-Modified", formatdate(usegmt=True))
+        self.end_headers()
+
+    def do_HEAD(self):
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_object_headers(len(self.data))
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        if "location" in self.path:
+            body = b'<LocationConstraint xmlns="http://s3.amazonaws.com/doc/2006-03-01/">us-east-1</LocationConstraint>'
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            return
+        start, end = 0, len(self.data) - 1
+        range_header = self.headers.get("Range")
+        if range_header:
+            first, _, last = range_header.removeprefix("bytes=").partition("-")
+            start = int(first)
+            end = min(int(last), end) if last else end
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(self.data)}")
+        else:
+            self.send_response(200)
+        self.send_object_headers(end - start + 1)
+        try:
+            self.wfile.write(self.data[start:end + 1])
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Seeks drop their connection before the whole range is read
+        pass
+
+def serve(server) -> int:
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server.server_address[1]
+
+def seek(port: int, offset: int, read: int) -> tuple[float, float]:
+    """
+    Returns the time to the first byte and to `read` bytes of a seek.
+    """
+    conn = http.client.HTTPConnection("127.0.0.1", port)
+    started = time.perf_counter()
+    conn.request("GET", f"/artifact/{BUCKET}/{KEY}", headers={"Range": f"bytes={offset}-"})
+    response = conn.getresponse()
+    if response.status != 206:
+        raise RuntimeError(f"Unexpected status {response.status}")
+    response.read(1)
+    first_byte = time.perf_counter() - started
+    response.read(read - 1)
+    total = time.perf_counter() - started
+    conn.close()
+    return first_byte, total
+
+def report(name: str, samples: list[tuple[float, float]]) -> None:
+    first_bytes = sorted(sample[0] * 1000 for sample in samples)
+    totals = [sample[1] * 1000 for sample in samples]
+    p95 = first_bytes[int(len(first_bytes) * 0.95) - 1]
+    print(
+        f"{name:<24} ttfb median {statistics.median(first_bytes):7.2f}ms  p95 {p95:7.2f}ms  "
+        f"read median {statistics.median(totals):7.2f}ms"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of artifact range requests.')
+    parser.add_argument('--size', type=float, default=8, help='Artifact size in MiB')
+    parser.add_argument('--seeks', type=int, default=200, help='Range requests per configuration')
+    parser.add_argument('--read', type=int, default=256 * 1024, help='Bytes read per seek')
+    parser.add_argument('--latency', type=float, default=5, help='Stand-in latency per request in ms')
+    parser.add_argument('--chunk-sizes', type=int, nargs='+', default=[64 * 1024, 256 * 1024, 1024 * 1024])
+    args = parser.parse_args()
+
+    StandInHandler.data = random.randbytes(int(args.size * 1024 ** 2))
+    StandInHandler.etag = hashlib.md5(StandInHandler.data).hexdigest()
+    StandInHandler.latency = args.latency / 1000
+    storage_port = serve(StandInServer(("127.0.0.1", 0), StandInHandler))
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+
+    os.environ["STORAGE__ENDPOINT"] = f"127.0.0.1:{storage_port}"
+    from flask import Flask
+    from werkzeug.serving import make_server
+    from server.airflow import Storage, ArtifactCache
+    from server.blueprints.artifact import artifact_bp
+    from server.config import config
+
+    offsets = [random.randrange(0, len(StandInHandler.data) - args.read) for _ in range(args.seeks)]
+    print(f"{args.seeks} seeks into {args.size} MiB, reading {args.read} bytes, {args.latency}ms storage latency")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for cached in (False, True):
+            for chunk_size in args.chunk_sizes:
+                config.artifact.chunk_size = chunk_size
+                app = Flask(__name__)
+                app.register_blueprint(artifact_bp, url_prefix='/artifact')
+                app.storage = Storage() # type: ignore
+                app.artifactCache = ArtifactCache( # type: ignore
+                    app.storage, cache_dir, max_bytes=(1024 ** 3 if cached else 0), stat_ttl=300
+                )
+                server = make_server("127.0.0.1", 0, app, threaded=True)
+                port = serve(server)
+                # Warm the stat and disk caches
+                seek(port, 0, args.read)
+                report(
+                    f"{'cache' if cached else 'storage'} {chunk_size // 1024}KiB",
+                    [seek(port, offset, args.read) for offset in offsets]
+                )
+                server.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
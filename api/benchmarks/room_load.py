@@ -0,0 +1,320 @@
+"""
+Load of many karaoke rooms on the `/ktv` namespace, to size deployments.
+
+Starts `--workers` gevent server processes running `RoomNamespace`, then
+connects `--rooms` x `--clients` Socket.IO clients over websockets, spread
+over the workers. Every client joins its room and then sends controller
+actions, and sometimes full syncs, at `--rate` per second for `--duration`
+seconds. Run from the `api` directory:
+
+    PYTHONPATH=. python benchmarks/room_load.py --rooms 20 --clients 10 --rate 2
+
+Without `--redis` a single worker keeps the rooms in fakeredis and
+broadcasts in process. With `--redis redis://localhost:6379/15` the
+workers share that Redis as room store and Socket.IO message queue the way
+`prepare_websocket_environment` configures them, so broadcasts cross
+workers. The database is flushed first.
+
+Reported are the client side latencies of joins, full syncs and action
+acknowledgements, the spread between the first and the last member of a
+room receiving the same update, and the CPU time of the server processes
+(read from /proc) per action and per delivered message.
+"""
+from gevent import monkey
+monkey.patch_all()
+
+import os
+import sys
+import time
+import uuid
+import random
+import socket
+import logging
+import argparse
+import threading
+import subprocess
+
+SONGS_PER_ROOM = 50
+# Share of the client operations that are full syncs instead of actions
+SYNC_RATIO = 0.05
+ACTION_WEIGHTS = {
+    "UPDATE_METADATA": 0.6,
+    "PLAY_NEXT": 0.25,
+    "REMOVE_SONG": 0.1,
+    "SKIP_TO": 0.05
+}
+
+def get_room_id(index: int) -> str:
+    return f"bench-{index}"
+
+def serve(args) -> int:
+    """
+    Runs one server worker until it is terminated.
+    """
+    from flask import Flask
+    from flask_socketio import SocketIO
+    from redis import Redis
+    from server.config import config
+    from server.datatype import QueueItem, QueueType
+    from server.websocket.room import RoomManager, RoomNamespace
+
+    if args.redis:
+        redis = Redis.from_url(args.redis, decode_responses=True)
+    else:
+        import fakeredis
+        redis = fakeredis.FakeRedis(decode_responses=True)
+    config.room.batch_window = args.batch_window
+
+    app = Flask(__name__)
+    socketio = SocketIO(
+        app, path=config.server.socketio_path,
+        message_queue=args.redis or None, async_mode='gevent'
+    )
+    manager = RoomManager(redis)
+    socketio.on_namespace(RoomNamespace(manager))
+
+    if args.seed:
+        for index in range(args.rooms):
+            room_id = get_room_id(index)
+            for i in range(SONGS_PER_ROOM):
+                manager.add_song_to_queue(room_id, QueueItem(QueueType.YOUTUBE, f"video{i}", f"Song {i}", "Benchmark"))
+    socketio.run(app, host="127.0.0.1", port=args.port, log_output=False)
+    return 0
+
+def get_cpu_time(pid: int) -> float:
+    with open(f"/proc/{pid}/stat") as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    # utime and stime, fields 14 and 15 of stat(5)
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+def wait_for_port(port: int, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+def get_free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.joins: list[float] = []
+        self.syncs: list[float] = []
+        self.acks: list[float] = []
+        self.errors = 0
+        self.actions = 0
+        # (room, version) -> [first receipt, last receipt, receipts]
+        self.deliveries: dict[tuple[str, int], list] = {}
+
+    def delivered(self, room_id: str, version: int) -> None:
+        now = time.perf_counter()
+        with self.lock:
+            delivery = self.deliveries.get((room_id, version))
+            if delivery is None:
+                self.deliveries[(room_id, version)] = [now, now, 1]
+            else:
+                delivery[1] = now
+                delivery[2] += 1
+
+class BenchClient:
+    def __init__(self, url: str, path: str, room_id: str, stats: Stats, rng: random.Random):
+        import socketio
+        self.url = url
+        self.path = path
+        self.room_id = room_id
+        self.stats = stats
+        self.rng = rng
+        # Item IDs of the playlist received on join, the target of playlist actions
+        self.song_ids: list[str] = []
+        self.sio = socketio.Client(reconnection=False)
+        self.sync_started: float | None = None
+        self.pending: dict[str, float] = {}
+        self.joined = threading.Event()
+        self.sio.on('update', self.on_update, namespace='/ktv')
+        self.sio.on('action_response', self.on_action_response, namespace='/ktv')
+
+    def on_update(self, data: dict) -> None:
+        if data.get('target') == 'sync':
+            self.song_ids = [record['id'] for record in data['item']['playlist']] or self.song_ids
+            if self.sync_started is not None:
+                elapsed = time.perf_counter() - self.sync_started
+                self.sync_started = None
+                (self.stats.syncs if self.joined.is_set() else self.stats.joins).append(elapsed)
+            self.joined.set()
+            return
+        self.stats.delivered(self.room_id, data['version'])
+
+    def on_action_response(self, data: dict) -> None:
+        started = self.pending.pop(data['request_id'], None)
+        if data['status'] != 'ok':
+            self.stats.errors += 1
+        elif started is not None:
+            self.stats.acks.append(time.perf_counter() - started)
+
+    def join(self) -> None:
+        self.sio.connect(self.url, namespaces=['/ktv'], transports=['websocket'], socketio_path=self.path)
+        self.sync_started = time.perf_counter()
+        self.sio.emit('join', (self.room_id, None), namespace='/ktv')
+
+    def send(self) -> None:
+        if self.rng.random() < SYNC_RATIO:
+            if self.sync_started is None:
+                self.sync_started = time.perf_counter()
+                self.sio.emit('sync', (self.room_id, None), namespace='/ktv')
+            return
+        action_type = self.rng.choices(list(ACTION_WEIGHTS), weights=list(ACTION_WEIGHTS.values()))[0]
+        if not self.song_ids:
+            action_type = "UPDATE_METADATA"
+        if action_type == "UPDATE_METADATA":
+            payload = {"volume": self.rng.randint(0, 100)}
+        else:
+            payload = {"item_id": self.rng.choice(self.song_ids)}
+        request_id = uuid.uuid4().hex
+        self.pending[request_id] = time.perf_counter()
+        self.stats.actions += 1
+        self.sio.emit('action', {
+            "room_id": self.room_id,
+            "type": action_type,
+            "payload": payload,
+            "request_id": request_id
+        }, namespace='/ktv')
+
+    def run(self, duration: float, rate: float) -> None:
+        deadline = time.perf_counter() + duration
+        while True:
+            time.sleep(self.rng.expovariate(rate))
+            if time.perf_counter() >= deadline:
+                return
+            self.send()
+
+def report(label: str, values: list[float]) -> None:
+    print(
+        f"  {label:<8} p50 {percentile(values, 0.5) * 1000:8.2f}ms"
+        f"  p99 {percentile(values, 0.99) * 1000:8.2f}ms  ({len(values)})"
+    )
+
+def run(args) -> int:
+    from server.config import config
+
+    if args.redis:
+        from redis import Redis
+        Redis.from_url(args.redis).flushdb()
+    elif args.workers > 1:
+        print("Several workers need a shared Redis, pass --redis", file=sys.stderr)
+        return 1
+
+    ports = [get_free_port() for _ in range(args.workers)]
+    workers = []
+    for i, port in enumerate(ports):
+        command = [
+            sys.executable, __file__, "serve", "--port", str(port),
+            "--rooms", str(args.rooms), "--batch-window", str(args.batch_window)
+        ]
+        if args.redis:
+            command += ["--redis", args.redis]
+        if i == 0:
+            command.append("--seed")
+        workers.append(subprocess.Popen(command))
+    try:
+        for port in ports:
+            wait_for_port(port, timeout=30)
+
+        stats = Stats()
+        clients = [
+            BenchClient(
+                f"http://127.0.0.1:{ports[(room * args.clients + i) % len(ports)]}",
+                config.server.socketio_path, get_room_id(room), stats, random.Random(room * args.clients + i)
+            )
+            for room in range(args.rooms)
+            for i in range(args.clients)
+        ]
+        for client in clients:
+            client.join()
+        for client in clients:
+            if not client.joined.wait(30):
+                raise RuntimeError(f"Client of {client.room_id} did not receive its room")
+
+        cpu_started = sum(get_cpu_time(worker.pid) for worker in workers)
+        client_cpu_started = time.process_time()
+        started = time.perf_counter()
+        threads = [threading.Thread(target=client.run, args=(args.duration, args.rate)) for client in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        # Let in-flight acknowledgements and broadcasts arrive
+        time.sleep(max(1, args.batch_window * 4))
+        wall = time.perf_counter() - started
+        cpu = sum(get_cpu_time(worker.pid) for worker in workers) - cpu_started
+        client_cpu = time.process_time() - client_cpu_started
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait()
+
+    updates = len(stats.deliveries)
+    delivered = sum(delivery[2] for delivery in stats.deliveries.values())
+    spreads = [delivery[1] - delivery[0] for delivery in stats.deliveries.values() if delivery[2] > 1]
+    print(
+        f"{args.rooms} rooms x {args.clients} clients on {args.workers} worker(s), "
+        f"{'redis' if args.redis else 'fakeredis'}, batch window {args.batch_window * 1000:.0f}ms, "
+        f"{args.rate}/s per client for {args.duration}s"
+    )
+    report("join", stats.joins)
+    report("sync", stats.syncs)
+    report("ack", stats.acks)
+    report("fan-out", spreads)
+    print(
+        f"  {stats.actions} actions ({stats.actions / elapsed:.0f}/s), {stats.errors} errors, "
+        f"{len(stats.acks)} acknowledged, {stats.actions - len(stats.acks) - stats.errors} unanswered"
+    )
+    print(
+        f"  {updates} updates broadcast, {delivered} delivered "
+        f"({delivered / updates if updates else 0:.1f} per update, {delivered / elapsed:.0f}/s)"
+    )
+    print(
+        f"  server CPU {cpu:.2f}s ({cpu / wall:.0%} of one core), "
+        f"{cpu / max(stats.actions, 1) * 1000:.3f}ms per action, "
+        f"{cpu / max(delivered, 1) * 1e6:.0f}us per delivered message"
+    )
+    # Latencies include the clients' own queueing once they saturate a core
+    print(f"  client CPU {client_cpu:.2f}s ({client_cpu / wall:.0%} of one core)")
+    return 0
+
+def main():
+    parser = argparse.ArgumentParser(description='Load benchmark of the /ktv Socket.IO namespace.')
+    parser.add_argument('mode', nargs='?', choices=['run', 'serve'], default='run', help=argparse.SUPPRESS)
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--clients', type=int, default=10, help='Clients per room')
+    parser.add_argument('--rate', type=float, default=2, help='Operations per second of each client')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds of traffic')
+    parser.add_argument('--workers', type=int, default=1, help='Server processes, more than one needs --redis')
+    parser.add_argument('--redis', help='Redis URL used as room store and message queue, flushed first')
+    parser.add_argument('--batch-window', type=float, default=0.05, help='Seconds actions of a room are coalesced')
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--seed', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    if args.mode == 'serve':
+        return serve(args)
+    return run(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
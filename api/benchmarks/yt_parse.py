@@ -0,0 +1,113 @@
+"""
+Parse time and peak memory of YouTube search result pages, comparing the
+original full `ytInitialData` parse with `parse_search_results`.
+
+Run from the `api` directory with saved result pages:
+
+    PYTHONPATH=. python benchmarks/yt_parse.py page1.html page2.html
+
+Without pages a synthetic page of `--videos` results is generated, padded
+with unrelated data the way real pages carry navigation and tracking data.
+"""
+import sys
+import json
+import time
+import argparse
+import statistics
+import tracemalloc
+
+from typing import Callable
+from server.youtube import parse_search_results
+
+def legacy_parse_search_results(text: str) -> list:
+    """
+    The parser before the results section was decoded on its own.
+    """
+    results = []
+    key = "ytInitialData"
+    start = text.index(key) + len(key) + 3
+    end = text.index('</script>', start)
+    ytInitialData = text[start:end].strip()[:-1] # remove ; at the end
+    json_data = json.loads(ytInitialData)
+    for contents in json_data["contents"]["twoColumnSearchResultsRenderer"]["primaryContents"]["sectionListRenderer"]["contents"]:
+        if "itemSectionRenderer" not in contents.keys():
+            continue
+        for video in contents["itemSectionRenderer"]["contents"]:
+            res = {}
+            if "videoRenderer" in video.keys():
+                video_data = video.get("videoRenderer", {})
+                res["id"] = video_data.get("videoId", None)
+                res["thumbnail"] = video_data.get("thumbnail", {}).get("thumbnails", [{}])[0].get("url", None)
+                res["title"] = video_data.get("title", {}).get("runs", [{}])[0].get("text", '')
+                res["long_desc"] = ''.join([r.get("text", '') for r in video_data.get("detailedMetadataSnippets", [{}])[0].get("snippetText", {}).get("runs", [{}])])
+                res["channel"] = video_data.get("longBylineText", {}).get("runs", [{}])[0].get("text", '')
+                res["duration"] = video_data.get("lengthText", {}).get("simpleText", 0)
+                res["publish_time"] = video_data.get("publishedTimeText", {}).get("simpleText", 0)
+                res["url_suffix"] = video_data.get("navigationEndpoint", {}).get("commandMetadata", {}).get("webCommandMetadata", {}).get("url", None)
+                res["viewCountText"] = video_data.get("viewCountText", {}).get("simpleText", '')
+                results.append(res)
+    return results
+
+def generate_page(videos: int) -> str:
+    def video(i: int) -> dict:
+        return {"videoRenderer": {
+            "videoId": f"video{i:06d}",
+            "thumbnail": {"thumbnails": [{"url": f"https://i.ytimg.com/vi/{i}/hq720.jpg", "width": 360}] * 2},
+            "title": {"runs": [{"text": f"卡拉OK 歌曲 {i}"}], "accessibility": {"label": "x" * 120}},
+            "detailedMetadataSnippets": [{"snippetText": {"runs": [{"text": "lyrics "}, {"text": "snippet " * 8}]}}],
+            "longBylineText": {"runs": [{"text": f"Channel {i % 7}"}]},
+            "lengthText": {"simpleText": "4:05"},
+            "publishedTimeText": {"simpleText": "3 years ago"},
+            "viewCountText": {"simpleText": f"{i * 1000} views"},
+            "navigationEndpoint": {"commandMetadata": {"webCommandMetadata": {"url": f"/watch?v=video{i:06d}"}}},
+            "trackingParams": "t" * 200,
+            "menu": {"menuRenderer": {"items": [{"menuServiceItemRenderer": {"text": {"runs": [{"text": "Queue"}]}}}] * 4}}
+        }}
+    data = {
+        "responseContext": {"serviceTrackingParams": [{"params": [{"key": f"k{i}", "value": "v" * 40} for i in range(50)]}]},
+        "contents": {"twoColumnSearchResultsRenderer": {"primaryContents": {"sectionListRenderer": {"contents": [
+            {"itemSectionRenderer": {"contents": [video(i) for i in range(videos)]}},
+            {"continuationItemRenderer": {"trigger": "CONTINUATION_TRIGGER_ON_ITEM_SHOWN"}}
+        ]}}}},
+        "header": {"searchHeaderRenderer": {"chipBar": {"chips": [{"text": "All"}] * 20}}},
+        "topbar": {"desktopTopbarRenderer": {"items": [{"padding": "p" * 500} for _ in range(videos * 4)]}},
+    }
+    return f'<html><script>var ytInitialData = {json.dumps(data, ensure_ascii=False)};</script></html>'
+
+def measure(parse: Callable[[str], list], text: str, repeat: int) -> tuple[float, int, int]:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        results = parse(text)
+        times.append(time.perf_counter() - started)
+    tracemalloc.start()
+    parse(text)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(times), peak, len(results)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the YouTube search results parser.')
+    parser.add_argument('pages', nargs='*', help='Saved search result pages')
+    parser.add_argument('--videos', type=int, default=20, help='Results of the synthetic page')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    pages = {}
+    for path in args.pages:
+        with open(path, encoding='utf-8') as f:
+            pages[path] = f.read()
+    if not pages:
+        pages['synthetic'] = generate_page(args.videos)
+
+    for name, text in pages.items():
+        print(f"{name}: {len(text) / 1024:.0f} KiB")
+        legacy = measure(legacy_parse_search_results, text, args.repeat)
+        current = measure(parse_search_results, text, args.repeat)
+        for label, (elapsed, peak, count) in (("legacy", legacy), ("current", current)):
+            print(f"  {label:<8} {elapsed * 1000:8.3f}ms  peak {peak / 1024:8.0f} KiB  {count} results")
+        print(f"  speedup {legacy[0] / current[0]:.2f}x, peak memory {current[1] / legacy[1]:.0%} of legacy")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,8 +1,11 @@
 from .manager import AirflowManager
 from .storage import Storage, BucketType
+from .cache import ArtifactCache, ArtifactStat
 
 __all__ = [
     "AirflowManager",
     "Storage",
-    "BucketType"
+    "BucketType",
+    "ArtifactCache",
+    "ArtifactStat"
 ]
\ No newline at end of file
@@ -0,0 +1,176 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+import uuid
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from .storage import Storage
+
+PART_SUFFIX = ".part"
+# Expired stats are dropped once this many are kept
+MAX_STATS = 10000
+
+@dataclass(frozen=True)
+class ArtifactStat:
+    size: int
+    etag: str
+    content_type: str
+    last_modified: float | None
+
+class ArtifactCache:
+    """
+    Local disk cache of whole artifacts fetched once from storage, so range
+    requests of a seeking player are served from disk.
+
+    Files are named after the object path and its etag, a rewritten object is
+    fetched again once its stat expires. The total size is bounded and the
+    least recently served files are evicted first. Stats are kept in memory
+    for `stat_ttl` seconds so repeated hits never reach storage.
+    """
+    def __init__(self, storage: Storage, cache_dir: str, max_bytes: int, stat_ttl: float):
+        self.storage = storage
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.stat_ttl = stat_ttl
+        self.logger = logging.getLogger(__name__)
+
+        self._lock = threading.Lock()
+        self._stats: dict[str, tuple[float, ArtifactStat]] = {}
+        self._fetch_locks: dict[str, threading.Lock] = {}
+        self._files: OrderedDict[str, int] = OrderedDict()
+        self._size = 0
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def _load_index(self) -> None:
+        """
+        Picks up files left by a previous process in least recently used order.
+        """
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if not entry.is_file():
+                continue
+            if entry.name.endswith(PART_SUFFIX):
+                os.remove(entry.path)
+                continue
+            stat = entry.stat()
+            entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self._size += size
+
+    def _get_name(self, path: str, etag: str) -> str:
+        return hashlib.sha1(f"{path}|{etag}".encode('utf-8')).hexdigest()
+
+    def stat(self, path: str) -> ArtifactStat:
+        now = time.monotonic()
+        cached = self._stats.get(path)
+        if cached and cached[0] > now:
+            return cached[1]
+        if len(self._stats) >= MAX_STATS:
+            self._stats = {key: value for key, value in self._stats.items() if value[0] > now}
+        obj = self.storage.stat_object(path)
+        stat = ArtifactStat(
+            size=obj.size or 0,
+            etag=(obj.etag or '').strip('"'),
+            content_type=obj.content_type or 'application/octet-stream',
+            last_modified=obj.last_modified.timestamp() if obj.last_modified else None
+        )
+        self._stats[path] = (now + self.stat_ttl, stat)
+        return stat
+
+    def get_file(self, path: str, stat: ArtifactStat) -> str | None:
+        """
+        Returns the local copy of an artifact, fetching it on a miss.
+        Artifacts larger than the whole cache are not cached and None is returned.
+        """
+        if stat.size > self.max_bytes:
+            return None
+        name = self._get_name(path, stat.etag)
+        filepath = os.path.join(self.cache_dir, name)
+        if self._touch(name, filepath):
+            self.hits += 1
+            return filepath
+
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(name, threading.Lock())
+        # Concurrent requests of the same artifact wait for a single download
+        with fetch_lock:
+            try:
+                if self._touch(name, filepath):
+                    self.hits += 1
+                    return filepath
+                self.misses += 1
+                started = time.perf_counter()
+                part_path = f"{filepath}.{uuid.uuid4().hex}{PART_SUFFIX}"
+                try:
+                    self.storage.download(path, part_path)
+                    os.replace(part_path, filepath)
+                finally:
+                    if os.path.exists(part_path):
+                        os.remove(part_path)
+                self.logger.debug(f"Cached {path} ({stat.size} bytes) in {time.perf_counter() - started:.3f}s")
+                self._add(name, os.path.getsize(filepath))
+                return filepath
+            finally:
+                with self._lock:
+                    self._fetch_locks.pop(name, None)
+
+    def _touch(self, name: str, filepath: str) -> bool:
+        """
+        Marks a cached file as recently used, False when it is missing.
+        """
+        try:
+            # The mtime keeps the LRU order across restarts
+            os.utime(filepath)
+            size = os.path.getsize(filepath)
+        except FileNotFoundError:
+            with self._lock:
+                if name in self._files:
+                    self._size -= self._files.pop(name)
+            return False
+        with self._lock:
+            if name in self._files:
+                self._files.move_to_end(name)
+            else:
+                # Fetched by another process sharing the directory
+                self._files[name] = size
+                self._size += size
+        return True
+
+    def _add(self, name: str, size: int) -> None:
+        evicted = []
+        with self._lock:
+            self._size += size - self._files.pop(name, 0)
+            self._files[name] = size
+            while self._size > self.max_bytes and len(self._files) > 1:
+                evicted_name, evicted_size = self._files.popitem(last=False)
+                self._size -= evicted_size
+                evicted.append(evicted_name)
+        for evicted_name in evicted:
+            # Open responses keep reading from the unlinked file
+            try:
+                os.remove(os.path.join(self.cache_dir, evicted_name))
+            except FileNotFoundError:
+                pass
+        if evicted:
+            self.logger.debug(f"Evicted {len(evicted)} artifacts from the disk cache")
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "files": len(self._files),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "stats": len(self._stats),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / total if total else 0
+            }
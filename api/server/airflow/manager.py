@@ -2,32 +2,102 @@ import requests
 import logging
 import pendulum
 import threading
+import time
 
 from functools import wraps
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 ARG_BUCKET_NAME = 'task-args'
+# Read-only list endpoints taking their filters as a POST body
+READ_ONLY_POST_PATHS = ('dags/~/dagRuns/list', 'dags/~/dagRuns/~/taskInstances/list')
+
+class RequestStats:
+    """
+    Latency counters of Airflow API calls, grouped by manager method.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls: dict[str, dict] = {}
+
+    def record(self, name: str, elapsed: float, failed: bool) -> None:
+        with self._lock:
+            stats = self.calls.setdefault(name, {
+                "count": 0,
+                "errors": 0,
+                "total_seconds": 0.0,
+                "max_seconds": 0.0
+            })
+            stats["count"] += 1
+            stats["errors"] += int(failed)
+            stats["total_seconds"] += elapsed
+            stats["max_seconds"] = max(stats["max_seconds"], elapsed)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                name: {**stats, "average_seconds": stats["total_seconds"] / stats["count"]}
+                for name, stats in self.calls.items()
+            }
 
 class AirflowManager:
-    def __init__(self, base_url: str, auth: tuple):
+    def __init__(self, base_url: str, auth: tuple, pool_size: int = 10, timeout: float = 10,
+                 max_retries: int = 3, backoff_factor: float = 0.3):
         self.base_url = base_url.rstrip('/')
         self.auth = auth
         self.auth_token: str | None = None
+        self.timeout = timeout
         self._auth_lock = threading.Lock()
         self.logger = logging.getLogger(__name__)
+        self.stats = RequestStats()
+
+        # One keep-alive pool shared by all greenlets, callers wait for a free
+        # connection instead of opening throwaway ones. Only idempotent methods
+        # are retried so that a DAG is never triggered twice.
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(500, 502, 503, 504),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # POSTs of the list endpoints only read, they are retried like GETs
+        read_retry = retry.new(allowed_methods=Retry.DEFAULT_ALLOWED_METHODS | {"POST"})
+        read_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=True, max_retries=read_retry)
+        for path in READ_ONLY_POST_PATHS:
+            self.session.mount(f"{self.base_url}/{path}", read_adapter)
 
-    def do_auth(self):
+    def do_auth(self) -> str:
         login_url = f"{self.base_url}/../../auth/token"
         payload = {
             "username": self.auth[0],
             "password": self.auth[1]
         }
         
-        response = requests.post(login_url, json=payload)
+        response = self.session.post(login_url, json=payload, timeout=self.timeout)
         if response.status_code == 201:
             data = response.json()
-            self.auth_token = data.get('access_token')
+            return data.get('access_token')
         else:
             raise Exception(f"Authentication failed: {response.text}")
+
+    def refresh_auth(self, stale_token: str | None) -> str | None:
+        """
+        Replaces `stale_token` with a new token, unless another caller did already.
+        The token is fetched without holding the lock so that callers with a
+        valid token are not blocked behind the login request.
+        """
+        with self._auth_lock:
+            if self.auth_token != stale_token:
+                return self.auth_token
+        token = self.do_auth()
+        with self._auth_lock:
+            if self.auth_token == stale_token:
+                self.auth_token = token
+            return self.auth_token
     
     @staticmethod
     def ensure_authed(func):
@@ -35,24 +105,27 @@ class AirflowManager:
         Decorator-style method to ensure valid authentication before API calls.
         """
         @wraps(func)
-        def wrapper(self: "AirflowManager", *args, **kwargs):
-            with self._auth_lock:
-                if not self.auth_token:
-                    self.do_auth()
+        def wrapper(self: "AirflowManager", *args, _retried: bool = False, **kwargs):
+            used_token = self.auth_token or self.refresh_auth(None)
+            started = time.perf_counter()
+            failed = True
             try:
-                return func(self, *args, **kwargs)
+                result = func(self, *args, **kwargs)
+                failed = False
+                return result
             except requests.exceptions.RequestException as e:
-                if e.response and (e.response.status_code == 401 or e.response.status_code == 403):
-                    self.auth_token = None
-                    if kwargs.get('_retried'):
-                        raise Exception("Authentication failed even after retry.")
-                else:
+                if e.response is None or e.response.status_code not in (401, 403):
                     raise e
-                
-                self.logger.info("Authentication expired, retry.")
-                self.do_auth()
-                kwargs['_retried'] = True
-                return wrapper(self, *args, **kwargs)
+                if _retried:
+                    raise Exception("Authentication failed even after retry.")
+            finally:
+                elapsed = time.perf_counter() - started
+                self.stats.record(func.__name__, elapsed, failed)
+                self.logger.debug(f"Airflow {func.__name__} took {elapsed:.3f}s")
+
+            self.logger.info("Authentication expired, retry.")
+            self.refresh_auth(used_token)
+            return wrapper(self, *args, _retried=True, **kwargs)
 
         return wrapper
 
@@ -68,15 +141,17 @@ class AirflowManager:
             'Authorization': f'Bearer {self.auth_token}'
         })
 
-        response = requests.request(
+        response = self.session.request(
             method=method,
             url=url,
             headers=headers,
-            timeout=kwargs.pop('timeout', 10),
+            timeout=kwargs.pop('timeout', self.timeout),
             **kwargs
         )
         
         response.raise_for_status()
+        if response.status_code == 204:
+            return None
         return response.json()
     
     @ensure_authed
@@ -143,6 +218,10 @@ class AirflowManager:
             }
         )
     
+    @ensure_authed
+    def delete_dag_run(self, dag_id: str, dag_run_id: str) -> None:
+        self._send_request("DELETE", f"dags/{dag_id}/dagRuns/{dag_run_id}")
+
     @ensure_authed
     def clear_task_instances(self, dag_id: str, dag_run_id: str, failed_task_ids: list[str] | None) -> dict:
         return self._send_request(
@@ -168,6 +247,28 @@ class AirflowManager:
         )
         return data.get('task_instances', [])
 
+    @ensure_authed
+    def get_task_instances_batch(self, dag_ids: list[str], dag_run_ids: list[str], page_limit: int = 100) -> list:
+        """
+        Fetches the task instances of several DAG runs at once.
+        """
+        task_instances = []
+        while True:
+            data = self._send_request(
+                "POST",
+                "dags/~/dagRuns/~/taskInstances/list",
+                json={
+                    "dag_ids": dag_ids,
+                    "dag_run_ids": dag_run_ids,
+                    "page_offset": len(task_instances),
+                    "page_limit": page_limit
+                }
+            )
+            page = data.get('task_instances', [])
+            task_instances += page
+            if not page or len(task_instances) >= data.get('total_entries', 0):
+                return task_instances
+
     @ensure_authed
     def get_task_instance(self, dag_id: str, dag_run_id: str, task_id: str) -> dict:
         """
@@ -201,4 +302,10 @@ class AirflowManager:
         log_path = f"dags/{dag_id}/dagRuns/{dag_run_id}/taskInstances/{task_id}/logs/{try_number}"
         if token:
             log_path += '?token=' + token
-        return self._send_request("GET", log_path)
\ No newline at end of file
+        return self._send_request("GET", log_path)
+
+    def get_stats(self) -> dict:
+        """
+        Reports call counts and latencies of the Airflow API per method.
+        """
+        return self.stats.to_dict()
\ No newline at end of file
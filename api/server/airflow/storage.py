@@ -10,8 +10,9 @@ from enum import Enum
 from minio import Minio
 from minio.helpers import ObjectWriteResult
 from minio.datatypes import Object
+from minio.deleteobjects import DeleteObject
 from pathlib import Path
-from typing import Tuple, Any
+from typing import Tuple, Any, Iterator
 from ..config import config
 
 class BucketType(Enum):
@@ -130,4 +131,36 @@ class Storage:
     def stream_binary(self, path: str, **kargs) -> BaseHTTPResponse:
         bucket, key = self._split_path(path)
         response = self.client.get_object(bucket, key, **kargs)
-        return response
\ No newline at end of file
+        return response
+
+    def list_objects(self, bucket_type: BucketType, prefix: str) -> Iterator[Object]:
+        """
+        Lists every object below a prefix.
+
+        Args:
+            bucket_type: bucket to look into.
+            prefix: key prefix, e.g. a run id followed by a slash.
+        """
+        return self.client.list_objects(bucket_type.value, prefix=prefix, recursive=True)
+
+    def get_prefix_size(self, bucket_type: BucketType, prefix: str) -> int:
+        """
+        Sums the size in bytes of every object below a prefix.
+        """
+        return sum(obj.size or 0 for obj in self.list_objects(bucket_type, prefix))
+
+    def remove_prefix(self, bucket_type: BucketType, prefix: str) -> None:
+        """
+        Removes every object below a prefix.
+
+        Raises:
+            RuntimeError: If any of the objects could not be removed.
+        """
+        delete_list = (
+            DeleteObject(obj.object_name)
+            for obj in self.list_objects(bucket_type, prefix)
+            if obj.object_name
+        )
+        errors = list(self.client.remove_objects(bucket_type.value, delete_list))
+        if errors:
+            raise RuntimeError(f"Failed to remove {len(errors)} objects below '{prefix}': {errors[0]}")
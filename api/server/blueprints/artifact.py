@@ -1,71 +1,127 @@
 import os
-import re
-from flask import Blueprint, send_file, current_app, Response, stream_with_context, request
-from typing import cast
+from datetime import datetime, timezone
+from flask import Blueprint, current_app, Response, request
+from werkzeug.http import http_date, is_resource_modified
+from typing import cast, Iterator
+from ..airflow import ArtifactStat, BucketType, Storage
+from ..config import config
 from ..datatype import MyFlaskApp
+from ..envelope import use_envelope
+from ..ranges import (
+    Reader, RangeNotSatisfiable, MultipartRanges,
+    parse_range_header, if_range_matches, get_content_range, iter_chunks, file_reader
+)
 
-artifact_bp = Blueprint('artifact', __name__)
+# Files are sent as built, errors and cache stats are enveloped
+artifact_bp = use_envelope(Blueprint('artifact', __name__))
+
+def is_run_artifact(artifact_path: str) -> bool:
+    """
+    Run artifacts are only rewritten when their task reruns.
+    """
+    return artifact_path.startswith(f"{BucketType.STORAGE_BUCKET.value}/")
+
+def storage_reader(storage: Storage, artifact_path: str, chunk_size: int) -> Reader:
+    """
+    Reads ranges of an artifact straight from minio.
+    """
+    def read(start: int, length: int) -> Iterator[bytes]:
+        response = storage.stream_binary(artifact_path, offset=start, length=length)
+        try:
+            yield from response.stream(chunk_size)
+        finally:
+            response.close()
+            response.release_conn()
+    return read
 
 @artifact_bp.route('/<path:artifact_path>', methods=['GET'])
 def get_artifact(artifact_path: str):
     """
     Handle the retrieval of artifacts based on the job ID and artifact id from minio.
+    Artifacts are served from the local disk cache with conditional and range support.
     """
     app = cast(MyFlaskApp, current_app)
-    storage = app.storage
+    cache = app.artifactCache
 
-    # Get file size
     try:
-        stat = storage.stat_object(artifact_path)
-        file_size = stat.size
-        if file_size == 0 or file_size is None:
+        stat = cache.stat(artifact_path)
+        if stat.size == 0:
             return {"error": "Artifact not found"}, 404
     except Exception:
         return {"error": "Artifact not found"}, 404
 
-    # Check range header
-    range_header = request.headers.get('Range', None)
-    byte_start = 0
-    byte_end = file_size - 1
-    status_code = 200
-    if range_header:
-        match = re.search(r'bytes=(\d+)-(\d*)', range_header)
-        if match:
-            byte_start = int(match.group(1))
-            if match.group(2):
-                byte_end = int(match.group(2))
-            status_code = 206
-    requested_length = byte_end - byte_start + 1
+    try:
+        filepath = cache.get_file(artifact_path, stat)
+    except Exception as e:
+        app.logger.warning(f"Failed to cache artifact {artifact_path}, streaming it instead: {e}")
+        filepath = None
 
+    chunk_size = config.artifact.chunk_size
+    if filepath is None:
+        return send_artifact(artifact_path, stat, storage_reader(app.storage, artifact_path, chunk_size))
+    # Opened right away, an eviction only unlinks the file
+    f = open(filepath, 'rb')
     try:
-        response = storage.stream_binary(artifact_path, offset=byte_start, length=requested_length)
-        def generate():
-            try:
-                # Yield chunks of 64KB
-                for chunk in response.stream(65536):
-                    yield chunk
-            finally:
-                response.close()
-                response.release_conn()
+        response = send_artifact(artifact_path, stat, file_reader(f, chunk_size))
+    except:
+        f.close()
+        raise
+    response.call_on_close(f.close)
+    return response
 
-        headers = {
-            "Content-Type": response.headers.get("Content-Type", 'application/octet-stream'),
-            "Content-Disposition": f"attachment; filename={os.path.basename(artifact_path)}",
-            "Accept-Ranges": "bytes",
-        }
+@artifact_bp.route('/cache', methods=['GET'])
+def get_artifact_cache_stats():
+    """
+    Report usage and hit ratio of the artifact disk cache.
+    """
+    app = cast(MyFlaskApp, current_app)
+    return app.artifactCache.get_stats()
 
-        if status_code == 206:
-            headers["Content-Range"] = f"bytes {byte_start}-{byte_end}/{file_size}"
-            headers["Content-Length"] = str(requested_length)
-        else:
-            headers["Content-Length"] = str(file_size)
+def send_artifact(artifact_path: str, stat: ArtifactStat, reader: Reader) -> Response:
+    """
+    Builds the response of an artifact for the conditional and range headers of the request:
+        - 304 when the client's copy is current.
+        - 416 when no requested range overlaps the artifact.
+        - 206 with one range, or `multipart/byteranges` with several.
+        - 200 with the whole artifact otherwise, e.g. when `If-Range` does not match.
+    """
+    last_modified = datetime.fromtimestamp(stat.last_modified, timezone.utc) if stat.last_modified else None
+    headers = {
+        "Content-Disposition": f"attachment; filename={os.path.basename(artifact_path)}",
+        "Accept-Ranges": "bytes",
+        "ETag": f'"{stat.etag}"',
+    }
+    if last_modified:
+        headers["Last-Modified"] = http_date(last_modified)
+    if is_run_artifact(artifact_path):
+        # Names do not change with the content, e.g. `<run_id>/vocals.mp3`
+        max_age = config.artifact_cache.max_age
+        headers["Cache-Control"] = f"public, max-age={max_age}" if max_age else "no-cache"
 
-        return Response(
-            stream_with_context(generate()),
-            status=status_code, 
-            headers=headers
-        )
-    except Exception as e:
-        current_app.logger.error(f"Failed to fetch artifact {artifact_path}: {e}", exc_info=True)
-        return {"error": "Artifact not found"}, 404
-    
\ No newline at end of file
+    if not is_resource_modified(request.environ, etag=stat.etag, last_modified=last_modified):
+        return Response(status=304, headers=headers)
+
+    ranges = None
+    if if_range_matches(request.headers.get('If-Range'), stat.etag, stat.last_modified):
+        try:
+            ranges = parse_range_header(request.headers.get('Range'), stat.size, config.artifact.max_ranges)
+        except RangeNotSatisfiable:
+            headers["Content-Range"] = f"bytes */{stat.size}"
+            return Response(status=416, headers=headers)
+
+    if ranges is None:
+        headers["Content-Type"] = stat.content_type
+        headers["Content-Length"] = str(stat.size)
+        return Response(iter_chunks(reader, [(0, stat.size - 1)]), status=200, headers=headers)
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        headers["Content-Type"] = stat.content_type
+        headers["Content-Range"] = get_content_range(start, end, stat.size)
+        headers["Content-Length"] = str(end - start + 1)
+        return Response(iter_chunks(reader, ranges), status=206, headers=headers)
+
+    multipart = MultipartRanges(ranges, stat.size, stat.content_type)
+    headers["Content-Type"] = multipart.content_type
+    headers["Content-Length"] = str(multipart.length)
+    return Response(multipart.iter_body(reader), status=206, headers=headers)
@@ -1,10 +1,11 @@
 from typing import cast
 from flask import Blueprint, request, current_app, after_this_request
 from ..datatype import MyFlaskApp
+from ..envelope import use_envelope
 from ..websocket.job.namespace import get_job_room, get_task_room
 from ..websocket.job.manager import get_unique_job_id
 
-job_bp = Blueprint('job', __name__)
+job_bp = use_envelope(Blueprint('job', __name__))
 
     
 def get_app():
@@ -21,46 +22,48 @@ def create_job():
     if 'youtubeLink' in request.form:
         youtube_link = request.form['youtubeLink']
         jid, job = manager.create_youtube_job_request(youtube_link)
-        
+
         return {
-            "jid": jid
+            "jid": jid,
+            "cached": job.get('cached', False)
         }
     elif 'file' in request.files:        
         return 'Not implemented yet.', 501
     else:
         return 'No YouTube link or file provided.', 400
 
+def emit_job(app: MyFlaskApp, job_id: str, dag_run: dict):
+    app.logger.debug(f'Emitting {dag_run}')
+    for room in [get_job_room(job_id), get_job_room('*')]:
+        app.socketio.emit('update_job', dag_run, namespace='/job', room=room) # type: ignore
+
+def emit_task(app: MyFlaskApp, job_id: str, task_instance: dict):
+    app.logger.debug(f'Emitting {task_instance}')
+    for room in [get_task_room(job_id), get_task_room('*')]:
+        app.socketio.emit('update_task', task_instance, namespace='/job', room=room) # type: ignore
+
 def sync_job(app: MyFlaskApp, job_id: str):
     dag_id, dag_run_id = job_id.split('|')
     manager = app.jobManager
-    socketio = app.socketio
 
     dag_run = manager.get_dag_run(dag_id, dag_run_id)
-    app.logger.debug(f'Emitting {dag_run}')
-    for room in [get_job_room(job_id), get_job_room('*')]:
-        socketio.emit('update_job', dag_run, namespace='/job', room=room) # type: ignore
+    emit_job(app, job_id, dag_run)
 
 def sync_tasks(app: MyFlaskApp, job_id: str):
     dag_id, dag_run_id = job_id.split('|')
     manager = app.jobManager
-    socketio = app.socketio
 
     task_instances = manager.get_task_instances(dag_id, dag_run_id)
     for task_instance in task_instances:
-        app.logger.debug(f'Emitting {task_instance}')
-        for room in [get_task_room(job_id), get_task_room('*')]:
-            socketio.emit('update_task', task_instance, namespace='/job', room=room) # type: ignore
+        emit_task(app, job_id, task_instance)
 
 def sync_task(app: MyFlaskApp, job_id: str, task_id: str, new_status: str):
     dag_id, dag_run_id = job_id.split('|')
     manager = app.jobManager
-    socketio = app.socketio
 
     task_instance = manager.get_task_instance(dag_id, dag_run_id, task_id)
     task_instance['status'] = new_status
-    app.logger.debug(f'Emitting {task_instance}')
-    for room in [get_task_room(job_id), get_task_room('*')]:
-        socketio.emit('update_task', task_instance, namespace='/job', room=room) # type: ignore
+    emit_task(app, job_id, task_instance)
 
 @job_bp.route('/<job_id>', methods=['POST'])
 def update_job(job_id: str):
@@ -97,6 +100,30 @@ def get_task_log(job_id: str, task_id: str):
     task_log = manager.get_task_log(dag_id, dag_run_id, task_id, token)
     return task_log
 
+@job_bp.route('/cache', methods=['GET'])
+def get_result_cache_stats():
+    """
+    Report hit/miss counters and usage of the result cache.
+    """
+    app = get_app()
+    return app.jobManager.result_cache.get_stats()
+
+@job_bp.route('/cache/metadata', methods=['GET'])
+def get_metadata_cache_stats():
+    """
+    Report hit ratios of the Airflow metadata cache.
+    """
+    app = get_app()
+    return app.jobManager.metadata_cache.get_stats()
+
+@job_bp.route('/airflow', methods=['GET'])
+def get_airflow_stats():
+    """
+    Report call counts and latencies of the Airflow API.
+    """
+    app = get_app()
+    return app.jobManager.airflow_manager.get_stats()
+
 @job_bp.route('/webhook', methods=['POST'])
 def job_webhook() -> tuple:
     """
@@ -123,11 +150,31 @@ def job_webhook() -> tuple:
         "dag_run_id": dag_run_id
     })
     
+    # Updates are applied to the stored job state and emitted as deltas,
+    # jobs without a stored state yet are fully synced instead
     if task_id == 'DAG':
-        sync_job(app, job_id)
-        sync_tasks(app, job_id)
+        job_update = manager.apply_job_event(dag_id, dag_run_id)
+        if job_update is None:
+            sync_job(app, job_id)
+            sync_tasks(app, job_id)
+        else:
+            emit_job(app, job_id, job_update)
+        if state == 'success':
+            try:
+                manager.cache_job_result(dag_id, dag_run_id)
+            except Exception:
+                app.logger.error(f'Failed to cache result of {job_id}', exc_info=True)
     else:
-        sync_task(app, job_id, task_id, state)
-        sync_job(app, job_id)
+        # The task was cleared, rerun or finished, its cached args are stale
+        manager.invalidate_task(dag_id, dag_run_id, task_id)
+        updates = manager.apply_task_event(dag_id, dag_run_id, task_id, state)
+        if updates is None:
+            sync_job(app, job_id)
+            sync_task(app, job_id, task_id, state)
+        else:
+            job_update, task_update = updates
+            # Every version is emitted to the job room, clients detect gaps from it
+            emit_job(app, job_id, job_update)
+            emit_task(app, job_id, task_update)
     
     return "ok", 200
\ No newline at end of file
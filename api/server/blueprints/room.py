@@ -1,8 +1,9 @@
 from flask import Blueprint, request, current_app
 from typing import cast
 from ..datatype import MyFlaskApp, QueueItem, QueueType
+from ..envelope import use_envelope
 
-room_bp = Blueprint('room', __name__)
+room_bp = use_envelope(Blueprint('room', __name__))
 
 @room_bp.route('/queue', methods=['POST'])
 def queue():
@@ -1,21 +1,28 @@
 import os
-from flask import Blueprint, Response
+from flask import Blueprint, Response, current_app, abort
+from typing import cast
+from ..datatype import MyFlaskApp
 
 web_bp = Blueprint('web', __name__)
 web_bp.static_folder = os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'static')
 
+def serve_static(path: str) -> Response:
+    app = cast(MyFlaskApp, current_app)
+    static_file = app.staticIndex.lookup(path)
+    if static_file is None:
+        abort(404)
+    return app.staticIndex.send(static_file)
+
 @web_bp.route('/', methods=['GET'])
 def index() -> Response:
     """
     Serve the index.html file.
     """
-    return web_bp.send_static_file('index.html')
+    return serve_static('index.html')
 
-@web_bp.route('/<path>', methods=['GET'])
+@web_bp.route('/<path:path>', methods=['GET'])
 def static_proxy(path: str) -> Response:
     """
     Serve static files from the static folder.
     """
-    if web_bp.static_folder and os.path.exists(os.path.join(web_bp.static_folder, path + '.html')):
-        return web_bp.send_static_file(path + '.html')
-    return web_bp.send_static_file(path)
+    return serve_static(path)
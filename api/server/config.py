@@ -17,6 +17,14 @@ class AirflowConfig(BaseModel):
     username: str = "airflow"
     password: str = "airflow"
     dag_id: str = "Generate-from-link"
+    # Pooled keep-alive connections to the Airflow API
+    pool_size: int = 20
+    timeout: float = 10
+    # Retries of idempotent requests on connection errors and 5xx responses
+    max_retries: int = 3
+    backoff_factor: float = 0.3
+    # Concurrent XCom and storage reads when building job states
+    fetch_concurrency: int = 16
 
 class ServerConfig(BaseModel):
     # Added fields from your legacy "server" and "socketio" logic
@@ -30,12 +38,65 @@ class ServerConfig(BaseModel):
     # Prioritizes env var, then default
     socketio_message_queue: str = Field(default="redis://localhost:6379/1")
 
+class ResultCacheConfig(BaseModel):
+    enabled: bool = True
+    # Bump whenever a task or model change invalidates earlier outputs
+    pipeline_version: str = "1"
+    # Upper bound of the artifacts of cached runs in storage, beyond it the least
+    # recently used results not queued in a room are deleted with their run
+    max_bytes: int = 20 * 1024 ** 3
+
+class MetadataCacheConfig(BaseModel):
+    # Disable to always read through to Airflow and storage, e.g. for debugging
+    enabled: bool = True
+    # Lifetime of data that never changes once written, e.g. request files
+    immutable_ttl: int = 7 * 24 * 3600
+
+class RoomConfig(BaseModel):
+    # Keep the serialized room next to its version to answer joins and syncs of unchanged rooms
+    snapshot_cache: bool = True
+    # Recent deltas kept per room, reconnecting clients further behind get a full sync
+    delta_log_size: int = 1000
+    # Seconds controller actions of a room are collected to be applied and broadcast at once, 0 disables it
+    batch_window: float = 0.05
+
+class YoutubeConfig(BaseModel):
+    timeout: float = 5
+    pool_size: int = 20
+    # Seconds results are shared from the cache
+    search_ttl: int = 3600
+    suggest_ttl: int = 24 * 3600
+    # Suggestions of a cached prefix are reused while at least this many still match
+    prefix_min_results: int = 5
+
+class ArtifactConfig(BaseModel):
+    # Bytes read from disk or storage per chunk of a streamed response
+    chunk_size: int = 256 * 1024
+    # Requests with more ranges are answered with the whole artifact
+    max_ranges: int = 16
+
+class ArtifactCacheConfig(BaseModel):
+    cache_dir: str = "/tmp/artifact-cache"
+    # Upper bound of artifacts kept on local disk, 0 streams every request from storage
+    max_bytes: int = 2 * 1024 ** 3
+    # Seconds a stat of an object is reused before asking storage again
+    stat_ttl: float = 300
+    # Seconds browsers reuse a run artifact without revalidating it, a rerun of the
+    # task overwrites it under the same name. 0 revalidates every use with its ETag.
+    max_age: int = 0
+
 class AppConfig(BaseSettings):
     log_level: str = 'INFO'
 
     storage: StorageConfig = StorageConfig()
     airflow: AirflowConfig = AirflowConfig()
     server: ServerConfig = ServerConfig()
+    result_cache: ResultCacheConfig = ResultCacheConfig()
+    metadata_cache: MetadataCacheConfig = MetadataCacheConfig()
+    room: RoomConfig = RoomConfig()
+    youtube: YoutubeConfig = YoutubeConfig()
+    artifact: ArtifactConfig = ArtifactConfig()
+    artifact_cache: ArtifactCacheConfig = ArtifactCacheConfig()
 
     # Configuration to handle case sensitivity and env files
     model_config = SettingsConfigDict(
@@ -3,12 +3,15 @@ import typing
 from flask import Flask
 from redis import Redis
 from flask_socketio import SocketIO
+from ..envelope import OrjsonProvider, is_enveloped, make_envelope
 
 from .queue import QueueItem, QueueType
 if typing.TYPE_CHECKING:
     from ..websocket.room import RoomManager
     from ..websocket.job import JobManager
-    from ..airflow import Storage
+    from ..airflow import Storage, ArtifactCache
+    from ..static_index import StaticIndex
+    from ..youtube import YoutubeClient
 
 class MyFlaskApp(Flask):
     redis: Redis
@@ -16,6 +19,21 @@ class MyFlaskApp(Flask):
     roomManager: "RoomManager"
     jobManager: "JobManager"
     storage: "Storage"
+    artifactCache: "ArtifactCache"
+    staticIndex: "StaticIndex"
+    youtubeClient: "YoutubeClient"
+
+    json_provider_class = OrjsonProvider
+
+    def make_response(self, rv):
+        """
+        Wraps the responses of API blueprints in the success envelope.
+        """
+        if is_enveloped():
+            response = make_envelope(self, rv)
+            if response is not None:
+                return response
+        return super().make_response(rv)
 
 __all__ = [
     'QueueItem',
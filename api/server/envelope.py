@@ -0,0 +1,94 @@
+"""
+Opt-in `{success, body}` envelope of API responses.
+
+Blueprints registered with `use_envelope` have their return values wrapped
+before Flask turns them into a response, so the body is serialized exactly
+once. Responses built by a view, e.g. artifact files, and every other
+route, e.g. static files, are sent untouched.
+
+HTTP errors of unknown URLs under the prefix of an enveloped blueprint are
+enveloped too, they reach `make_response` through the app's error handler.
+"""
+import orjson
+
+from typing import Any, cast
+from flask import Blueprint, Flask, Response, request
+from flask.blueprints import BlueprintSetupState
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.exceptions import HTTPException
+
+ENVELOPED_BLUEPRINTS: set[str] = set()
+ENVELOPED_PREFIXES: set[str] = set()
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    JSON provider backed by orjson, types it does not know fall back to Flask's defaults.
+    """
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        return self.dumpb(obj).decode('utf-8')
+
+    def dumpb(self, obj: Any) -> bytes:
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, s: str | bytes, **kwargs: Any) -> Any:
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumpb(obj), mimetype=self.mimetype)
+
+def use_envelope(blueprint: Blueprint) -> Blueprint:
+    """
+    Wraps every response of the blueprint's routes in the envelope.
+    """
+    ENVELOPED_BLUEPRINTS.add(blueprint.name)
+
+    def register_prefix(state: BlueprintSetupState) -> None:
+        prefix = (state.url_prefix or '').rstrip('/')
+        if prefix:
+            ENVELOPED_PREFIXES.add(prefix)
+    blueprint.record_once(register_prefix)
+    return blueprint
+
+def is_enveloped() -> bool:
+    """
+    Whether the request is routed to an enveloped blueprint or, for URLs no route of
+    it matches, falls under its prefix. Those have no blueprint, or the web one whose
+    catch-all route serves every other path.
+    """
+    if request.blueprint in ENVELOPED_BLUEPRINTS:
+        return True
+    return any(request.path == prefix or request.path.startswith(f"{prefix}/") for prefix in ENVELOPED_PREFIXES)
+
+def make_envelope(app: Flask, rv: Any) -> Response | None:
+    """
+    Wraps a view return value, or returns None for values that are sent as is.
+    """
+    headers = None
+    status = 200
+    if isinstance(rv, HTTPException):
+        body, status = rv.description, rv.code or 500
+    elif isinstance(rv, tuple):
+        body, *rest = rv
+        for item in rest:
+            if isinstance(item, int):
+                status = item
+            else:
+                headers = item
+    elif isinstance(rv, (dict, list, str)):
+        body = rv
+    else:
+        return None
+    if isinstance(body, (Response, HTTPException)):
+        return None
+
+    if 200 <= status < 300:
+        envelope = {'success': True, 'body': body}
+    else:
+        envelope = {'success': False, 'message': body}
+    return app.response_class(
+        cast(OrjsonProvider, app.json).dumpb(envelope),
+        status=status,
+        headers=headers,
+        mimetype='application/json'
+    )
@@ -24,17 +24,19 @@ logging.config.dictConfig({
     }
 })
 
-import json
-from flask import Response
 from werkzeug.exceptions import HTTPException
 from .blueprints import BLUEPRINTS
 from .config import config
-from .websocket import prepare_room_environment, prepare_artifact_environment, prepare_job_environment
+from .websocket import (
+    prepare_room_environment, prepare_artifact_environment, prepare_job_environment, prepare_web_environment,
+    prepare_youtube_environment
+)
 from .datatype import MyFlaskApp
 
 logger = logging.getLogger(__name__)
 
-app = MyFlaskApp(__name__, static_url_path='/')
+# Static files are served from the in-memory index of the web blueprint
+app = MyFlaskApp(__name__, static_folder=None)
 
 @app.errorhandler(Exception)
 def handle_exception(e: Exception):
@@ -43,38 +45,12 @@ def handle_exception(e: Exception):
     logger.error(f"Unhandled exception: {e}", exc_info=True)
     return str(e), 500
 
-@app.after_request
-def success_response(response: Response):
-    """
-    Handle the success response.
-    This is called after each request to ensure that the response is successful.
-    """
-    if response.is_streamed:
-        return response
-    
-    if response.is_json:
-        body = response.get_json()
-    else:
-        body = response.get_data(as_text=True)
-    
-    response.headers['Content-Type'] = 'application/json'
-    if 200 <= response.status_code < 300:
-        response.set_data(json.dumps({
-            'success': True,
-            'body': body
-        }))
-    else:
-        response.set_data(json.dumps({
-            'success': False,
-            'message': body
-        }))
-
-    return response
-
 if config.server.web:
     app.register_blueprint(**BLUEPRINTS['web'])
+    prepare_web_environment(app)
 if config.server.yt:
     app.register_blueprint(**BLUEPRINTS['yt'])
+    prepare_youtube_environment(app)
 if config.server.room:
     app.register_blueprint(**BLUEPRINTS['room'])
     prepare_room_environment(app)
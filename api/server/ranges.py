@@ -0,0 +1,136 @@
+"""
+HTTP range requests (RFC 9110 section 14) of artifacts.
+"""
+import uuid
+
+from typing import BinaryIO, Callable, Iterator
+from werkzeug.http import parse_date
+
+# Reads `length` bytes starting at `start` of the served object
+Reader = Callable[[int, int], Iterator[bytes]]
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+def parse_range_header(header: str | None, size: int, max_ranges: int) -> list[tuple[int, int]] | None:
+    """
+    Parses a `Range` header into sorted, non-overlapping inclusive byte ranges
+    clamped to the object size.
+
+    Returns None when the whole object should be sent instead: no header, an
+    invalid header (which must be ignored) or more ranges than `max_ranges`.
+
+    Raises:
+        RangeNotSatisfiable: If none of the ranges overlaps the object.
+    """
+    if not header:
+        return None
+    unit, _, specs = header.partition('=')
+    if unit.strip().lower() != 'bytes' or not specs.strip():
+        return None
+
+    ranges = []
+    for spec in specs.split(','):
+        first, sep, last = spec.strip().partition('-')
+        if not sep:
+            return None
+        try:
+            if first:
+                start = int(first)
+                end = int(last) if last else size - 1
+                if last and start > end:
+                    return None
+            else:
+                # Suffix range of the last N bytes
+                suffix = int(last)
+                start, end = max(size - suffix, 0), size - 1
+                if suffix == 0:
+                    continue
+        except ValueError:
+            return None
+        if start < 0:
+            return None
+        if start < size:
+            ranges.append((start, min(end, size - 1)))
+    if not ranges:
+        raise RangeNotSatisfiable()
+    if len(ranges) > max_ranges:
+        return None
+
+    # Overlapping and adjacent ranges are sent once
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        last_start, last_end = merged[-1]
+        if start <= last_end + 1:
+            merged[-1] = (last_start, max(last_end, end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def if_range_matches(header: str | None, etag: str, last_modified: float | None) -> bool:
+    """
+    Evaluates `If-Range`, ranges are only served while the client's copy is current.
+    Only strong validators match, so weak etags always fall back to the whole object.
+    """
+    if not header:
+        return True
+    header = header.strip()
+    if header.startswith('W/'):
+        return False
+    if header.startswith('"'):
+        return header.strip('"') == etag
+    date = parse_date(header)
+    return date is not None and last_modified is not None and int(date.timestamp()) == int(last_modified)
+
+def get_content_range(start: int, end: int, size: int) -> str:
+    return f"bytes {start}-{end}/{size}"
+
+def iter_chunks(reader: Reader, ranges: list[tuple[int, int]]) -> Iterator[bytes]:
+    for start, end in ranges:
+        yield from reader(start, end - start + 1)
+
+class MultipartRanges:
+    """
+    Body of a `multipart/byteranges` response with its exact length.
+    """
+    def __init__(self, ranges: list[tuple[int, int]], size: int, content_type: str):
+        self.ranges = ranges
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f"multipart/byteranges; boundary={self.boundary}"
+        self.headers = [
+            (
+                f"\r\n--{self.boundary}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Range: {get_content_range(start, end, size)}\r\n\r\n"
+            ).encode('latin-1')
+            for start, end in ranges
+        ]
+        self.trailer = f"\r\n--{self.boundary}--\r\n".encode('latin-1')
+
+    @property
+    def length(self) -> int:
+        return sum(
+            len(header) + end - start + 1
+            for header, (start, end) in zip(self.headers, self.ranges)
+        ) + len(self.trailer)
+
+    def iter_body(self, reader: Reader) -> Iterator[bytes]:
+        for header, (start, end) in zip(self.headers, self.ranges):
+            yield header
+            yield from reader(start, end - start + 1)
+        yield self.trailer
+
+def file_reader(f: BinaryIO, chunk_size: int) -> Reader:
+    """
+    Reads ranges of an open file in chunks of `chunk_size` bytes.
+    """
+    def read(start: int, length: int) -> Iterator[bytes]:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(chunk_size, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+    return read
@@ -0,0 +1,169 @@
+"""
+In-memory index of the exported frontend build served by the web blueprint.
+
+Compressed variants are generated once when the image is built:
+
+    python -m server.static_index server/static
+"""
+import argparse
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import time
+import brotli
+
+from dataclasses import dataclass, field
+from flask import Response, request
+
+# Content-hashed build output, never changes under the same path
+IMMUTABLE_PREFIX = "_next/static/"
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+# Smaller files are not worth a compressed variant
+MIN_COMPRESS_SIZE = 1024
+# Preferred encodings first, with the suffix of their precompressed files
+ENCODINGS = {"br": ".br", "gzip": ".gz"}
+
+@dataclass(frozen=True)
+class StaticFile:
+    path: str
+    mimetype: str
+    content: bytes
+    etag: str
+    last_modified: float
+    immutable: bool
+    variants: dict[str, bytes] = field(default_factory=dict)
+
+def compress(content: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(content, quality=11)
+    return gzip.compress(content, compresslevel=9, mtime=0)
+
+def is_compressible(path: str, size: int) -> bool:
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    return size >= MIN_COMPRESS_SIZE and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+def precompress(root: str) -> None:
+    """
+    Writes the brotli and gzip variant of every compressible file next to it,
+    unless it is not smaller than the file.
+    """
+    suffixes = tuple(ENCODINGS.values())
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            filepath = os.path.join(dirpath, filename)
+            if filename.endswith(suffixes) or not is_compressible(filename, os.path.getsize(filepath)):
+                continue
+            with open(filepath, 'rb') as f:
+                content = f.read()
+            for encoding, suffix in ENCODINGS.items():
+                compressed = compress(content, encoding)
+                if len(compressed) < len(content):
+                    with open(filepath + suffix, 'wb') as f:
+                        f.write(compressed)
+                elif os.path.exists(filepath + suffix):
+                    os.remove(filepath + suffix)
+
+class StaticIndex:
+    """
+    Reads the whole static tree once at startup with the brotli and gzip
+    variants precompressed by `precompress`, so requests never touch the
+    filesystem.
+
+    Content-hashed paths are cached as immutable, everything else is
+    revalidated with its ETag on every use.
+    """
+    def __init__(self, root: str):
+        self.root = root
+        self.files: dict[str, StaticFile] = {}
+        self.logger = logging.getLogger(__name__)
+        self._build()
+
+    def _build(self) -> None:
+        started = time.perf_counter()
+        size = 0
+        variant_count = 0
+        suffixes = tuple(ENCODINGS.values())
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                filepath = os.path.join(dirpath, filename)
+                if filename.endswith(suffixes) and os.path.exists(os.path.splitext(filepath)[0]):
+                    continue
+                path = os.path.relpath(filepath, self.root).replace(os.sep, '/')
+                self.files[path] = self._load(path, filepath)
+                size += len(self.files[path].content)
+                variant_count += len(self.files[path].variants)
+        self.logger.info(
+            f"Indexed {len(self.files)} static files ({size} bytes) with {variant_count} compressed variants "
+            f"in {time.perf_counter() - started:.3f}s"
+        )
+
+    def _load(self, path: str, filepath: str) -> StaticFile:
+        with open(filepath, 'rb') as f:
+            content = f.read()
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        last_modified = os.path.getmtime(filepath)
+        variants = {}
+        for encoding, suffix in ENCODINGS.items():
+            try:
+                # A variant older than its file was compressed from a previous build
+                if os.path.getmtime(filepath + suffix) < last_modified:
+                    self.logger.warning(f"Ignoring stale {encoding} variant of {path}")
+                    continue
+                with open(filepath + suffix, 'rb') as f:
+                    variants[encoding] = f.read()
+            except FileNotFoundError:
+                pass
+        return StaticFile(
+            path=path,
+            mimetype=mimetype,
+            content=content,
+            etag=hashlib.sha1(content).hexdigest()[:20],
+            last_modified=last_modified,
+            immutable=path.startswith(IMMUTABLE_PREFIX),
+            variants=variants
+        )
+
+    def lookup(self, path: str) -> StaticFile | None:
+        """
+        Resolves a request path, exported pages are looked up with their `.html` suffix first.
+        """
+        path = path.strip('/') or 'index'
+        return self.files.get(f"{path}.html") or self.files.get(path)
+
+    def send(self, static_file: StaticFile) -> Response:
+        encoding = None
+        for candidate in ENCODINGS:
+            if candidate in static_file.variants and request.accept_encodings[candidate]:
+                encoding = candidate
+                break
+
+        if encoding is None:
+            response = Response(static_file.content, mimetype=static_file.mimetype)
+            response.set_etag(static_file.etag)
+        else:
+            response = Response(static_file.variants[encoding], mimetype=static_file.mimetype)
+            response.content_encoding = encoding
+            # Each representation needs its own validator
+            response.set_etag(f"{static_file.etag}-{encoding}")
+        if static_file.variants:
+            response.vary.add('Accept-Encoding')
+        response.last_modified = static_file.last_modified # type: ignore
+        if static_file.immutable:
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+        else:
+            response.cache_control.no_cache = True
+        return response.make_conditional(request.environ)
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompress the exported frontend build.')
+    parser.add_argument('root', help='Static directory served by the web blueprint')
+    args = parser.parse_args()
+    precompress(args.root)
+
+if __name__ == "__main__":
+    main()
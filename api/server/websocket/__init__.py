@@ -4,7 +4,9 @@ from .room import RoomNamespace
 from .job import JobNamespace
 from ..config import config
 from ..datatype import MyFlaskApp
-from ..airflow import Storage
+from ..airflow import Storage, ArtifactCache
+from ..static_index import StaticIndex
+from ..youtube import YoutubeClient
 from ..websocket.room import RoomManager
 from ..websocket.job import JobManager
 
@@ -38,13 +40,38 @@ def prepare_job_environment(app: MyFlaskApp):
         app.jobManager = JobManager(app.redis)
     app.socketio.on_namespace(JobNamespace(app.jobManager))
 
+def prepare_youtube_environment(app: MyFlaskApp):
+    prepare_shared_environment(app)
+    if not hasattr(app, "youtubeClient"):
+        app.youtubeClient = YoutubeClient(
+            app.redis,
+            search_ttl=config.youtube.search_ttl,
+            suggest_ttl=config.youtube.suggest_ttl,
+            timeout=config.youtube.timeout,
+            pool_size=config.youtube.pool_size,
+            prefix_min_results=config.youtube.prefix_min_results
+        )
+
+def prepare_web_environment(app: MyFlaskApp):
+    if not hasattr(app, "staticIndex") and app.blueprints['web'].static_folder:
+        app.staticIndex = StaticIndex(app.blueprints['web'].static_folder)
+
 def prepare_artifact_environment(app: MyFlaskApp):
     if not hasattr(app, "storage"):
         app.storage = Storage()
+    if not hasattr(app, "artifactCache"):
+        app.artifactCache = ArtifactCache(
+            app.storage,
+            config.artifact_cache.cache_dir,
+            max_bytes=config.artifact_cache.max_bytes,
+            stat_ttl=config.artifact_cache.stat_ttl
+        )
 
                                  
 __all__ = [
     "prepare_room_environment",
     "prepare_job_environment",
-    "prepare_artifact_environment"
+    "prepare_artifact_environment",
+    "prepare_web_environment",
+    "prepare_youtube_environment"
 ]
\ No newline at end of file
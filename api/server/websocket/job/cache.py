@@ -0,0 +1,290 @@
+import hashlib
+import json
+import logging
+import time
+
+from typing import Callable, TypeVar
+from urllib.parse import urlparse, parse_qs
+from redis import Redis
+from ...airflow import Storage, BucketType
+from ...config import config
+
+CACHE_PREFIX = "result-cache"
+T = TypeVar("T")
+
+# Stores an entry, its run and its recency, and adjusts the byte total by the
+# size difference to the entry it replaces
+RECORD_SCRIPT = """
+local entries_key, lru_key, bytes_key, runs_key = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local member, entry, now = ARGV[1], ARGV[2], ARGV[3]
+local previous = redis.call('HGET', entries_key, member)
+local previous_size = 0
+if previous then
+    local previous_entry = cjson.decode(previous)
+    previous_size = previous_entry['bytes']
+    redis.call('HDEL', runs_key, previous_entry['run_id'])
+end
+local size = cjson.decode(entry)['bytes']
+redis.call('HSET', entries_key, member, entry)
+redis.call('HSET', runs_key, cjson.decode(entry)['run_id'], member)
+redis.call('ZADD', lru_key, now, member)
+return redis.call('INCRBY', bytes_key, size - previous_size)
+"""
+
+# Drops an entry from the index, returns it or nil when it was already gone
+REMOVE_SCRIPT = """
+local entries_key, lru_key, bytes_key, runs_key, stats_key = KEYS[1], KEYS[2], KEYS[3], KEYS[4], KEYS[5]
+local member, counter = ARGV[1], ARGV[2]
+redis.call('ZREM', lru_key, member)
+local raw_entry = redis.call('HGET', entries_key, member)
+if not raw_entry then
+    return nil
+end
+local entry = cjson.decode(raw_entry)
+redis.call('HDEL', entries_key, member)
+if redis.call('HGET', runs_key, entry['run_id']) == member then
+    redis.call('HDEL', runs_key, entry['run_id'])
+end
+redis.call('DECRBY', bytes_key, entry['bytes'])
+redis.call('HINCRBY', stats_key, counter, 1)
+return raw_entry
+"""
+YOUTUBE_HOSTS = ("youtube.com", "www.youtube.com", "m.youtube.com", "music.youtube.com")
+
+def get_youtube_video_id(youtube_link: str) -> str | None:
+    """
+    Extracts the video id from the common YouTube link formats.
+    """
+    try:
+        url = urlparse(youtube_link.strip())
+    except ValueError:
+        return None
+    host = (url.hostname or '').lower()
+    parts = [part for part in url.path.split('/') if part]
+    if host == 'youtu.be':
+        return parts[0] if parts else None
+    if host not in YOUTUBE_HOSTS:
+        return None
+    if parts and parts[0] in ('shorts', 'embed', 'live') and len(parts) > 1:
+        return parts[1]
+    video_ids = parse_qs(url.query).get('v')
+    return video_ids[0] if video_ids else None
+
+class ResultCache:
+    """
+    Maps a YouTube video id to a finished job of the current pipeline version,
+    so that a popular song is only processed once.
+
+    The index lives in Redis and is shared by every API instance. Once the
+    artifacts of cached runs exceed the configured budget, the least recently
+    used results are deleted: their entry, their run with `delete_run` and
+    their artifacts in storage. Results `is_in_use` reports in use, e.g.
+    queued in a room, are kept.
+    """
+    def __init__(self, redis: Redis, storage: Storage, dag_id: str,
+                 is_in_use: Callable[[dict], bool], delete_run: Callable[[dict], None]):
+        self.redis = redis
+        self.storage = storage
+        self.is_in_use = is_in_use
+        self.delete_run = delete_run
+        self._record_script = redis.register_script(RECORD_SCRIPT)
+        self._remove_script = redis.register_script(REMOVE_SCRIPT)
+        self.enabled = config.result_cache.enabled
+        self.max_bytes = config.result_cache.max_bytes
+        self.version = hashlib.sha1(
+            f"{dag_id}|{config.result_cache.pipeline_version}".encode('utf-8')
+        ).hexdigest()[:12]
+        self.logger = logging.getLogger(__name__)
+
+    def _get_key(self, suffix: str) -> str:
+        return f"{CACHE_PREFIX}:{suffix}"
+
+    def _get_member(self, video_id: str) -> str:
+        return f"{self.version}:{video_id}"
+
+    def lookup(self, video_id: str, is_finished: Callable[[dict], bool]) -> dict | None:
+        """
+        Returns the cached entry of a video and refreshes its last access time.
+        Entries of runs `is_finished` rejects, e.g. restarted, failed or
+        deleted ones, are dropped instead.
+        """
+        if not self.enabled:
+            return None
+        member = self._get_member(video_id)
+        raw_entry = self.redis.hget(self._get_key("entries"), member)
+        if raw_entry and not is_finished(json.loads(raw_entry)): # type: ignore
+            self.remove(member, "invalidations")
+            raw_entry = None
+        if not raw_entry:
+            self.redis.hincrby(self._get_key("stats"), "misses", 1)
+            self.logger.info(f"Result cache miss for {video_id}")
+            return None
+
+        pipe = self.redis.pipeline()
+        pipe.zadd(self._get_key("lru"), {member: time.time()})
+        pipe.hincrby(self._get_key("stats"), "hits", 1)
+        pipe.execute()
+        self.logger.info(f"Result cache hit for {video_id}")
+        return json.loads(raw_entry) # type: ignore
+
+    def record(self, video_id: str, job_id: str, run_id: str) -> None:
+        """
+        Registers a finished job as the cached result of a video.
+        """
+        if not self.enabled:
+            return
+        member = self._get_member(video_id)
+        size = self.storage.get_prefix_size(BucketType.STORAGE_BUCKET, f"{run_id}/")
+        entry = {
+            "jid": job_id,
+            "run_id": run_id,
+            "bytes": size
+        }
+        self._record_script(
+            keys=[self._get_key("entries"), self._get_key("lru"), self._get_key("bytes"), self._get_key("runs")],
+            args=[member, json.dumps(entry), time.time()]
+        )
+        self.logger.info(f"Cached result of {video_id} from {job_id} ({size} bytes)")
+
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Deletes least recently used results not in use until their artifacts fit the budget.
+        """
+        lock = self.redis.lock(self._get_key("evict-lock"), timeout=300, blocking=False)
+        if not lock.acquire():
+            # Another instance is already evicting
+            return
+        try:
+            for member in self.redis.zrange(self._get_key("lru"), 0, -1): # type: ignore
+                if int(self.redis.get(self._get_key("bytes")) or 0) <= self.max_bytes: # type: ignore
+                    break
+                raw_entry = self.redis.hget(self._get_key("entries"), member)
+                if not raw_entry:
+                    continue
+                entry = json.loads(raw_entry) # type: ignore
+                if self.is_in_use(entry):
+                    self.logger.info(f"Kept cached result {member} over the budget, its run is in use")
+                    continue
+                # Dropped from the index first, so it is no longer handed out while deleted
+                self.remove(member, "evictions")
+                try:
+                    self.delete_run(entry)
+                    self.storage.remove_prefix(BucketType.STORAGE_BUCKET, f"{entry['run_id']}/")
+                except Exception as e:
+                    self.logger.error(f"Failed to delete evicted run {entry['run_id']}: {e}", exc_info=True)
+        finally:
+            lock.release()
+
+    def remove(self, member: str, counter: str) -> None:
+        """
+        Drops an entry from the index, counting it under `counter`. The run and its
+        artifacts are left untouched.
+        """
+        raw_entry = self._remove_script(
+            keys=[
+                self._get_key("entries"), self._get_key("lru"), self._get_key("bytes"),
+                self._get_key("runs"), self._get_key("stats")
+            ],
+            args=[member, counter]
+        )
+        if raw_entry:
+            self.logger.info(f"Dropped cached result {member} ({json.loads(raw_entry)['bytes']} bytes, {counter})") # type: ignore
+
+    def remove_run(self, run_id: str) -> None:
+        """
+        Drops the entry of a run that is rerun, so it is not served while its tasks change.
+        """
+        member = self.redis.hget(self._get_key("runs"), run_id)
+        if member:
+            self.remove(member, "invalidations") # type: ignore
+
+    def get_stats(self) -> dict:
+        stats = self.redis.hgetall(self._get_key("stats"))
+        return {
+            "hits": int(stats.get("hits", 0)), # type: ignore
+            "misses": int(stats.get("misses", 0)), # type: ignore
+            "evictions": int(stats.get("evictions", 0)), # type: ignore
+            "invalidations": int(stats.get("invalidations", 0)), # type: ignore
+            "entries": int(self.redis.hlen(self._get_key("entries"))), # type: ignore
+            "bytes": int(self.redis.get(self._get_key("bytes")) or 0) # type: ignore
+        }
+
+METADATA_CACHE_PREFIX = "metadata-cache"
+
+class MetadataCache:
+    """
+    Read-through cache of Airflow and storage metadata shared by every API instance.
+
+    Values are stored as JSON with a TTL. Results of finished tasks are kept
+    in one hash per job so that webhook events and restarts can invalidate
+    a single task or the whole job.
+    """
+    def __init__(self, redis: Redis):
+        self.redis = redis
+        self.enabled = config.metadata_cache.enabled
+        self.immutable_ttl = config.metadata_cache.immutable_ttl
+        self.logger = logging.getLogger(__name__)
+
+    def _get_key(self, suffix: str) -> str:
+        return f"{METADATA_CACHE_PREFIX}:{suffix}"
+
+    def _count(self, kind: str, hit: bool) -> None:
+        self.redis.hincrby(self._get_key("stats"), f"{kind}:{'hits' if hit else 'misses'}", 1)
+
+    def load(self, kind: str, key: str, loader: Callable[[], T], ttl: int, use_cache: bool = True) -> T:
+        """
+        Returns the cached value of a key, calling `loader` on a miss.
+        `None` results are not cached.
+        """
+        if not self.enabled or not use_cache:
+            return loader()
+        cache_key = self._get_key(f"{kind}:{key}")
+        raw_value = self.redis.get(cache_key)
+        self._count(kind, raw_value is not None)
+        if raw_value is not None:
+            return json.loads(raw_value) # type: ignore
+        value = loader()
+        if value is not None:
+            self.redis.set(cache_key, json.dumps(value), ex=ttl)
+        return value
+
+    def load_task_result(self, job_id: str, task_id: str, loader: Callable[[], T], use_cache: bool = True) -> T:
+        """
+        Returns the cached result of a finished task, calling `loader` on a miss.
+        """
+        if not self.enabled or not use_cache:
+            return loader()
+        cache_key = self._get_key(f"task-results:{job_id}")
+        raw_value = self.redis.hget(cache_key, task_id)
+        self._count("task-results", raw_value is not None)
+        if raw_value is not None:
+            return json.loads(raw_value) # type: ignore
+        value = loader()
+        if value is not None:
+            pipe = self.redis.pipeline()
+            pipe.hset(cache_key, task_id, json.dumps(value))
+            pipe.expire(cache_key, self.immutable_ttl)
+            pipe.execute()
+        return value
+
+    def invalidate_task(self, job_id: str, task_id: str) -> None:
+        self.redis.hdel(self._get_key(f"task-results:{job_id}"), task_id)
+
+    def invalidate_job(self, job_id: str) -> None:
+        self.redis.delete(self._get_key(f"task-results:{job_id}"))
+
+    def get_stats(self) -> dict:
+        stats = self.redis.hgetall(self._get_key("stats"))
+        kinds: dict[str, dict] = {}
+        for field, count in stats.items(): # type: ignore
+            kind, counter = field.rsplit(':', 1)
+            kinds.setdefault(kind, {"hits": 0, "misses": 0})[counter] = int(count)
+        for counters in kinds.values():
+            total = counters["hits"] + counters["misses"]
+            counters["hit_ratio"] = counters["hits"] / total if total else 0
+        return {
+            "enabled": self.enabled,
+            "kinds": kinds
+        }
@@ -1,11 +1,20 @@
 import json
+import logging
 import os
 import uuid
+import requests
 
 from typing import Generator
+from gevent.pool import Pool
 from redis import Redis
 from ...airflow import AirflowManager, Storage, BucketType
 from ...config import config
+from .cache import ResultCache, MetadataCache, get_youtube_video_id
+from .state import JobStateStore, merge_exports
+from ..room.manager import get_queued_job_ids
+
+# Builds of a job from Airflow before giving up on storing a snapshot that no webhook raced with
+SNAPSHOT_ATTEMPTS = 3
 
 def get_unique_job_id(dag_run: dict) -> str:
     return f"{dag_run.get('dag_id')}|{dag_run.get('dag_run_id')}"
@@ -43,6 +52,36 @@ def parse_task_order(tasks: list[dict]) -> list[str]:
 
     return ordered_list
 
+def parse_task_export(args: dict | None) -> dict:
+    task_export = {}
+    if not args:
+        return task_export
+    try:
+        artifact_keys = args.get('artifact_keys')
+        results = args.get('results')
+        exports = args.get('exports')
+        for export in exports:
+            tag = export.get('tag')
+            result_key = export.get('result_key')
+            task_export[tag] = results.get(result_key)
+            task_export[tag]['is_artifact'] = result_key in artifact_keys
+        return task_export
+    except:
+        return task_export
+
+def parse_task_artifacts(args: dict | None) -> dict:
+    task_artifacts = {}
+    if not args:
+        return task_artifacts
+    try:
+        artifact_keys = args.get('artifact_keys')
+        results = args.get('results')
+        for key in results:
+            results[key]['is_artifact'] = key in artifact_keys
+        return results
+    except:
+        return task_artifacts
+
 def parse_task_instance(task_instance: dict):
     return {
         "jid": get_unique_job_id(task_instance),
@@ -58,13 +97,35 @@ class JobManager:
         self.storage = Storage()
         self.airflow_manager = AirflowManager(
             config.airflow.base_url,
-            (config.airflow.username, config.airflow.password)
+            (config.airflow.username, config.airflow.password),
+            pool_size=config.airflow.pool_size,
+            timeout=config.airflow.timeout,
+            max_retries=config.airflow.max_retries,
+            backoff_factor=config.airflow.backoff_factor
+        )
+        self.result_cache = ResultCache(
+            redis, self.storage, config.airflow.dag_id, self.is_result_in_use, self.delete_result_run
         )
+        # Shared by all job state builders, bounds concurrent XCom and storage reads
+        self.fetch_pool = Pool(config.airflow.fetch_concurrency)
+        self.metadata_cache = MetadataCache(redis)
+        self.job_states = JobStateStore(redis)
+        self.logger = logging.getLogger(__name__)
 
     def create_youtube_job_request(self, youtube_link: str) -> tuple[str, dict]:
         """
         Writes a JSON request to MinIO and returns the object path.
+        A finished job of the same video is reused instead when available.
         """
+        video_id = get_youtube_video_id(youtube_link)
+        if video_id:
+            cached = self.result_cache.lookup(video_id, self.is_job_finished)
+            if cached:
+                return (
+                    cached['jid'],
+                    {**cached, 'cached': True}
+                )
+
         request_id = uuid.uuid4().hex
         file_path = f"request/{request_id}.json"
 
@@ -88,6 +149,62 @@ class JobManager:
             job
         )
 
+    def is_job_finished(self, entry: dict) -> bool:
+        """
+        Checks that the run of a result cache entry still exists and succeeded.
+        """
+        dag_id = entry['jid'].split('|', 1)[0]
+        try:
+            raw_dag_run = self.airflow_manager.get_dag_run(dag_id, entry['run_id'])
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return False
+            raise
+        return raw_dag_run.get('state') == 'success'
+
+    def is_result_in_use(self, entry: dict) -> bool:
+        """
+        Checks whether the run of a result cache entry is queued in a room or running again.
+        """
+        if entry['jid'] in get_queued_job_ids(self.redis):
+            return True
+        dag_id = entry['jid'].split('|', 1)[0]
+        try:
+            raw_dag_run = self.airflow_manager.get_dag_run(dag_id, entry['run_id'])
+        except requests.exceptions.HTTPError as e:
+            if e.response is not None and e.response.status_code == 404:
+                return False
+            raise
+        return raw_dag_run.get('state') not in ('success', 'failed')
+
+    def delete_result_run(self, entry: dict) -> None:
+        """
+        Deletes the run of an evicted result cache entry, its job disappears with its artifacts.
+        """
+        dag_id = entry['jid'].split('|', 1)[0]
+        try:
+            self.airflow_manager.delete_dag_run(dag_id, entry['run_id'])
+        except requests.exceptions.HTTPError as e:
+            if e.response is None or e.response.status_code != 404:
+                raise
+        self.metadata_cache.invalidate_job(entry['jid'])
+
+    def cache_job_result(self, dag_id: str, dag_run_id: str) -> bool:
+        """
+        Registers a successful job in the result cache keyed by its video id.
+        """
+        dag_run = self.get_dag_run(dag_id, dag_run_id)
+        artifact_tags = dag_run.get('artifact_tags', {})
+        if dag_run.get('status') != 'success':
+            return False
+        if not all(tag in artifact_tags for tag in ('metadata', 'Instrumental', 'subtitles')):
+            return False
+        video_id = artifact_tags['metadata'].get('value', {}).get('id')
+        if not video_id:
+            return False
+        self.result_cache.record(video_id, dag_run['jid'], dag_run_id)
+        return True
+
     def stop_job(self, dag_id: str, dag_run_id: str):
         self.airflow_manager.patch_dag_run(dag_id, dag_run_id, state='failed')
 
@@ -99,96 +216,173 @@ class JobManager:
                 self.airflow_manager.clear_task_instances(dag_id, dag_run_id, failed_task_ids=failed_task_ids)
         else:
             self.airflow_manager.clear_task_instances(dag_id, dag_run_id, failed_task_ids=None)
+        # The rerun may change or fail, it is cached again once it succeeds
+        self.result_cache.remove_run(dag_run_id)
+        # Downstream tasks are cleared as well
+        self.metadata_cache.invalidate_job(get_unique_job_id({"dag_id": dag_id, "dag_run_id": dag_run_id}))
+
+    def invalidate_task(self, dag_id: str, dag_run_id: str, task_id: str):
+        """
+        Drops the cached result of a task whose state changed.
+        """
+        self.metadata_cache.invalidate_task(get_unique_job_id({"dag_id": dag_id, "dag_run_id": dag_run_id}), task_id)
 
     def get_dag_ids(self, use_cache=True) -> list[str]:
-        dags = self.airflow_manager.get_dags()
-        dag_ids = [dag.get('dag_id') for dag in dags]
-        return dag_ids
+        def load():
+            dags = self.airflow_manager.get_dags()
+            return [dag.get('dag_id') for dag in dags]
+        return self.metadata_cache.load("dag-ids", "all", load, self.cache_ttl, use_cache)
     
     def get_dag_run_source(self, request_file_id: str, use_cache=True):
-        data = self.storage.read_json(request_file_id)
-        return data.get('results')
-
-    def get_task_export(self, dag_id: str, dag_run_id: str, task_id: str) -> dict:
-        task_export = {}
-        filepath = self.airflow_manager.get_task_result_filepath(dag_id, dag_run_id, task_id)
-        if not filepath:
-            return task_export
-        try:
-            args = self.storage.read_json(filepath)
-            artifact_keys = args.get('artifact_keys')
-            results = args.get('results')
-            exports = args.get('exports')
-            for export in exports:
-                tag = export.get('tag')
-                result_key = export.get('result_key')
-                task_export[tag] = results.get(result_key)
-                task_export[tag]['is_artifact'] = result_key in artifact_keys
-            return task_export
-        except:
-            return task_export
+        def load():
+            data = self.storage.read_json(request_file_id)
+            return data.get('results')
+        # Request files are never modified
+        return self.metadata_cache.load(
+            "sources", request_file_id, load, self.metadata_cache.immutable_ttl, use_cache
+        )
+
+    def get_task_args(self, dag_id: str, dag_run_id: str, task_id: str, use_cache=True) -> dict | None:
+        """
+        Reads the args a task passed downstream. They only stay unchanged once
+        the task succeeded, until it is cleared or reruns.
+        """
+        def load():
+            filepath = self.airflow_manager.get_task_result_filepath(dag_id, dag_run_id, task_id)
+            if not filepath:
+                return None
+            try:
+                return self.storage.read_json(filepath)
+            except:
+                return None
+        job_id = get_unique_job_id({"dag_id": dag_id, "dag_run_id": dag_run_id})
+        return self.metadata_cache.load_task_result(job_id, task_id, load, use_cache)
+
+    def get_task_export(self, dag_id: str, dag_run_id: str, task_id: str, use_cache=True) -> dict:
+        return parse_task_export(self.get_task_args(dag_id, dag_run_id, task_id, use_cache))
     
-    def get_dag_run_export(self, dag_id: str, dag_run_id: str, use_cache=True) -> dict:
-        raw_task_instances = self.airflow_manager.get_task_instances(dag_id, dag_run_id)
-        job_export = {}
-        for raw_task_instance in raw_task_instances:
-            task_id = raw_task_instance.get('task_id')
-            task_export = self.get_task_export(dag_id, dag_run_id, task_id)
-            job_export.update(task_export)
-        return job_export
+    def get_task_exports(self, dag_id: str, dag_run_id: str, raw_task_instances: list[dict] | None = None,
+                         use_cache=True) -> dict[str, dict]:
+        """
+        Returns the exports of each successful task of a job.
+        """
+        if raw_task_instances is None:
+            raw_task_instances = self.airflow_manager.get_task_instances(dag_id, dag_run_id)
+        # Only successful tasks have pushed their result
+        task_ids = [
+            raw_task_instance.get('task_id')
+            for raw_task_instance in raw_task_instances
+            if raw_task_instance.get('state') == 'success'
+        ]
+        task_exports = {}
+        for task_id, task_export in zip(task_ids, self.fetch_pool.imap(
+            lambda task_id: self.get_task_export(dag_id, dag_run_id, task_id, use_cache), task_ids
+        )):
+            if task_export:
+                task_exports[task_id] = task_export
+        return task_exports
     
     def get_task_order(self, dag_id: str, use_cache=True) -> list[str]:
-        tasks = self.airflow_manager.get_dag_tasks(dag_id)
-        return parse_task_order(tasks)
+        def load():
+            tasks = self.airflow_manager.get_dag_tasks(dag_id)
+            return parse_task_order(tasks)
+        return self.metadata_cache.load("task-orders", dag_id, load, self.cache_ttl, use_cache)
+
+    def get_job_state(self, raw_dag_run, version: int, raw_task_instances: list[dict] | None = None, use_cache=True):
+        """
+        Builds the state of a job and stores it as the snapshot later webhook updates are
+        applied on top of. `version` must be read before `raw_dag_run` and `raw_task_instances`.
 
-    def get_job_state(self, raw_dag_run):
+        When a webhook changed the job in the meantime, the build is repeated from fresh
+        reads. Should every attempt race, the last build is returned with the version it
+        was read at, so clients notice a gap with the next update and resync.
+        """
         dag_id = raw_dag_run.get('dag_id')
         dag_run_id = raw_dag_run.get('dag_run_id')
         request_file_id = raw_dag_run.get('conf', {}).get("request_file_id")
         if not all([dag_id, dag_run_id, request_file_id]) :
             raise Exception("Invalid dag run")
         
-        source = self.get_dag_run_source(request_file_id)
-        exports = self.get_dag_run_export(dag_id, dag_run_id)
+        job_id = get_unique_job_id(raw_dag_run)
+        source = self.fetch_pool.spawn(self.get_dag_run_source, request_file_id, use_cache)
+        for attempt in range(1, SNAPSHOT_ATTEMPTS + 1):
+            task_exports = self.get_task_exports(dag_id, dag_run_id, raw_task_instances, use_cache)
+            task_order = self.get_task_order(dag_id, use_cache)
+            if self.job_states.save_snapshot(job_id, version, task_order, task_exports) or attempt == SNAPSHOT_ATTEMPTS:
+                break
+            self.logger.info(f"Job {job_id} changed while it was built, rebuilding")
+            version = self.job_states.get_version(job_id)
+            raw_dag_run = self.airflow_manager.get_dag_run(dag_id, dag_run_id)
+            raw_task_instances = None
+        exports = merge_exports(task_exports, task_order)
         
         dag_run = parse_dag_run(raw_dag_run)
         if exports:
             dag_run['artifact_tags'] = exports
-        dag_run["source"] = source
-        dag_run["task_order"] = self.get_task_order(dag_id)
+        dag_run["source"] = source.get()
+        dag_run["task_order"] = task_order
+        dag_run["version"] = version
         return dag_run
 
+    def try_get_job_state(self, raw_dag_run, version: int, raw_task_instances: list[dict], use_cache=True) -> dict | None:
+        try:
+            return self.get_job_state(raw_dag_run, version, raw_task_instances, use_cache)
+        except Exception as e:
+            self.logger.error(f'Error processing DAG run {get_unique_job_id(raw_dag_run)}: {e}', exc_info=True)
+            return None
+
     def get_dag_runs(self, use_cache=True) -> Generator[dict, None, None]:
+        """
+        Builds the state of the latest jobs concurrently and yields each as soon as it is ready.
+        Task instances of all runs are fetched in one batch.
+        """
         dag_ids = self.get_dag_ids(use_cache)
         raw_dag_runs = self.airflow_manager.get_dag_runs(dag_ids)
-        for raw_dag_run in raw_dag_runs:
-            yield self.get_job_state(raw_dag_run)
+        if not raw_dag_runs:
+            return
+
+        # Read before the task instances, see get_job_state
+        job_ids = [get_unique_job_id(raw_dag_run) for raw_dag_run in raw_dag_runs]
+        versions = dict(zip(job_ids, self.job_states.get_versions(job_ids)))
+        raw_task_instances = self.airflow_manager.get_task_instances_batch(
+            list({raw_dag_run.get('dag_id') for raw_dag_run in raw_dag_runs}),
+            [raw_dag_run.get('dag_run_id') for raw_dag_run in raw_dag_runs]
+        )
+        task_instances_by_job: dict[str, list[dict]] = {}
+        for raw_task_instance in raw_task_instances:
+            task_instances_by_job.setdefault(get_unique_job_id(raw_task_instance), []).append(raw_task_instance)
+        for dag_id in {raw_dag_run.get('dag_id') for raw_dag_run in raw_dag_runs}:
+            # Warm the memoized task order once instead of once per run
+            self.get_task_order(dag_id, use_cache)
+
+        pool = Pool(len(raw_dag_runs))
+        for dag_run in pool.imap_unordered(
+            lambda raw_dag_run: self.try_get_job_state(
+                raw_dag_run, versions[get_unique_job_id(raw_dag_run)],
+                task_instances_by_job.get(get_unique_job_id(raw_dag_run), []), use_cache
+            ),
+            raw_dag_runs
+        ):
+            if dag_run is not None:
+                yield dag_run
 
     def get_dag_run(self, dag_id: str, dag_run_id: str, use_cache=True) -> dict:
+        version = self.job_states.get_version(get_unique_job_id({"dag_id": dag_id, "dag_run_id": dag_run_id}))
         raw_dag_run = self.airflow_manager.get_dag_run(dag_id, dag_run_id)
-        return self.get_job_state(raw_dag_run)
+        return self.get_job_state(raw_dag_run, version, use_cache=use_cache)
     
-    def get_task_artifacts(self, dag_id: str, dag_run_id: str, task_id: str) -> dict:
-        task_artifacts = {}
-        filepath = self.airflow_manager.get_task_result_filepath(dag_id, dag_run_id, task_id)
-        if not filepath:
-            return task_artifacts
-        try:
-            args = self.storage.read_json(filepath)
-            artifact_keys = args.get('artifact_keys')
-            results = args.get('results')
-            for key in results:
-                results[key]['is_artifact'] = key in artifact_keys
-            return results
-        except:
-            return task_artifacts
-
-    def get_task_state(self, raw_task_instance):
+    def get_task_artifacts(self, dag_id: str, dag_run_id: str, task_id: str, use_cache=True) -> dict:
+        return parse_task_artifacts(self.get_task_args(dag_id, dag_run_id, task_id, use_cache))
+
+    def get_task_state(self, raw_task_instance, use_cache=True):
         dag_id = raw_task_instance.get('dag_id')
         dag_run_id = raw_task_instance.get('dag_run_id')
         task_id = raw_task_instance.get('task_id')
         
-        artifacts = self.get_task_artifacts(dag_id, dag_run_id, task_id)
+        # Args of unfinished tasks may still change
+        artifacts = self.get_task_artifacts(
+            dag_id, dag_run_id, task_id, use_cache=use_cache and raw_task_instance.get('state') == 'success'
+        )
 
         task_instance = parse_task_instance(raw_task_instance)
         if artifacts:
@@ -197,13 +391,59 @@ class JobManager:
 
     def get_task_instances(self, dag_id: str, dag_run_id: str, use_cache=True) -> Generator[dict, None, None]:
         raw_task_instances = self.airflow_manager.get_task_instances(dag_id, dag_run_id)
+        version = self.job_states.get_version(get_unique_job_id({"dag_id": dag_id, "dag_run_id": dag_run_id}))
         for raw_task_instance in raw_task_instances:
-            yield self.get_task_state(raw_task_instance)
+            yield {**self.get_task_state(raw_task_instance, use_cache), "version": version}
 
     def get_task_instance(self, dag_id: str, dag_run_id: str, task_id: str, use_cache=True) -> dict:
         raw_task_instance = self.airflow_manager.get_task_instance(dag_id, dag_run_id, task_id)
-        return self.get_task_state(raw_task_instance)
+        return self.get_task_state(raw_task_instance, use_cache)
     
+    def apply_task_event(self, dag_id: str, dag_run_id: str, task_id: str, state: str) -> tuple[dict, dict] | None:
+        """
+        Applies a task state change reported by a webhook to the stored job state.
+        Only the result of the changed task is read.
+
+        Returns partial updates of the job and the task carrying the new version,
+        or None when the job has no stored state yet and must be fully synced.
+        """
+        job_id = get_unique_job_id({"dag_id": dag_id, "dag_run_id": dag_run_id})
+        if not self.job_states.exists(job_id):
+            return None
+
+        exports = None
+        artifacts = {}
+        if state == 'success':
+            args = self.get_task_args(dag_id, dag_run_id, task_id)
+            exports = parse_task_export(args) or None
+            artifacts = parse_task_artifacts(args)
+        version, artifact_tags = self.job_states.apply_task(job_id, task_id, exports)
+
+        job_update = {"jid": job_id, "artifact_tags": artifact_tags, "version": version, "partial": True}
+        task_update = {
+            "jid": job_id,
+            "tid": task_id,
+            "status": state,
+            "artifacts": artifacts,
+            "version": version,
+            "partial": True
+        }
+        return job_update, task_update
+
+    def apply_job_event(self, dag_id: str, dag_run_id: str) -> dict | None:
+        """
+        Applies a DAG run state change reported by a webhook, only the run itself is read.
+
+        Returns a partial update of the job carrying the new version, or None when
+        the job has no stored state yet and must be fully synced.
+        """
+        job_id = get_unique_job_id({"dag_id": dag_id, "dag_run_id": dag_run_id})
+        if not self.job_states.exists(job_id):
+            return None
+
+        raw_dag_run = self.airflow_manager.get_dag_run(dag_id, dag_run_id)
+        return {**parse_dag_run(raw_dag_run), "version": self.job_states.bump(job_id), "partial": True}
+
     def get_task_log(self, dag_id: str, dag_run_id: str, task_id: str, token: str | None) -> dict:
         task_instance = self.airflow_manager.get_task_instance(dag_id, dag_run_id, task_id)
         try_number = task_instance.get("try_number", 1)
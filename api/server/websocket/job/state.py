@@ -0,0 +1,130 @@
+import json
+
+from redis import Redis
+from redis.exceptions import WatchError
+
+STATE_PREFIX = "job-state"
+STATE_TTL = 86400 # 1 day
+EXPORTS_FIELD_PREFIX = "exports:"
+
+def merge_exports(task_exports: dict[str, dict], task_order: list[str]) -> dict:
+    """
+    Merges the exports of each task into the artifact tags of a job,
+    later tasks of the DAG overriding earlier ones.
+    """
+    order = {task_id: i for i, task_id in enumerate(task_order)}
+    artifact_tags = {}
+    for task_id in sorted(task_exports, key=lambda task_id: order.get(task_id, len(order))):
+        artifact_tags.update(task_exports[task_id])
+    return artifact_tags
+
+class JobStateStore:
+    """
+    Incremental state of each job, kept in one Redis hash per job shared by
+    every API instance.
+
+    The hash holds a version, bumped once for every change applied from a
+    webhook, and the exports of each successful task, so a finished task
+    only requires reading its own result to update the artifact tags of
+    its job. Clients receive the version with every update and resync the
+    job when they notice a gap.
+
+    A full rebuild of a job is only stored when no webhook changed the job
+    while it was read from Airflow, as it may lack that change.
+    """
+    def __init__(self, redis: Redis):
+        self.redis = redis
+
+    def _get_key(self, job_id: str) -> str:
+        return f"{STATE_PREFIX}:{job_id}"
+
+    def _lock(self, job_id: str):
+        return self.redis.lock(f"{STATE_PREFIX}-lock:{job_id}", timeout=10, blocking_timeout=5)
+
+    def exists(self, job_id: str) -> bool:
+        return bool(self.redis.exists(self._get_key(job_id)))
+
+    def get_version(self, job_id: str) -> int:
+        return int(self.redis.hget(self._get_key(job_id), "version") or 0) # type: ignore
+
+    def get_versions(self, job_ids: list[str]) -> list[int]:
+        pipe = self.redis.pipeline()
+        for job_id in job_ids:
+            pipe.hget(self._get_key(job_id), "version")
+        return [int(version or 0) for version in pipe.execute()]
+
+    def save_snapshot(self, job_id: str, version: int, task_order: list[str], task_exports: dict[str, dict]) -> bool:
+        """
+        Replaces the stored exports with a full rebuild of the job, read from
+        Airflow after `version` was read, leaving the version unchanged.
+
+        Returns:
+            Whether the rebuild was stored, False when the version has moved since
+            or the lock could not be taken in time.
+        """
+        key = self._get_key(job_id)
+        lock = self._lock(job_id)
+        if not lock.acquire():
+            return False
+        # bump() does not take the lock, the hash is watched for it
+        try:
+            with self.redis.pipeline() as pipe:
+                pipe.watch(key)
+                stored = pipe.hget(key, "version")
+                if stored is not None and int(stored) != version:
+                    return False
+                pipe.multi()
+                pipe.delete(key)
+                pipe.hset(key, mapping={
+                    "version": version,
+                    "task_order": json.dumps(task_order),
+                    **{
+                        f"{EXPORTS_FIELD_PREFIX}{task_id}": json.dumps(exports)
+                        for task_id, exports in task_exports.items()
+                    }
+                })
+                pipe.expire(key, STATE_TTL)
+                try:
+                    pipe.execute()
+                except WatchError:
+                    return False
+        finally:
+            lock.release()
+        return True
+
+    def apply_task(self, job_id: str, task_id: str, exports: dict | None) -> tuple[int, dict]:
+        """
+        Records the exports of a task, None once it is no longer successful,
+        and returns the new version with the merged artifact tags of the job.
+        """
+        key = self._get_key(job_id)
+        field = f"{EXPORTS_FIELD_PREFIX}{task_id}"
+        with self._lock(job_id):
+            pipe = self.redis.pipeline()
+            if exports is None:
+                pipe.hdel(key, field)
+            else:
+                pipe.hset(key, field, json.dumps(exports))
+            pipe.hincrby(key, "version", 1)
+            pipe.hgetall(key)
+            pipe.expire(key, STATE_TTL)
+            _, version, state, _ = pipe.execute()
+
+        task_exports = {
+            name[len(EXPORTS_FIELD_PREFIX):]: json.loads(value)
+            for name, value in state.items()
+            if name.startswith(EXPORTS_FIELD_PREFIX)
+        }
+        task_order = json.loads(state.get("task_order") or "[]")
+        return version, merge_exports(task_exports, task_order)
+
+    def bump(self, job_id: str) -> int:
+        """
+        Bumps the version of a job for a change that does not touch its exports.
+        """
+        key = self._get_key(job_id)
+        pipe = self.redis.pipeline()
+        pipe.hincrby(key, "version", 1)
+        pipe.expire(key, STATE_TTL)
+        version, _ = pipe.execute()
+        return version
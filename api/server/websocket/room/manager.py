@@ -1,8 +1,11 @@
 import json
 import time
+import orjson
 
+from collections import OrderedDict
 from redis import Redis
-from ...datatype import QueueItem
+from ...config import config
+from ...datatype import QueueItem, QueueType
 
 DEFAULT_ROOM_STATE = {
     'is_fullscreen': True,
@@ -15,9 +18,186 @@ DEFAULT_ROOM_STATE = {
 BOOL_KEYS = ['is_fullscreen', 'is_playing', 'is_vocal_on']
 INT_KEYS = ['volume', 'version']
 
+# Snapshots of idle rooms are dropped after a day
+SNAPSHOT_TTL = 24 * 3600
+# Rooms whose latest snapshot is kept in process
+LOCAL_SNAPSHOTS = 256
+
+GET_ROOM_SCRIPT = """
+local state_key, queue_key, song_key, snapshot_key = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local version = redis.call('HGET', state_key, 'version') or '0'
+
+-- 1. The caller already holds this version
+if ARGV[1] == version then
+    return {2, version}
+end
+
+-- 2. A snapshot was built for this version
+if ARGV[2] == '1' then
+    local snapshot = redis.call('HMGET', snapshot_key, 'version', 'payload')
+    if snapshot[1] == version and snapshot[2] then
+        return {1, version, snapshot[2]}
+    end
+end
+
+-- 3. Get all metadata (state), song IDs and song metadata
+local state_raw = redis.call('HGETALL', state_key)
+local song_ids = redis.call('ZRANGE', queue_key, 0, -1)
+local songs_raw = {}
+if #song_ids > 0 then
+    songs_raw = redis.call('HMGET', song_key, unpack(song_ids))
+end
+return {0, version, state_raw, song_ids, songs_raw}
+"""
+
+# Appends a delta under its version to the room's log, trimmed to about ARGV max_length entries
+LOG_DELTA = """
+local function log_delta(log_key, version, delta, max_length)
+    local last = redis.call('XREVRANGE', log_key, '+', '-', 'COUNT', 1)
+    if #last > 0 and tonumber(string.match(last[1][1], '^%d+')) >= version then
+        -- The room was reset, older deltas no longer apply
+        redis.call('DEL', log_key)
+    end
+    redis.call('XADD', log_key, 'MAXLEN', '~', max_length, version .. '-0', 'delta', delta)
+end
+"""
+
+ADD_SONG_SCRIPT = LOG_DELTA + """
+local song_key, q_key, state_key, log_key = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+redis.call('HSET', song_key, ARGV[1], ARGV[2])
+redis.call('ZADD', q_key, ARGV[3], ARGV[1])
+local new_v = redis.call('HINCRBY', state_key, 'version', 1)
+log_delta(log_key, new_v, ARGV[4], ARGV[5])
+return new_v
+"""
+
+# Playlist mutations of the batch script
+PLAYLIST_OPS = """
+local function remove_song(q_key, song_key, item_id)
+    redis.call('ZREM', q_key, item_id)
+    redis.call('HDEL', song_key, item_id)
+end
+
+local function move_to_top(q_key, item_id, now)
+    local first_item = redis.call('ZRANGE', q_key, 0, 0, 'WITHSCORES')
+    local new_score
+    if #first_item > 0 then
+        new_score = tonumber(first_item[2]) - 1
+    else
+        -- Queue was empty, use provided timestamp
+        new_score = tonumber(now)
+    end
+    redis.call('ZADD', q_key, new_score, item_id)
+end
+
+-- Returns whether any item was removed
+local function clear_to(q_key, song_key, item_id)
+    local rank = redis.call('ZRANK', q_key, item_id)
+    if not rank or tonumber(rank) == 0 then
+        return false
+    end
+    local to_remove = redis.call('ZRANGE', q_key, 0, rank - 1)
+    redis.call('ZREMRANGEBYRANK', q_key, 0, rank - 1)
+    if #to_remove > 0 then
+        redis.call('HDEL', song_key, unpack(to_remove))
+    end
+    return true
+end
+"""
+
+# Applies a list of operations under a single version, returns the version and
+# the delta of the operations that changed the room (empty when none did)
+APPLY_BATCH_SCRIPT = LOG_DELTA + PLAYLIST_OPS + """
+local q_key, song_key, state_key, log_key = KEYS[1], KEYS[2], KEYS[3], KEYS[4]
+local applied = {}
+for _, op in ipairs(cjson.decode(ARGV[1])) do
+    local delta = op['delta']
+    if delta['target'] == 'metadata' then
+        redis.call('HSET', state_key, unpack(op['fields']))
+        table.insert(applied, delta)
+    elseif delta['action'] == 'removed' then
+        remove_song(q_key, song_key, delta['item_id'])
+        table.insert(applied, delta)
+    elseif delta['action'] == 'moved_to_top' then
+        move_to_top(q_key, delta['item_id'], ARGV[2])
+        table.insert(applied, delta)
+    elseif delta['action'] == 'cleared_to' then
+        if clear_to(q_key, song_key, delta['item_id']) then
+            table.insert(applied, delta)
+        end
+    end
+end
+if #applied == 0 then
+    return {redis.call('HGET', state_key, 'version') or 0, ''}
+end
+
+local delta
+if #applied == 1 then
+    delta = cjson.encode(applied[1])
+else
+    delta = cjson.encode({target = 'batch', updates = applied})
+end
+local new_v = redis.call('HINCRBY', state_key, 'version', 1)
+log_delta(log_key, new_v, delta, ARGV[3])
+return {new_v, delta}
+"""
+
+# Playlist actions sent by controllers and the delta action they apply
+PLAYLIST_ACTIONS = {
+    "PLAY_NEXT": "moved_to_top",
+    "SKIP_TO": "cleared_to",
+    "REMOVE_SONG": "removed"
+}
+
+def validate_metadata(vals: dict) -> tuple[dict, dict]:
+    """
+    Validates metadata changes, returns the values to store and the diff to broadcast.
+
+    Raises:
+        ValueError: If a value is out of range or of the wrong type.
+    """
+    validated = {}
+    diff = {}
+    for key, value in vals.items():
+        if key not in DEFAULT_ROOM_STATE or key == 'version':
+            continue
+        
+        if key in BOOL_KEYS:
+            if not isinstance(value, bool): raise ValueError(f"{key} must be bool")
+            validated[key] = 1 if value else 0
+            diff[key] = value
+        elif key == 'volume':
+            vol = int(value)
+            if not (0 <= vol <= 100): raise ValueError("Volume must be 0-100")
+            validated[key] = vol
+            diff[key] = vol
+        else:
+            validated[key] = value
+            diff[key] = value
+    return validated, diff
+
+def get_queued_job_ids(redis: Redis) -> set[str]:
+    """
+    Returns the ids of the jobs queued in the playlist of any room.
+    """
+    job_ids = set()
+    for song_key in redis.scan_iter(match="room:*:song", count=500):
+        for raw_item in redis.hvals(song_key): # type: ignore
+            item = json.loads(raw_item)
+            if item.get("type") == QueueType.JOB.value:
+                job_ids.add(item.get("identifier"))
+    return job_ids
+
 class RoomManager:
     def __init__(self, redis: Redis):
         self.redis = redis
+        self.snapshot_cache = config.room.snapshot_cache
+        self.delta_log_size = config.room.delta_log_size
+        # Sent by EVALSHA, reloaded automatically after a NOSCRIPT error
+        self._get_room_script = redis.register_script(GET_ROOM_SCRIPT)
+        self._add_song_script = redis.register_script(ADD_SONG_SCRIPT)
+        self._apply_batch_script = redis.register_script(APPLY_BATCH_SCRIPT)
+        self._snapshots: OrderedDict[str, tuple[str, dict]] = OrderedDict()
 
     def _get_key(self, room_id: str, suffix: str) -> str:
         return f"room:{room_id}:{suffix}"
@@ -25,36 +205,79 @@ class RoomManager:
     def get_room(self, room_id: str) -> dict:
         """
         Atomically fetches both state and playlist.
-        """
-        lua = """
-        local state_key = KEYS[1]
-        local queue_key = KEYS[2]
-        local song_key  = KEYS[3]
 
-        -- 1. Get all metadata (state)
-        local state_raw = redis.call('HGETALL', state_key)
-        
-        -- 2. Get all song IDs from the queue
-        local song_ids = redis.call('ZRANGE', queue_key, 0, -1)
-        
-        -- 3. Get all song metadata for those IDs
-        local songs_raw = {}
-        if #song_ids > 0 then
-            songs_raw = redis.call('HMGET', song_key, unpack(song_ids))
-        end
-
-        return {state_raw, song_ids, songs_raw}
+        With the snapshot cache enabled the serialized room is stored next to
+        its version, an unchanged room is returned from the snapshot in one
+        round trip, or without any transfer when this process holds it already.
         """
         keys = [
             self._get_key(room_id, "state"),
             self._get_key(room_id, "queue"),
-            self._get_key(room_id, "song")
+            self._get_key(room_id, "song"),
+            self._get_key(room_id, "snapshot")
         ]
-        
-        raw_state, song_ids, raw_songs = self.redis.eval(lua, 3, *keys) # type: ignore
-        
-        # --- Post-processing logic in Python ---
-        
+        local = self._snapshots.get(room_id) if self.snapshot_cache else None
+        result = self._get_room_script(
+            keys=keys, args=[local[0] if local else '', int(self.snapshot_cache)]
+        ) # type: ignore
+        source, version = int(result[0]), result[1]
+        if source == 2 and local:
+            self._snapshots.move_to_end(room_id)
+            return local[1]
+        if source == 1:
+            data = orjson.loads(result[2])
+        else:
+            data = self._build_room(room_id, *result[2:])
+            if self.snapshot_cache:
+                pipe = self.redis.pipeline()
+                pipe.hset(keys[3], mapping={"version": version, "payload": orjson.dumps(data)})
+                pipe.expire(keys[3], SNAPSHOT_TTL)
+                pipe.execute()
+        if self.snapshot_cache:
+            self._snapshots[room_id] = (version, data)
+            self._snapshots.move_to_end(room_id)
+            if len(self._snapshots) > LOCAL_SNAPSHOTS:
+                self._snapshots.popitem(last=False)
+        return data
+
+    def get_room_deltas(self, room_id: str, version: int) -> list[dict] | None:
+        """
+        Returns the updates applied after `version` in order, so a client
+        holding that version catches up without a full sync.
+
+        Returns None when they are not all in the log anymore, or the client
+        is ahead of the room, and a full sync is needed instead.
+        """
+        pipe = self.redis.pipeline()
+        pipe.hget(self._get_key(room_id, "state"), "version")
+        pipe.xrange(self._get_key(room_id, "log"), min=f"{version + 1}-0", max="+", count=self.delta_log_size + 1)
+        raw_version, entries = pipe.execute()
+        current = int(raw_version or 0)
+        if version == current:
+            return []
+        if version > current or not entries:
+            return None
+
+        deltas = [
+            {"version": int(entry_id.split('-')[0]), **orjson.loads(fields["delta"])}
+            for entry_id, fields in entries
+        ]
+        # Every version in between must be present
+        if deltas[0]["version"] != version + 1 or deltas[-1]["version"] != current \
+                or len(deltas) != current - version:
+            return None
+        return deltas
+
+    def _log_args(self, delta: dict) -> list:
+        """
+        Delta and log bound passed to the scripts, the version is the entry ID.
+        """
+        return [orjson.dumps(delta), self.delta_log_size]
+
+    def _build_room(self, room_id: str, raw_state: list, song_ids: list, raw_songs: list) -> dict:
+        """
+        Builds the sync payload of a room from its raw state and playlist.
+        """
         # Convert Lua list [key1, val1, key2, val2] to Python dict
         state_dict = {}
         for i in range(0, len(raw_state), 2):
@@ -75,7 +298,7 @@ class RoomManager:
         playlist = [
             {
                 'id': song_id,
-                'item': json.loads(s) if s else None 
+                'item': orjson.loads(s) if s else None 
             }
             for song_id, s in zip(song_ids, raw_songs)
         ]
@@ -90,133 +313,70 @@ class RoomManager:
         
     def add_song_to_queue(self, room_id: str, item: QueueItem) -> dict:
         serialized = json.dumps(item.serialize())
-
-        pipe = self.redis.pipeline()
-        pipe.multi()
-        pipe.hset(self._get_key(room_id, "song"), item.item_id, serialized)
-        pipe.zadd(self._get_key(room_id, "queue"), {item.item_id: time.time()})
-        pipe.hincrby(self._get_key(room_id, "state"), "version", 1)
-        results = pipe.execute()
-        
-        return {
-            "version": int(results[-1]),
+        delta = {
             "target": "playlist",
             "action": "added",
             "item": json.loads(serialized)
         }
-
-    def remove_song(self, room_id: str, item_id: str) -> dict:
-        """
-        Remove a song from the playlist.
-        """
-        pipe = self.redis.pipeline()
-        pipe.multi()
-        pipe.zrem(self._get_key(room_id, "queue"), item_id)
-        pipe.hdel(self._get_key(room_id, "song"), item_id)
-        pipe.hincrby(self._get_key(room_id, "state"), "version", 1)
-        results = pipe.execute()
-        return {
-            "version": int(results[-1]),
-            "target": "playlist",
-            "action": "removed",
-            "item_id": item_id
-        }
-
-    def move_item_to_top(self, room_id: str, item_id: str) -> dict:
-        """
-        Move an item to the top of the playlist.
-        """
-        lua = """
-        local q_key, state_key = KEYS[1], KEYS[2]
-        local first_item = redis.call('ZRANGE', q_key, 0, 0, 'WITHSCORES')
-        local new_score
-        if #first_item > 0 then
-            new_score = tonumber(first_item[2]) - 1
-        else
-            -- Queue was empty, use provided timestamp
-            new_score = tonumber(ARGV[2])
-        end
-        redis.call('ZADD', q_key, new_score, ARGV[1])
-        local new_v = redis.call('HINCRBY', state_key, 'version', 1)
-        return new_v
-        """
         keys = [
+            self._get_key(room_id, "song"),
             self._get_key(room_id, "queue"),
-            self._get_key(room_id, "state")
+            self._get_key(room_id, "state"),
+            self._get_key(room_id, "log")
         ]
-        res = self.redis.eval(lua, 2, *keys, item_id, time.time())
-        return {
-            "version": int(res), # type: ignore
-            "target": "playlist",
-            "action": "moved_to_top", 
-            "item_id": item_id
-        }
+        res = self._add_song_script(keys=keys, args=[item.item_id, serialized, time.time(), *self._log_args(delta)])
+        return {"version": int(res), **delta} # type: ignore
 
-    def move_to_item(self, room_id: str, item_id: str) -> dict:
-        """Removes all items before item_id and returns the removed set."""
-        lua = """
-        local q_key, song_key, state_key = KEYS[1], KEYS[2], KEYS[3]
-        local rank = redis.call('ZRANK', q_key, ARGV[1])
-        if rank and tonumber(rank) > 0 then
-            local to_remove = redis.call('ZRANGE', q_key, 0, rank - 1)
-            redis.call('ZREMRANGEBYRANK', q_key, 0, rank - 1)
-            if #to_remove > 0 then
-                redis.call('HDEL', song_key, unpack(to_remove))
-            end
-            return redis.call('HINCRBY', state_key, 'version', 1)
-        end
-        return redis.call('HGET', state_key, 'version')
+    def apply_actions(self, room_id: str, actions: list[tuple[str, dict]]) -> tuple[dict | None, list[str | None]]:
         """
-        keys = [
-            self._get_key(room_id, "queue"), 
-            self._get_key(room_id, "song"), 
-            self._get_key(room_id, "state")
-        ]
-        res = self.redis.eval(lua, 3, *keys, item_id)
-        return {
-            "version": int(res), #type: ignore
-            "target": "playlist",
-            "action": "cleared_to",
-            "item_id": item_id
-        }
+        Applies a batch of controller actions in one transaction under a single version.
 
-    def set_metadata(self, room_id: str, vals: dict):
-        """Validates input, updates Redis, and returns a versioned diff."""
-        validated = {}
-        diff = {}
-        for key, value in vals.items():
-            if key not in DEFAULT_ROOM_STATE or key == 'version':
-                continue
-            
-            if key in BOOL_KEYS:
-                if not isinstance(value, bool): raise ValueError(f"{key} must be bool")
-                validated[key] = 1 if value else 0
-                diff[key] = value
-            elif key == 'volume':
-                vol = int(value)
-                if not (0 <= vol <= 100): raise ValueError("Volume must be 0-100")
-                validated[key] = vol
-                diff[key] = vol
-            else:
-                validated[key] = value
-                diff[key] = value
-
-        if not validated:
-            current_v = int(self.redis.hget(self._get_key(room_id, "state"), "version") or 0) # type: ignore
-            return {
-                "version": current_v,
-                "target": "metadata",
-                "changes": {}
-            }
-
-        pipe = self.redis.pipeline()
-        pipe.multi()
-        pipe.hset(self._get_key(room_id, "state"), mapping=validated)
-        pipe.hincrby(self._get_key(room_id, "state"), "version", 1)
-        results = pipe.execute()
+        Metadata changes are merged with the last write of each key winning,
+        playlist actions are applied in order. Returns the update to broadcast,
+        None when nothing changed, and the error of each action, None for the
+        accepted ones. Rejected actions do not affect the others.
+        """
+        errors: list[str | None] = []
+        ops = []
+        metadata = None
+        for action_type, payload in actions:
+            try:
+                if action_type == "UPDATE_METADATA":
+                    validated, diff = validate_metadata(payload)
+                    if validated:
+                        if metadata is None:
+                            metadata = {"delta": {"target": "metadata", "changes": {}}, "fields": {}}
+                            ops.append(metadata)
+                        metadata["delta"]["changes"].update(diff)
+                        metadata["fields"].update(validated)
+                elif action_type in PLAYLIST_ACTIONS:
+                    item_id = payload.get("item_id")
+                    if not isinstance(item_id, str):
+                        raise ValueError("Item ID is required")
+                    ops.append({"delta": {
+                        "target": "playlist",
+                        "action": PLAYLIST_ACTIONS[action_type],
+                        "item_id": item_id
+                    }})
+                else:
+                    raise ValueError(f"Unknown action type: {action_type}")
+                errors.append(None)
+            except Exception as e:
+                errors.append(str(e))
+        if not ops:
+            return None, errors
 
-        return {
-            "version": results[-1], 
-            "target": "metadata",
-            "changes": diff
-        }
+        if metadata is not None:
+            metadata["fields"] = [part for key, value in metadata["fields"].items() for part in (key, value)]
+        keys = [
+            self._get_key(room_id, "queue"),
+            self._get_key(room_id, "song"),
+            self._get_key(room_id, "state"),
+            self._get_key(room_id, "log")
+        ]
+        res = self._apply_batch_script(
+            keys=keys, args=[orjson.dumps(ops), time.time(), self.delta_log_size]
+        ) # type: ignore
+        if not res[1]:
+            return None, errors
+        return {"version": int(res[0]), **orjson.loads(res[1])}, errors
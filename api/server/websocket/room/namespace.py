@@ -1,13 +1,28 @@
+import threading
+
+from dataclasses import dataclass
 from flask import request
 from flask_socketio import join_room, leave_room
 from redis import Redis
+from ...config import config
 from ..base import LoggingNamespace, get_sid
 from .manager import RoomManager
 
+@dataclass
+class RoomAction:
+    sid: str
+    request_id: str
+    type: str
+    payload: dict
+
 class RoomNamespace(LoggingNamespace):
     def __init__(self, manager: RoomManager) -> None:
         super().__init__(namespace="/ktv")
         self.manager = manager
+        self.batch_window = config.room.batch_window
+        self._lock = threading.Lock()
+        # Actions waiting for the flush of their room
+        self._pending: dict[str, list[RoomAction]] = {}
     
     def on_connect(self):
         sid = get_sid(request)
@@ -17,12 +32,23 @@ class RoomNamespace(LoggingNamespace):
         sid = get_sid(request)
         self.logger.debug(f'Client {sid} disconnected')
     
-    def sync(self, room_id: str, room: str) -> None:
+    def sync(self, room_id: str, room: str, version: int | None = None) -> None:
+        """
+        Sends the room to a client, only the missed updates when it reports
+        a version still covered by the room's delta log.
+        """
+        if version is not None:
+            deltas = self.manager.get_room_deltas(room_id, int(version))
+            if deltas is not None:
+                self.logger.debug(f'Emitting {len(deltas)} deltas since version {version} to {room}')
+                for delta in deltas:
+                    self.emit('update', delta, room=room)
+                return
         data = self.manager.get_room(room_id)
         self.logger.debug(f'Emitting {data} to {room}')
         self.emit('update', data, room=room)
 
-    def on_join(self, room_id: str | None) -> None:
+    def on_join(self, room_id: str | None, version: int | None = None) -> None:
         """
         Handle the join event from the socketio client.
         """
@@ -30,7 +56,7 @@ class RoomNamespace(LoggingNamespace):
         if room_id is None:
             room_id = 'Default'
         try:
-            self.sync(room_id=room_id, room=sid)
+            self.sync(room_id=room_id, room=sid, version=version)
         except:
             self.logger.error(f'Failed to get sync data', exc_info=True)
             self.emit('error', {'message': 'Failed to join room'}, room=sid)
@@ -39,7 +65,7 @@ class RoomNamespace(LoggingNamespace):
         join_room(room_id)
         self.logger.debug(f'Client {sid} joined room {room_id}')
 
-    def on_sync(self, room_id: str | None) -> None:
+    def on_sync(self, room_id: str | None, version: int | None = None) -> None:
         """
         Handle the sync event from the socketio client.
         """
@@ -47,7 +73,7 @@ class RoomNamespace(LoggingNamespace):
         if room_id is None:
             room_id = 'Default'
         try:
-            self.sync(room_id=room_id, room=sid)
+            self.sync(room_id=room_id, room=sid, version=version)
         except:
             self.logger.error(f'Failed to get sync data', exc_info=True)
             self.emit('error', {'message': 'Failed to sync data'}, room=sid)
@@ -71,6 +97,9 @@ class RoomNamespace(LoggingNamespace):
         Consolidated dispatcher for all room mutations.
         Expected data format: 
         { "room_id": "...", "type": "SET_VOLUME", "payload": {...} }
+
+        Actions of a room arriving within `batch_window` seconds are applied
+        and broadcast together.
         """
         sid = get_sid(request)
         
@@ -89,28 +118,56 @@ class RoomNamespace(LoggingNamespace):
             self.logger.warning(f"Invalid action attempt by {sid}: {error_msg}")
             return
         
-        try:
-            if action_type == "UPDATE_METADATA":
-                result = self.manager.set_metadata(room_id, payload)
-            elif action_type == "PLAY_NEXT":
-                result = self.manager.move_item_to_top(room_id, payload.get("item_id"))
-            elif action_type == "SKIP_TO":
-                result = self.manager.move_to_item(room_id, payload.get("item_id"))
-            elif action_type == "REMOVE_SONG":
-                result = self.manager.remove_song(room_id, payload.get("item_id"))
-            else:
-                raise ValueError(f"Unknown action type: {action_type}")
+        action = RoomAction(sid=sid, request_id=request_id, type=action_type, payload=payload)
+        if not self.batch_window:
+            self.apply_actions(room_id, [action])
+            return
+        with self._lock:
+            pending = self._pending.get(room_id)
+            if pending is not None:
+                pending.append(action)
+                return
+            self._pending[room_id] = [action]
+        self.socketio.start_background_task(self._flush, room_id)
 
-            self.emit('action_response', {
-                'request_id': request_id,
-                'status': 'ok'
-            }, room=sid)
-            self.emit('update', result, room=room_id)
+    def _flush(self, room_id: str) -> None:
+        """
+        Applies the actions collected during each window until a window passes without any.
+        """
+        while True:
+            self.socketio.sleep(self.batch_window)
+            with self._lock:
+                actions = self._pending.get(room_id)
+                if not actions:
+                    self._pending.pop(room_id, None)
+                    return
+                self._pending[room_id] = []
+            self.apply_actions(room_id, actions)
 
+    def apply_actions(self, room_id: str, actions: list[RoomAction]) -> None:
+        """
+        Applies actions as one update, each request is acknowledged on its own.
+        """
+        try:
+            result, errors = self.manager.apply_actions(
+                room_id, [(action.type, action.payload) for action in actions]
+            )
         except Exception as e:
-            self.logger.error(f"Action {action_type} failed for room {room_id}", exc_info=True)
-            self.emit('action_response', {
-                'request_id': request_id,
-                'status': 'error',
-                'message': str(e)
-            }, room=sid)
\ No newline at end of file
+            self.logger.error(f"Actions {[action.type for action in actions]} failed for room {room_id}", exc_info=True)
+            result, errors = None, [str(e)] * len(actions)
+
+        for action, error in zip(actions, errors):
+            if error is None:
+                self.emit('action_response', {
+                    'request_id': action.request_id,
+                    'status': 'ok'
+                }, room=action.sid)
+            else:
+                self.logger.warning(f"Action {action.type} failed for room {room_id}: {error}")
+                self.emit('action_response', {
+                    'request_id': action.request_id,
+                    'status': 'error',
+                    'message': error
+                }, room=action.sid)
+        if result is not None:
+            self.emit('update', result, room=room_id)
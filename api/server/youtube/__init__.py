@@ -0,0 +1,10 @@
+from .client import YoutubeClient, normalize_query
+from .parser import SearchResult, parse_suggestions, parse_search_results
+
+__all__ = [
+    "YoutubeClient",
+    "normalize_query",
+    "SearchResult",
+    "parse_suggestions",
+    "parse_search_results"
+]
@@ -0,0 +1,200 @@
+import logging
+import threading
+import time
+import orjson
+import requests
+
+from typing import Callable, TypeVar
+from requests.adapters import HTTPAdapter
+from redis import Redis
+from .parser import SearchResult, parse_suggestions, parse_search_results
+
+YOUTUBE_CACHE_PREFIX = "youtube-cache"
+SUGGEST_URL = "http://suggestqueries.google.com/complete/search"
+SEARCH_URL = "https://youtube.com/results"
+T = TypeVar("T")
+
+def normalize_query(query: str) -> str:
+    """
+    Queries differing only in case and whitespace share a cache entry.
+    """
+    return ' '.join(query.lower().split())
+
+class Flight:
+    """
+    An upstream call shared by every caller of the same key.
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error: Exception | None = None
+
+class YoutubeClient:
+    """
+    Fetches YouTube suggestions and search results through a pooled session.
+
+    Results are cached in Redis for every API instance, keyed by normalized
+    query. Concurrent identical queries are coalesced into one upstream call:
+    within a process by waiting on the running call, across processes by a
+    short Redis lock after which the result is read from the cache.
+
+    Suggestions of a longer query are served from the cached suggestions of
+    one of its prefixes while enough of them still match.
+    """
+    def __init__(self, redis: Redis, search_ttl: int, suggest_ttl: int, timeout: float, pool_size: int,
+                 prefix_min_results: int, base_urls: tuple[str, str] = (SUGGEST_URL, SEARCH_URL)):
+        self.redis = redis
+        self.search_ttl = search_ttl
+        self.suggest_ttl = suggest_ttl
+        self.timeout = timeout
+        self.prefix_min_results = prefix_min_results
+        self.suggest_url, self.search_url = base_urls
+        self.logger = logging.getLogger(__name__)
+
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, pool_block=True)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._lock = threading.Lock()
+        self._flights: dict[str, Flight] = {}
+
+    def _get_key(self, suffix: str) -> str:
+        return f"{YOUTUBE_CACHE_PREFIX}:{suffix}"
+
+    def _count(self, kind: str, counter: str) -> None:
+        self.redis.hincrby(self._get_key("stats"), f"{kind}:{counter}", 1)
+
+    def _get_cached(self, kind: str, query: str):
+        raw_value = self.redis.get(self._get_key(f"{kind}:{query}"))
+        if raw_value is None:
+            return None
+        self._count(kind, "hits")
+        return orjson.loads(raw_value) # type: ignore
+
+    def _load(self, kind: str, query: str, fetch: Callable[[], T], ttl: int) -> T:
+        cached = self._get_cached(kind, query)
+        if cached is not None:
+            return cached
+        return self._load_missing(kind, query, fetch, ttl)
+
+    def _load_missing(self, kind: str, query: str, fetch: Callable[[], T], ttl: int) -> T:
+        """
+        Fetches a value missing from the cache, coalescing concurrent callers.
+        """
+        cache_key = self._get_key(f"{kind}:{query}")
+        with self._lock:
+            flight = self._flights.get(cache_key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[cache_key] = Flight()
+        if not leader:
+            self._count(kind, "coalesced")
+            if not flight.done.wait(self.timeout * 2):
+                raise TimeoutError(f"Timed out waiting for {cache_key}")
+            if flight.error is not None:
+                raise flight.error
+            return flight.value # type: ignore
+
+        try:
+            flight.value = self._load_locked(kind, cache_key, fetch, ttl)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(cache_key, None)
+            flight.done.set()
+
+    def _load_locked(self, kind: str, cache_key: str, fetch: Callable[[], T], ttl: int) -> T:
+        """
+        Fetches a missing value once across processes.
+        """
+        lock = self.redis.lock(f"{cache_key}:lock", timeout=self.timeout * 2, blocking_timeout=self.timeout)
+        acquired = lock.acquire()
+        try:
+            if acquired:
+                raw_value = self.redis.get(cache_key)
+                if raw_value is not None:
+                    # Fetched by another instance while waiting for the lock
+                    self._count(kind, "coalesced")
+                    return orjson.loads(raw_value) # type: ignore
+            self._count(kind, "misses")
+            started = time.perf_counter()
+            value = fetch()
+            self.logger.debug(f"Fetched {cache_key} in {time.perf_counter() - started:.3f}s")
+            self.redis.set(cache_key, orjson.dumps(value), ex=ttl)
+            return value
+        finally:
+            if acquired:
+                try:
+                    lock.release()
+                except Exception:
+                    # Expired while fetching
+                    pass
+
+    def _get(self, url: str, params: dict) -> str:
+        response = self.session.get(url, params=params, timeout=self.timeout)
+        if response.status_code != 200:
+            raise Exception("Failed to fetch data from YouTube API")
+        return response.text
+
+    def _suggest_from_prefix(self, query: str) -> list[str] | None:
+        """
+        Filters the cached suggestions of the longest cached prefix of the query.
+        """
+        prefixes = [query[:length] for length in range(len(query) - 1, 0, -1)]
+        if not prefixes:
+            return None
+        raw_values = self.redis.mget([self._get_key(f"suggest:{prefix}") for prefix in prefixes])
+        for raw_value in raw_values: # type: ignore
+            if raw_value is None:
+                continue
+            options = [option for option in orjson.loads(raw_value)[1:] if normalize_query(option).startswith(query)]
+            if len(options) >= self.prefix_min_results:
+                return [query, *options]
+            # Shorter prefixes match even fewer suggestions
+            return None
+        return None
+
+    def suggest(self, keyword: str) -> list[str]:
+        """
+        Returns the keyword followed by YouTube's suggestions for it.
+        The suggestions of a prefix are only used when the query itself is not cached.
+        """
+        query = normalize_query(keyword)
+        if not query:
+            return [keyword]
+        cached = self._get_cached("suggest", query)
+        if cached is not None:
+            return cached
+        cached = self._suggest_from_prefix(query)
+        if cached is not None:
+            self._count("suggest", "prefix_hits")
+            return cached
+        return self._load_missing(
+            "suggest", query,
+            lambda: parse_suggestions(self._get(self.suggest_url, {
+                "hl": "zh-tw", "client": "youtube", "jsonp": "suggestCallBack", "q": query
+            })),
+            self.suggest_ttl
+        )
+
+    def search(self, keyword: str) -> list[SearchResult]:
+        query = normalize_query(keyword)
+        results = self._load(
+            "search", query,
+            lambda: parse_search_results(self._get(self.search_url, {"search_query": query})),
+            self.search_ttl
+        )
+        # Cached results are decoded as dicts
+        return [SearchResult(**result) if isinstance(result, dict) else result for result in results]
+
+    def get_stats(self) -> dict:
+        stats = self.redis.hgetall(self._get_key("stats"))
+        kinds: dict[str, dict] = {}
+        for field, count in stats.items(): # type: ignore
+            kind, counter = field.rsplit(':', 1)
+            kinds.setdefault(kind, {})[counter] = int(count)
+        return kinds
@@ -0,0 +1,84 @@
+import json
+
+from dataclasses import dataclass
+
+_decoder = json.JSONDecoder()
+INITIAL_DATA_KEY = "ytInitialData"
+RESULTS_KEY = '"primaryContents":'
+
+@dataclass(slots=True)
+class SearchResult:
+    id: str | None
+    thumbnail: str | None
+    title: str
+    long_desc: str
+    channel: str
+    duration: str | int
+    publish_time: str | int
+    url_suffix: str | None
+    viewCountText: str
+
+def parse_suggestions(text: str) -> list[str]:
+    """
+    Parses the JSONP response of the suggestion API into the keyword followed by its suggestions.
+    """
+    if not text.startswith('suggestCallBack'):
+        raise Exception("Invalid response from YouTube API")
+    text = text[len('suggestCallBack') + 1:-1]
+    json_data = json.loads(text)
+    result = [json_data[0]]
+    for item in json_data[1]:
+        result.append(item[0])
+    return result
+
+def decode_primary_contents(text: str) -> dict:
+    """
+    Decodes only the results section of the `ytInitialData` embedded in a page.
+    The decoder stops at the end of the section instead of parsing the whole blob.
+    """
+    start = text.index(INITIAL_DATA_KEY)
+    position = text.find(RESULTS_KEY, start)
+    if position < 0:
+        end = text.index('</script>', start)
+        initial_data = text[start + len(INITIAL_DATA_KEY) + 3:end].strip()[:-1]
+        return json.loads(initial_data)["contents"]["twoColumnSearchResultsRenderer"]["primaryContents"]
+    position += len(RESULTS_KEY)
+    while text[position].isspace():
+        position += 1
+    return _decoder.raw_decode(text, position)[0]
+
+def first_text(runs: list[dict] | None) -> str:
+    return runs[0].get("text", '') if runs else ''
+
+def parse_video(video_data: dict) -> SearchResult:
+    thumbnails = video_data.get("thumbnail", {}).get("thumbnails")
+    snippets = video_data.get("detailedMetadataSnippets")
+    snippet_runs = snippets[0].get("snippetText", {}).get("runs", []) if snippets else []
+    endpoint = video_data.get("navigationEndpoint", {}).get("commandMetadata", {}).get("webCommandMetadata", {})
+    return SearchResult(
+        id=video_data.get("videoId"),
+        thumbnail=thumbnails[0].get("url") if thumbnails else None,
+        title=first_text(video_data.get("title", {}).get("runs")),
+        long_desc=''.join(run.get("text", '') for run in snippet_runs),
+        channel=first_text(video_data.get("longBylineText", {}).get("runs")),
+        duration=video_data.get("lengthText", {}).get("simpleText", 0),
+        publish_time=video_data.get("publishedTimeText", {}).get("simpleText", 0),
+        url_suffix=endpoint.get("url"),
+        viewCountText=video_data.get("viewCountText", {}).get("simpleText", '')
+    )
+
+def parse_search_results(text: str) -> list[SearchResult]:
+    """
+    Parses the videos out of the `ytInitialData` embedded in a search results page.
+    """
+    primary_contents = decode_primary_contents(text)
+    results = []
+    for contents in primary_contents["sectionListRenderer"]["contents"]:
+        section = contents.get("itemSectionRenderer")
+        if section is None:
+            continue
+        for video in section["contents"]:
+            video_data = video.get("videoRenderer")
+            if video_data is not None:
+                results.append(parse_video(video_data))
+    return results
@@ -0,0 +1,8 @@
+import os
+import sys
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES_DIR = os.path.join(API_DIR, "tests", "fixtures")
+
+# The server package is imported the same as with PYTHONPATH=.
+sys.path.insert(0, API_DIR)
@@ -0,0 +1,246 @@
+"""
+Parsers of saved YouTube pages, and coalescing and caching of the YouTube
+client against fakeredis, fetching the saved pages from a local HTTP server.
+
+Run from the `api` directory:
+
+    python -m pytest tests
+"""
+import os
+import time
+import threading
+import fakeredis
+import orjson
+import pytest
+import requests
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+from conftest import FIXTURES_DIR
+from server.youtube import YoutubeClient, SearchResult, normalize_query, parse_suggestions, parse_search_results
+
+def read_fixture(name: str) -> str:
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+def test_parse_suggestions():
+    assert parse_suggestions(read_fixture("youtube_suggest.txt")) == [
+        "周杰倫", "周杰倫", "周杰倫 晴天", "周杰倫 稻香", "周杰倫 演唱會", "周杰倫 告白氣球"
+    ]
+
+def test_parse_suggestions_rejects_other_responses():
+    with pytest.raises(Exception, match="Invalid response"):
+        parse_suggestions('window.google.ac.h(["q",[]])')
+
+def test_parse_search_results():
+    results = parse_search_results(read_fixture("youtube_search.html"))
+
+    # Ads, channels, shorts and continuations are skipped
+    assert [result.id for result in results] == ["kfXdP7nZIiE", "Ubll8A9tmUE", "LIVE000stream"]
+    assert results[0] == SearchResult(
+        id="kfXdP7nZIiE",
+        thumbnail="https://i.ytimg.com/vi/kfXdP7nZIiE/hq720.jpg?sqp=-oaymwEc",
+        title="周杰倫 Jay Chou【晴天 Sunny Day】Official MV",
+        long_desc="故事的小黃花 從出生那年就飄著 童年的盪鞦韆 隨記憶一直晃到現在",
+        channel="周杰倫 Jay Chou",
+        duration="4:30",
+        publish_time="10年前",
+        url_suffix="/watch?v=kfXdP7nZIiE",
+        viewCountText="觀看次數：248,307,162次"
+    )
+    # Live streams have no length, publish time, snippet or watch URL
+    live = results[2]
+    assert (live.duration, live.publish_time, live.long_desc, live.url_suffix) == (0, 0, '', None)
+
+def test_parse_search_results_without_initial_data():
+    with pytest.raises(ValueError):
+        parse_search_results("<html><body>Our systems have detected unusual traffic</body></html>")
+
+def test_normalize_query():
+    assert normalize_query("  Jay   CHOU\t晴天 ") == "jay chou 晴天"
+
+class Upstream:
+    """
+    Stands in for YouTube on a local port, recording the requests and
+    optionally holding them until released.
+    """
+    def __init__(self):
+        self.text = ""
+        self.status = 200
+        self.calls: list[tuple[str, dict]] = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    @property
+    def base_urls(self) -> tuple[str, str]:
+        host, port = self.server.server_address[:2]
+        return (f"http://{host}:{port}/complete/search", f"http://{host}:{port}/results")
+
+    def serve(self, text: str, blocking: bool = False) -> None:
+        self.text = text
+        if blocking:
+            self.release.clear()
+        else:
+            self.release.set()
+
+    def close(self) -> None:
+        self.release.set()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _make_handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                upstream.calls.append((url.path, {key: values[0] for key, values in parse_qs(url.query).items()}))
+                upstream.started.set()
+                upstream.release.wait(5)
+                body = upstream.text.encode("utf-8")
+                self.send_response(upstream.status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+@pytest.fixture
+def upstream():
+    upstream = Upstream()
+    yield upstream
+    upstream.close()
+
+def make_client(server, upstream: Upstream, search_ttl: int = 60, prefix_min_results: int = 2,
+                timeout: float = 2) -> YoutubeClient:
+    return YoutubeClient(
+        fakeredis.FakeRedis(server=server, decode_responses=True),
+        search_ttl=search_ttl, suggest_ttl=60, timeout=timeout, pool_size=4, prefix_min_results=prefix_min_results,
+        base_urls=upstream.base_urls
+    )
+
+def run_concurrently(count: int, func) -> tuple[list, list[threading.Thread]]:
+    results: list = [None] * count
+    def run(i: int):
+        try:
+            results[i] = func()
+        except Exception as e:
+            results[i] = e
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(count)]
+    for thread in threads:
+        thread.start()
+    return results, threads
+
+def test_coalesces_identical_searches(server, upstream):
+    upstream.serve(read_fixture("youtube_search.html"), blocking=True)
+    client = make_client(server, upstream)
+
+    results, threads = run_concurrently(8, lambda: client.search("Jay Chou 晴天"))
+    assert upstream.started.wait(5)
+    # Let the other callers queue up behind the running call
+    time.sleep(0.1)
+    upstream.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert upstream.calls == [("/results", {"search_query": "jay chou 晴天"})]
+    assert all(result == results[0] for result in results)
+    assert [result.id for result in results[0]] == ["kfXdP7nZIiE", "Ubll8A9tmUE", "LIVE000stream"]
+    assert client.get_stats()["search"] == {"misses": 1, "coalesced": 7}
+
+def test_coalesces_across_instances(server, upstream):
+    upstream.serve(read_fixture("youtube_search.html"), blocking=True)
+    clients = [make_client(server, upstream), make_client(server, upstream)]
+
+    results, threads = [], []
+    for client in clients:
+        thread = threading.Thread(target=lambda client=client: results.append(client.search("晴天")))
+        thread.start()
+        threads.append(thread)
+        # Started in order, the second instance waits on the Redis lock of the first
+        assert upstream.started.wait(5)
+    time.sleep(0.1)
+    upstream.release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(upstream.calls) == 1
+    assert results[0] == results[1]
+
+def test_error_reaches_every_waiter_and_is_not_cached(server, upstream):
+    upstream.serve("Service Unavailable", blocking=True)
+    upstream.status = 503
+    client = make_client(server, upstream)
+
+    results, threads = run_concurrently(3, lambda: client.search("晴天"))
+    assert upstream.started.wait(5)
+    time.sleep(0.1)
+    upstream.release.set()
+    for thread in threads:
+        thread.join(5)
+    assert all(isinstance(result, Exception) and "Failed to fetch" in str(result) for result in results)
+
+    upstream.serve(read_fixture("youtube_search.html"))
+    upstream.status = 200
+    assert len(client.search("晴天")) == 3
+    assert len(upstream.calls) == 2
+
+def test_timeout_is_not_cached(server, upstream):
+    upstream.serve(read_fixture("youtube_search.html"), blocking=True)
+    client = make_client(server, upstream, timeout=0.2)
+
+    with pytest.raises(requests.exceptions.Timeout):
+        client.search("晴天")
+    upstream.release.set()
+    assert len(client.search("晴天")) == 3
+    assert len(upstream.calls) == 2
+
+def test_caches_results_until_ttl(server, upstream):
+    upstream.serve(read_fixture("youtube_search.html"))
+    client = make_client(server, upstream, search_ttl=1)
+
+    first = client.search("Jay Chou")
+    # Differently spelled queries share the entry, decoded back into results
+    assert client.search("  jay CHOU ") == first
+    assert len(upstream.calls) == 1
+    assert 0 < client.redis.ttl("youtube-cache:search:jay chou") <= 1
+
+    time.sleep(1.1)
+    assert client.search("Jay Chou") == first
+    assert len(upstream.calls) == 2
+    assert client.get_stats()["search"] == {"misses": 2, "hits": 1}
+
+def test_suggest_from_prefix_on_miss(server, upstream):
+    upstream.serve(read_fixture("youtube_suggest.txt"))
+    client = make_client(server, upstream, prefix_min_results=1)
+
+    client.suggest("周杰倫")
+    assert upstream.calls == [("/complete/search", {
+        "hl": "zh-tw", "client": "youtube", "jsonp": "suggestCallBack", "q": "周杰倫"
+    })]
+    assert client.suggest("周杰倫 晴") == ["周杰倫 晴", "周杰倫 晴天"]
+    assert len(upstream.calls) == 1
+    assert client.get_stats()["suggest"] == {"misses": 1, "prefix_hits": 1}
+
+def test_suggest_prefers_exact_entry_over_prefix(server, upstream):
+    upstream.serve(read_fixture("youtube_suggest.txt"))
+    client = make_client(server, upstream, prefix_min_results=1)
+
+    client.suggest("周杰倫")
+    exact = ["周杰倫 晴", "周杰倫 晴天", "周杰倫 晴天 伴奏", "周杰倫 晴天 吉他"]
+    client.redis.set("youtube-cache:suggest:周杰倫 晴", orjson.dumps(exact))
+    assert client.suggest("周杰倫 晴") == exact
+    assert len(upstream.calls) == 1
+    assert client.get_stats()["suggest"] == {"misses": 1, "hits": 1}
@@ -0,0 +1,117 @@
+"""
+Accuracy and speed of matching lyrics words to transcription words, the
+banded phonetic aligner of `tasks.utils.alignment` against the former
+difflib matching of pinyin.
+
+Run from the `karaoke` directory:
+
+    PYTHONPATH=dags python benchmarks/lyrics_alignment.py --scale 1 4 16
+
+The regression corpus, `lyrics_alignment_corpus.json`, holds lyrics and
+transcriptions built from them with the errors of speech recognition:
+homophones, near homophones, unrelated characters, missed and extra
+characters, missed lines, hallucinated lines and misheard English words.
+Every case records, for every lyrics word, the index of the transcription
+word it was sung as, or -1 when it was not transcribed. A word counts as
+correct when it is matched to that index, or left unmatched when it has
+none. Both matchers include the gap filtering and filling of `do_mapping`.
+
+`--scale` repeats the longest case to time longer inputs. `--check` exits
+with an error when the aligner falls below `--min-accuracy` on a case.
+"""
+import os
+import sys
+import json
+import time
+import difflib
+import argparse
+import statistics
+
+from typing import Callable
+from pypinyin import lazy_pinyin
+from tasks.mapping import separate_sentence, fill_typo_sequence, match_words
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "lyrics_alignment_corpus.json")
+
+def match_words_difflib(lyrics_words: list[str], transcription_words: list[str]) -> list[int]:
+    matcher = difflib.SequenceMatcher(None, lazy_pinyin(lyrics_words), lazy_pinyin(transcription_words))
+
+    matched = [-1] * len(lyrics_words)
+    for blocks in matcher.get_matching_blocks():
+        matched[blocks.a:blocks.a+blocks.size] = list(range(blocks.b, blocks.b+blocks.size))
+    for i in range(len(matched)):
+        if matched[i] == -1:
+            continue
+        target_val = next((matched[prev] for prev in range(i - 1, -1, -1) if matched[prev] != -1), None)
+        if target_val is not None:
+            is_next_unassigned = (i + 1 < len(matched)) and (matched[i + 1] == -1)
+            if (matched[i] - target_val > 3) and is_next_unassigned:
+                matched[i] = -1
+    fill_typo_sequence(matched, len(transcription_words))
+    return matched
+
+MATCHERS: dict[str, Callable[[list[str], list[str]], list[int]]] = {
+    "difflib": match_words_difflib,
+    "aligner": match_words,
+}
+
+def get_words(case: dict) -> tuple[list[str], list[str]]:
+    lyrics_words = [w for line in case["lyrics"].splitlines() for w in separate_sentence(line)]
+    transcription_words = [w for entry in case["transcription"] for w in separate_sentence(entry["text"])]
+    return lyrics_words, transcription_words
+
+def get_accuracy(matched: list[int], expected: list[int]) -> float:
+    return sum(m == e for m, e in zip(matched, expected)) / len(expected)
+
+def timed(func: Callable, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of matching lyrics to transcriptions.')
+    parser.add_argument('--corpus', default=CORPUS)
+    parser.add_argument('--scale', type=int, nargs='+', default=[1, 4, 16], help='Repeats of the longest case')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--check', action='store_true', help='Fail when the aligner falls below --min-accuracy')
+    parser.add_argument('--min-accuracy', type=float, default=0.95)
+    args = parser.parse_args()
+
+    with open(args.corpus, encoding='utf-8') as f:
+        cases = json.load(f)["cases"]
+
+    regressions = []
+    print(f"{'case':<16} {'words':>6}" + ''.join(f"  {name:>8} {'time':>9}" for name in MATCHERS))
+    for case in cases:
+        lyrics_words, transcription_words = get_words(case)
+        accuracies = {}
+        line = f"{case['name']:<16} {len(lyrics_words):>6}"
+        for name, matcher in MATCHERS.items():
+            accuracies[name] = get_accuracy(matcher(lyrics_words, transcription_words), case["expected"])
+            elapsed = timed(lambda: matcher(lyrics_words, transcription_words), args.repeat)
+            line += f"  {accuracies[name]:8.1%} {elapsed * 1000:7.2f}ms"
+        print(line)
+        if accuracies["aligner"] < args.min_accuracy:
+            regressions.append(case["name"])
+
+    longest = max(cases, key=lambda case: len(case["expected"]))
+    lyrics_words, transcription_words = get_words(longest)
+    print(f"\n{'scale':<16} {'words':>6}" + ''.join(f"  {name:>18}" for name in MATCHERS))
+    for scale in args.scale:
+        lyrics = lyrics_words * scale
+        transcription = transcription_words * scale
+        line = f"{longest['name'] + ' x' + str(scale):<16} {len(lyrics):>6}"
+        for matcher in MATCHERS.values():
+            line += f"  {timed(lambda: matcher(lyrics, transcription), args.repeat) * 1000:16.2f}ms"
+        print(line)
+
+    if args.check and regressions:
+        print(f"\nAligner below {args.min_accuracy:.0%} on: {', '.join(regressions)}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Size, write and read time of word timelines as indented JSON (the former
+artifact format), compact JSON and the binary timeline format.
+
+Run from the `karaoke` directory:
+
+    PYTHONPATH=dags python benchmarks/timeline_format.py --words 2000 20000
+
+Synthetic timelines of `--words` words are generated both flat, like the
+transcription, and as lines of words, like the mapped lyrics. The binary
+format is also timed opening the memory map and reading the start column
+alone, the way a vectorized consumer would.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+import statistics
+
+from typing import Callable
+from tasks.utils.timeline import Timeline, write_timeline, read_timeline
+
+CHARACTERS = "我你他的是在有不了人這中大為上個國說們到"
+
+def generate(words: int, nested: bool) -> list:
+    rng = random.Random(words)
+    timeline = []
+    position = 0.0
+    for _ in range(words):
+        duration = rng.uniform(0.1, 0.6)
+        word = {"start": position, "end": position + duration, "word": rng.choice(CHARACTERS)}
+        if not nested:
+            word["no_speech_prob"] = rng.random() if rng.random() > 0.1 else None
+        timeline.append(word)
+        position += duration + rng.uniform(0, 0.2)
+    if not nested:
+        return timeline
+    lines = []
+    while timeline:
+        length = rng.randint(4, 14)
+        lines.append(timeline[:length])
+        timeline = timeline[length:]
+    return lines
+
+def write_json(path: str, timeline: list, indent: int | None) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        if indent:
+            json.dump(timeline, f, indent=indent, ensure_ascii=False)
+        else:
+            json.dump(timeline, f, separators=(',', ':'), ensure_ascii=False)
+
+def read_json(path: str) -> list:
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def read_start_column(path: str) -> float:
+    with Timeline(path) as timeline:
+        return float(timeline.column("start").sum())
+
+def timed(func: Callable, repeat: int) -> float:
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark of the word timeline artifact formats.')
+    parser.add_argument('--words', type=int, nargs='+', default=[2000, 20000], help='Words per timeline')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for words in args.words:
+            for nested in (False, True):
+                timeline = generate(words, nested)
+                print(f"{words} words, {'lines' if nested else 'flat'}")
+                formats = {
+                    "json indent": (
+                        lambda path: write_json(path, timeline, 2), read_json
+                    ),
+                    "json compact": (
+                        lambda path: write_json(path, timeline, None), read_json
+                    ),
+                    "binary": (
+                        lambda path: write_timeline(path, timeline), read_timeline
+                    ),
+                }
+                for label, (write, read) in formats.items():
+                    path = os.path.join(directory, label.replace(' ', '_'))
+                    write_time = timed(lambda: write(path), args.repeat)
+                    read_time = timed(lambda: read(path), args.repeat)
+                    if read(path) != timeline:
+                        raise RuntimeError(f"{label} does not round-trip")
+                    print(
+                        f"  {label:<13} {os.path.getsize(path) / 1024:9.1f} KiB"
+                        f"  write {write_time * 1000:8.3f}ms  read {read_time * 1000:8.3f}ms"
+                    )
+                column_time = timed(lambda: read_start_column(os.path.join(directory, "binary")), args.repeat)
+                print(f"  {'binary column':<13} {'':13}  start column {column_time * 1000:8.3f}ms")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
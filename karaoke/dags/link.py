@@ -1,3 +1,4 @@
+import os
 import requests
 
 from enum import Enum
@@ -6,6 +7,9 @@ from airflow.sdk import DAG, Param
 from airflow.providers.standard.operators.bash import BashOperator
 from airflow.providers.http.notifications.http import send_http_notification
 
+# Runs mapping, sentence and subtitle generation as one task
+FUSED_POSTPROCESS = os.environ.get("KTV_FUSED_POSTPROCESS", "false").lower() in ("1", "true", "yes")
+
 class QueueType(Enum):
     BASE = "base_tasks_queue"
     GPU = "gpu_tasks_queue"
@@ -55,12 +59,14 @@ with DAG(
     },
     tags=[]
 ) as dag:
-    exec_prefix = "PYTHONPATH=/opt/airflow/dags python -m tasks"
+    # Tasks are handed to the warm worker (tasks.worker) when it is running,
+    # otherwise the client runs them in a fresh interpreter.
+    exec_prefix = "PYTHONPATH=/opt/airflow/dags python -m tasks.client"
     mm_exec_prefix = "PYTHONPATH=/opt/airflow/dags /opt/env/bin/python -m tasks"
     download_audio = BashOperator(
         task_id="download_audio",
         task_display_name="Audio Downloading",
-        bash_command=f"{exec_prefix}.download cloud --run_id '{{{{ run_id }}}}' --type audio --file_id '{{{{ params.request_file_id }}}}'",
+        bash_command=f"{exec_prefix} download cloud --run_id '{{{{ run_id }}}}' --type audio --file_id '{{{{ params.request_file_id }}}}'",
         do_xcom_push=True,
         queue=QueueType.BASE.value
     )
@@ -68,7 +74,7 @@ with DAG(
     identify = BashOperator(
         task_id="identify_audio",
         task_display_name="Music identification",
-        bash_command=f"{exec_prefix}.identify cloud --run_id '{{{{ run_id }}}}' --file_id '{{{{ ti.xcom_pull(task_ids='download_audio') }}}}'",
+        bash_command=f"{exec_prefix} identify cloud --run_id '{{{{ run_id }}}}' --file_id '{{{{ ti.xcom_pull(task_ids='download_audio') }}}}'",
         do_xcom_push=True,
         queue=QueueType.BASE.value
     )
@@ -76,7 +82,7 @@ with DAG(
     lyrics = BashOperator(
         task_id="retrive_lyrics",
         task_display_name="Lyrics retrieval",
-        bash_command=f"""{exec_prefix}.lyric cloud --run_id '{{{{ run_id }}}}' \
+        bash_command=f"""{exec_prefix} lyric cloud --run_id '{{{{ run_id }}}}' \
             --file_ids '{{{{ ti.xcom_pull(task_ids='download_audio') }}}}' \
                 '{{{{ ti.xcom_pull(task_ids='identify_audio') }}}}' 
         """,
@@ -87,7 +93,7 @@ with DAG(
     separate = BashOperator(
         task_id="voice_separation",
         task_display_name="Vocal Separation",
-        bash_command=f"{exec_prefix}.separate cloud --run_id '{{{{ run_id }}}}' --file_id '{{{{ ti.xcom_pull(task_ids='download_audio') }}}}'",                
+        bash_command=f"{exec_prefix} separate cloud --run_id '{{{{ run_id }}}}' --file_id '{{{{ ti.xcom_pull(task_ids='download_audio') }}}}'",                
         do_xcom_push=True,
         queue=QueueType.GPU.value
     )
@@ -95,7 +101,7 @@ with DAG(
     vad = BashOperator(
         task_id="voice_detection",
         task_display_name="Voice activity detection",
-        bash_command=f"{exec_prefix}.detect cloud --run_id '{{{{ run_id }}}}' --file_id '{{{{ ti.xcom_pull(task_ids='voice_separation') }}}}'",
+        bash_command=f"{exec_prefix} detect cloud --run_id '{{{{ run_id }}}}' --file_id '{{{{ ti.xcom_pull(task_ids='voice_separation') }}}}'",
         do_xcom_push=True,
         queue=QueueType.BASE.value
     )
@@ -103,7 +109,7 @@ with DAG(
     transcript = BashOperator(
         task_id="voice_transcription",
         task_display_name="Lyrics Transcription",
-        bash_command=f"""{exec_prefix}.transcript cloud --run_id '{{{{ run_id }}}}' \
+        bash_command=f"""{exec_prefix} transcript cloud --run_id '{{{{ run_id }}}}' \
             --file_ids '{{{{ ti.xcom_pull(task_ids='voice_separation') }}}}' \
              '{{{{ ti.xcom_pull(task_ids='voice_detection') }}}}' \
              '{{{{ ti.xcom_pull(task_ids='retrive_lyrics') }}}}' \
@@ -112,42 +118,60 @@ with DAG(
         queue=QueueType.GPU.value
     )
 
-    mapping = BashOperator(
-        task_id="lyrics_mapping",
-        task_display_name="Merge transcription and lyrics",
-        bash_command=f"""{exec_prefix}.mapping cloud --run_id '{{{{ run_id }}}}' \
-            --file_ids '{{{{ ti.xcom_pull(task_ids='voice_transcription') }}}}' \
-             '{{{{ ti.xcom_pull(task_ids='retrive_lyrics') }}}}' \
-        """,                
-        do_xcom_push=True,
-        queue=QueueType.BASE.value
-    )
+    if FUSED_POSTPROCESS:
+        # Same artifacts and exports as the three tasks below without their
+        # scheduling and the storage round trips between them
+        postprocess = BashOperator(
+            task_id="postprocess",
+            task_display_name="Subtitle Generation",
+            bash_command=f"""{exec_prefix} postprocess cloud --run_id '{{{{ run_id }}}}' \
+                --file_ids '{{{{ ti.xcom_pull(task_ids='download_audio') }}}}' \
+                '{{{{ ti.xcom_pull(task_ids='identify_audio') }}}}' \
+                '{{{{ ti.xcom_pull(task_ids='retrive_lyrics') }}}}' \
+                '{{{{ ti.xcom_pull(task_ids='voice_transcription') }}}}'
+            """,
+            do_xcom_push=True,
+            queue=QueueType.BASE.value
+        )
+        [download_audio, identify, lyrics, transcript] >> postprocess
+    else:
+        mapping = BashOperator(
+            task_id="lyrics_mapping",
+            task_display_name="Merge transcription and lyrics",
+            bash_command=f"""{exec_prefix} mapping cloud --run_id '{{{{ run_id }}}}' \
+                --file_ids '{{{{ ti.xcom_pull(task_ids='voice_transcription') }}}}' \
+                 '{{{{ ti.xcom_pull(task_ids='retrive_lyrics') }}}}' \
+            """,                
+            do_xcom_push=True,
+            queue=QueueType.BASE.value
+        )
 
-    sentence = BashOperator(
-        task_id="generate_sentence",
-        task_display_name="Generate Sentence",
-        bash_command=f"""{exec_prefix}.sentence cloud --run_id '{{{{ run_id }}}}' \
-            --file_ids '{{{{ ti.xcom_pull(task_ids='lyrics_mapping') }}}}'
-        """,                
-        do_xcom_push=True,
-        queue=QueueType.BASE.value
-    )
+        sentence = BashOperator(
+            task_id="generate_sentence",
+            task_display_name="Generate Sentence",
+            bash_command=f"""{exec_prefix} sentence cloud --run_id '{{{{ run_id }}}}' \
+                --file_ids '{{{{ ti.xcom_pull(task_ids='lyrics_mapping') }}}}'
+            """,                
+            do_xcom_push=True,
+            queue=QueueType.BASE.value
+        )
+
+        subtitle = BashOperator(
+            task_id="generate_subtitle",
+            task_display_name="Subtitle Generation",
+            bash_command=f"""{exec_prefix} subtitle cloud --run_id '{{{{ run_id }}}}' \
+                --file_ids '{{{{ ti.xcom_pull(task_ids='generate_sentence') }}}}' \
+                '{{{{ ti.xcom_pull(task_ids='download_audio') }}}}' \
+                '{{{{ ti.xcom_pull(task_ids='identify_audio') }}}}'
+            """,                
+            do_xcom_push=True,
+            queue=QueueType.BASE.value
+        )
+
+        [download_audio, sentence] >> subtitle
+        [separate, mapping] >> sentence
+        [transcript, lyrics] >> mapping
 
-    subtitle = BashOperator(
-        task_id="generate_subtitle",
-        task_display_name="Subtitle Generation",
-        bash_command=f"""{exec_prefix}.subtitle cloud --run_id '{{{{ run_id }}}}' \
-            --file_ids '{{{{ ti.xcom_pull(task_ids='generate_sentence') }}}}' \
-            '{{{{ ti.xcom_pull(task_ids='download_audio') }}}}' \
-            '{{{{ ti.xcom_pull(task_ids='identify_audio') }}}}'
-        """,                
-        do_xcom_push=True,
-        queue=QueueType.BASE.value
-    )
-    
-    [download_audio, sentence] >> subtitle
-    [separate, mapping] >> sentence
-    [transcript, lyrics] >> mapping
     [separate, vad, lyrics] >> transcript
     separate >> vad
     [download_audio, identify] >> lyrics
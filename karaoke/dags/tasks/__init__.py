@@ -0,0 +1,4 @@
+import time
+
+# Reference point to report how long imports and setup take before a task runs
+STARTED_AT = time.perf_counter()
@@ -1,14 +1,45 @@
 import os
+import time
+import shutil
 import uuid
 import json
 import logging
+import threading
+import contextvars
 
 from abc import ABC
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any, Union
 from pathlib import Path
 from .utils.config import config
-from .utils.storage import Storage, BucketType
+from .utils.storage import get_storage, BucketType
 from .utils.artifact import ExportedArtifactTag, ArtifactType
+from .utils.timeline import TimelineFormatError, write_timeline
+
+class TaskCancelled(Exception):
+    """
+    Raised inside a task whose caller went away, so it stops before publishing anything.
+    """
+    pass
+
+# Set by tasks.worker when the client of a request disconnects
+cancel_event: contextvars.ContextVar[threading.Event | None] = contextvars.ContextVar('cancel_event', default=None)
+
+def check_cancelled() -> None:
+    """
+    Raises TaskCancelled when the task running in the current context was cancelled.
+    """
+    event = cancel_event.get()
+    if event is not None and event.is_set():
+        raise TaskCancelled("Task cancelled, the client disconnected")
+
+def enter_context(context: contextvars.Context) -> None:
+    """
+    Pool initializer running the pool threads in the context of the thread
+    that created the pool, e.g. with its cancel event and log destination.
+    """
+    for var, value in context.items():
+        var.set(value)
 
 class Task(ABC):
     """Represents a discrete unit of work within a data pipeline.
@@ -24,17 +55,22 @@ class Task(ABC):
         arglist (List[str]): A list of args passing to execution function.
         args (Dict[str, Any]): Input parameters and data retrieved for the task.
         downloaded_artifacts (List[str]): Artifacts downloaded from upstream tasks.
+        temp_dirs (List[str]): Directories of outputs removed once the task finished,
+            after its artifacts were uploaded.
         results (Dict[str, dict]): Key-value pairs of metadata to be passed to 
             downstream tasks.
         exports (List[dict]): A collection of results designated for final output.
         artifact_keys (List[str]): A list of keys to results of file-based outputs generated by 
             this task to be stored in cloud storage.
+        transfers (List[dict]): Bytes and duration of each artifact downloaded or uploaded,
+            and whether a download was linked from the node's artifact cache,
+            passed on as the `transfers` result.
     """
 
     task_method_name: str
     def __init__(self, name: str, run_id: str, arglist: list[str]) -> None:
         self.config = config
-        self.storage = Storage()
+        self.storage = get_storage()
         self.name = name
         self.run_id = run_id
         self.arglist = arglist
@@ -42,10 +78,12 @@ class Task(ABC):
 
         self.args: dict[str, dict] = {}
         self.downloaded_artifacts: list[str] = []
+        self.temp_dirs: list[str] = []
 
         self.results: dict[str, dict] = {}
         self.artifact_keys: list[str] = []
         self.exports: list[dict] = []
+        self.transfers: list[dict] = []
 
     def add_result(self, key: str, name: str, value: Any, type: ArtifactType, attached: bool) -> None:
         self.logger.debug('Adding result of %s', key)
@@ -78,9 +116,32 @@ class Task(ABC):
         filename = f"{key}_{uuid.uuid4().hex}.json"
         temp_path = os.path.join(self.config.cache_dir, filename)
         with open(temp_path, 'w', encoding='utf-8') as f:
-            json.dump(value, f, indent=2, ensure_ascii=False)
+            json.dump(value, f, separators=(',', ':'), ensure_ascii=False)
         self.logger.debug(f"JSON artifact '{key}' dumped to {temp_path}")
         self.add_artifact(key, name, temp_path, type, attached)
+
+    def add_timeline_artifact(self, key: str, name: str, value: list, attached: bool) -> str:
+        """
+        Registers a word timeline for downstream tasks, in the binary timeline
+        format when enabled, next to a JSON copy for the viewers.
+
+        Returns:
+            The key of the JSON artifact read by viewers.
+        """
+        if self.config.timeline.binary:
+            os.makedirs(self.config.cache_dir, exist_ok=True)
+            temp_path = os.path.join(self.config.cache_dir, f"{key}_{uuid.uuid4().hex}.timeline")
+            try:
+                write_timeline(temp_path, value)
+            except TimelineFormatError as e:
+                self.logger.warning(f"Storing timeline '{key}' as JSON: {e}")
+            else:
+                self.add_artifact(key, name, temp_path, ArtifactType.TIMELINE, attached)
+                viewer_key = f"{key}_json"
+                self.add_json_artifact(viewer_key, name, value, ArtifactType.JSON, attached)
+                return viewer_key
+        self.add_json_artifact(key, name, value, ArtifactType.JSON, attached)
+        return key
     
     def add_export(self, result_key: str, tag: ExportedArtifactTag):
         self.logger.debug('Adding export of %s', result_key)
@@ -89,49 +150,106 @@ class Task(ABC):
             'tag': tag.value
         })
         
+    def get_transfer_pool(self, size: int) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(
+            max_workers=max(1, min(size, self.config.transfer.concurrency)),
+            initializer=enter_context,
+            initargs=(contextvars.copy_context(),)
+        )
+
+    def add_transfer(self, key: str, direction: str, size: int, started: float, cached: bool = False) -> None:
+        elapsed = time.perf_counter() - started
+        self.logger.debug('Transferred %s (%s, %d bytes%s) in %.3fs',
+                          key, direction, size, ', cached' if cached else '', elapsed)
+        self.transfers.append({
+            'key': key,
+            'direction': direction,
+            'bytes': size,
+            'seconds': round(elapsed, 3),
+            'cached': cached
+        })
+
+    def load_artifact(self, artifact_key: str) -> str:
+        check_cancelled()
+        filepath = os.path.join(self.config.cache_dir, uuid.uuid4().hex)
+        # Registered first so a failed batch still cleans up
+        self.downloaded_artifacts.append(filepath)
+        self.logger.debug('Downloading artifact %s to %s', artifact_key, filepath)
+        started = time.perf_counter()
+        _, cached = self.storage.download(self.args[artifact_key]['value'], filepath)
+        self.add_transfer(artifact_key, 'download', os.path.getsize(filepath), started, cached)
+        return filepath
+
     def load_artifacts(self, available_artifact_keys: list[str]):
+        """
+        Downloads every upstream artifact used by this task concurrently.
+        """
         self.logger.debug("Available artifacts: %s", str(available_artifact_keys))
-        for artifact_keys in available_artifact_keys:
-            if not artifact_keys in self.arglist:
-                continue
-            filepath = os.path.join(self.config.cache_dir, uuid.uuid4().hex)
-            self.logger.debug('Downloading artifact %s to %s', artifact_keys, filepath)
-            self.storage.download(self.args[artifact_keys]['value'], filepath)
-            self.downloaded_artifacts.append(filepath)
-            self.args[artifact_keys]['value'] = filepath
-            return filepath
+        artifact_keys = [key for key in dict.fromkeys(available_artifact_keys) if key in self.arglist]
+        if not artifact_keys:
+            return
+        with self.get_transfer_pool(len(artifact_keys)) as pool:
+            filepaths = list(pool.map(self.load_artifact, artifact_keys))
+        for artifact_key, filepath in zip(artifact_keys, filepaths):
+            self.args[artifact_key]['value'] = filepath
     
     def cleanup_artifacts(self):
         for filepath in self.downloaded_artifacts:
             if os.path.exists(filepath):
                 self.logger.debug('Removing downloaded artifact %s', filepath)
                 os.remove(filepath)
+        for directory in self.temp_dirs:
+            self.logger.debug('Removing output directory %s', directory)
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def store_artifact(self, artifact_key: str) -> str:
+        check_cancelled()
+        file_path = self.results[artifact_key]['value']
+        self.logger.debug('Uploading artifact %s', file_path)
+        # calc name
+        artifact_id = os.path.join(self.run_id, Path(file_path).name)
+        # upload
+        started = time.perf_counter()
+        result = self.storage.upload_file(BucketType.STORAGE_BUCKET, artifact_id, file_path)
+        self.add_transfer(artifact_key, 'upload', os.path.getsize(file_path), started)
+        return os.path.join(result.bucket_name, result.object_name)
 
     def store_artifacts(self):
-        for artifact_key in self.artifact_keys:
+        """
+        Uploads every artifact of this task concurrently.
+        """
+        with self.get_transfer_pool(len(self.artifact_keys)) as pool:
+            values = list(pool.map(self.store_artifact, self.artifact_keys))
+        for artifact_key, value in zip(self.artifact_keys, values):
             target = self.results[artifact_key]
             file_path = target['value']
-            self.logger.debug('Uploading artifact %s', file_path)
-            # calc name
-            artifact_id = os.path.join(self.run_id, Path(file_path).name)
-            # upload
-            result = self.storage.upload_file(BucketType.STORAGE_BUCKET, artifact_id, file_path)
             # replace
-            target['value'] = os.path.join(result.bucket_name, result.object_name)
+            target['value'] = value
             if os.path.exists(file_path):
                 self.logger.debug('Removing uploaded artifact %s', file_path)
                 os.remove(file_path)
     
     def load_cloud_args(self, artifact_file_ids: tuple[str, ...]):
-        for artifact_id in artifact_file_ids:
-            self.logger.debug('Loading cloud args from %s', artifact_id)
-            data = self.storage.read_json(artifact_id)
+        """
+        Reads the args of every upstream task concurrently, later ones
+        override earlier ones, then downloads the artifacts among them.
+        """
+        if not artifact_file_ids:
+            return
+        self.logger.debug('Loading cloud args from %s', str(artifact_file_ids))
+        with self.get_transfer_pool(len(artifact_file_ids)) as pool:
+            arg_files = list(pool.map(self.storage.read_json, artifact_file_ids))
+        artifact_keys = []
+        for data in arg_files:
             self.logger.debug('Loaded args of %s', str(list(data['results'].keys())))
             self.args.update(data['results'])
-            self.load_artifacts(data['artifact_keys'])
+            artifact_keys.extend(data['artifact_keys'])
+        self.load_artifacts(artifact_keys)
     
     def store_cloud_args(self):
         self.store_artifacts()
+        if self.transfers:
+            self.add_result('transfers', 'Transfers', self.transfers, ArtifactType.JSON, False)
         random_filepath = os.path.join(self.run_id, uuid.uuid4().hex)
             
         # store to storage
@@ -141,6 +259,7 @@ class Task(ABC):
             'exports': self.exports
         }
         content = json.dumps(passing_args).encode('utf-8')
+        check_cancelled()
         result = self.storage.put_binary(
             BucketType.ARG_BUCKET, random_filepath, content, content_type="application/json"
         )
@@ -156,8 +275,10 @@ class Task(ABC):
             # load passing args
             self.load_cloud_args(artifact_file_ids)
             # run job
+            check_cancelled()
             self.on_run()
-            # store passing args
+            # store passing args, a cancelled task publishes nothing
+            check_cancelled()
             return self.store_cloud_args()
         finally:
             # remove downloaded artifacts
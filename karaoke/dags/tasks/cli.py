@@ -1,15 +1,63 @@
 import argparse
 import uuid
+import logging
 import logging.config
 import json
+import threading
+import time
 
 from typing import Any
+from . import STARTED_AT
 from .base import Task
 from .utils.config import config
 
+_context = threading.local()
+_logging_configured = False
+
+def setup_logging():
+    global _logging_configured
+    if _logging_configured:
+        return
+    logging.config.dictConfig({
+        "version": 1,
+        # Keep loggers created at import, e.g. the worker's
+        "disable_existing_loggers": False,
+        "formatters": {
+            "standard": {"format": "%(asctime)s [%(levelname)s] %(name)s: %(message)s"},
+            "detailed": {"format": "%(asctime)s [%(levelname)s] %(module)s.%(funcName)s:%(lineno)d: %(message)s"},
+        },
+        "handlers": {
+            "console": {
+                "class": "logging.StreamHandler",
+                "formatter": "standard",
+                "level": config.log_level,
+            },
+        },
+        "loggers": {
+            "": {
+                "handlers": ["console"],
+                "level": config.log_level,
+            },
+        }
+    })
+    _logging_configured = True
+
+def mark_started(at: float | None = None, in_worker: bool = False):
+    """
+    Sets the reference point used to report startup time for CLIs
+    created in the current thread, e.g. when a request reaches the warm worker.
+    CLIs run by the worker return their value to its client instead of printing it.
+    """
+    _context.started_at = at if at is not None else time.perf_counter()
+    _context.in_worker = in_worker
+
 class CLI:
-    def __init__(self, description: str, actionDesc: str):
+    def __init__(self, description: str, actionDesc: str, argv: list[str] | None = None):
         self.setup_logging()
+        self.logger = logging.getLogger('CLI')
+        self.started_at: float = getattr(_context, 'started_at', STARTED_AT)
+        self.in_worker: bool = getattr(_context, 'in_worker', False)
+        self.argv = argv
         self.parser = argparse.ArgumentParser(description=description)
         self.subparsers = self.parser.add_subparsers(dest='command', required=True)
 
@@ -21,26 +69,7 @@ class CLI:
         self.args = None
 
     def setup_logging(self):
-        logging.config.dictConfig({
-            "version": 1,
-            "formatters": {
-                "standard": {"format": "%(asctime)s [%(levelname)s] %(name)s: %(message)s"},
-                "detailed": {"format": "%(asctime)s [%(levelname)s] %(module)s.%(funcName)s:%(lineno)d: %(message)s"},
-            },
-            "handlers": {
-                "console": {
-                    "class": "logging.StreamHandler",
-                    "formatter": "standard",
-                    "level": config.log_level,
-                },
-            },
-            "loggers": {
-                "": {
-                    "handlers": ["console"],
-                    "level": config.log_level,
-                },
-            }
-        })
+        setup_logging()
 
     def add_local_arg(self, *args, **kargs):
         self.local_parser.add_argument(*args, **kargs)
@@ -56,7 +85,7 @@ class CLI:
     def parse_args(self):
         if self.args is not None:
             return
-        self.args = self.parser.parse_args()
+        self.args = self.parser.parse_args(self.argv)
 
     def get_run_id(self) -> str:
         self.parse_args()
@@ -78,15 +107,24 @@ class CLI:
                 val = json.loads(val)
         return val
     
-    def execute(self, task: Task):
+    def execute(self, task: Task) -> str | None:
         self.parse_args()
         if self.args is None:
             raise RuntimeError('Arg is None')
         run_type = self.get('command')
-        if run_type == 'local':
-            task.local_run(*[self.get(args) for args in task.arglist])
-        elif run_type == 'cloud':
-            next_arg_id = task.run(*self.args.file_ids)
-            print(next_arg_id)
-        else:
-            raise NotImplementedError()
+        started = time.perf_counter()
+        self.logger.info(f'Task ready after {started - self.started_at:.3f}s of startup')
+        try:
+            if run_type == 'local':
+                task.local_run(*[self.get(args) for args in task.arglist])
+                return None
+            elif run_type == 'cloud':
+                next_arg_id = task.run(*self.args.file_ids)
+                if not self.in_worker:
+                    # Pushed to XCom from stdout
+                    print(next_arg_id)
+                return next_arg_id
+            else:
+                raise NotImplementedError()
+        finally:
+            self.logger.info(f'Task executed in {time.perf_counter() - started:.3f}s')
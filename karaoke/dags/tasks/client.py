@@ -0,0 +1,68 @@
+"""
+Thin client of the warm task worker, see tasks.worker.
+
+Usage: python -m tasks.client <task module> <task arguments>
+
+Only standard library modules are imported so that starting the client stays
+cheap. When no worker is listening, the task is executed in this process as
+`python -m tasks.<task module>` instead.
+"""
+import os
+import socket
+import sys
+import time
+
+from .utils.protocol import DEFAULT_WORKER_SOCKET, send_message, recv_message
+
+def get_socket_path() -> str:
+    return (
+        os.environ.get('worker__socket_path')
+        or os.environ.get('WORKER__SOCKET_PATH')
+        or DEFAULT_WORKER_SOCKET
+    )
+
+def main() -> int:
+    if len(sys.argv) < 2:
+        print(__doc__, file=sys.stderr)
+        return 2
+    module, argv = sys.argv[1], sys.argv[2:]
+
+    started = time.perf_counter()
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(get_socket_path())
+    except OSError as e:
+        conn.close()
+        print(f"Task worker unavailable ({e}), running {module} in process", file=sys.stderr, flush=True)
+        os.execv(sys.executable, [sys.executable, '-m', f'{__package__}.{module}', *argv])
+
+    with conn:
+        send_message(conn, {"module": module, "argv": argv})
+        while True:
+            try:
+                message = recv_message(conn)
+            except ConnectionError as e:
+                # The process running the task died
+                print(f"Task worker lost {module}: {e}", file=sys.stderr)
+                return 1
+            if message["type"] == "log":
+                print(message["message"], file=sys.stderr, flush=True)
+            elif message["type"] == "result":
+                timing = message.get("timing", {})
+                print(
+                    "Task worker timing: "
+                    f"import {timing.get('import', 0):.3f}s, "
+                    f"startup {timing.get('startup', 0):.3f}s, "
+                    f"execution {timing.get('execution', 0):.3f}s, "
+                    f"round trip {time.perf_counter() - started:.3f}s",
+                    file=sys.stderr
+                )
+                if message["value"] is not None:
+                    print(message["value"])
+                return 0
+            else:
+                print(message.get("message"), file=sys.stderr)
+                return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
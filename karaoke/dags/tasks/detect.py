@@ -51,13 +51,17 @@ class VoiceActivity(Task):
         )
         self.logger.info("Voice activity detection completed")
 
-if __name__ == "__main__":
+def main(argv: list[str] | None = None) -> str | None:
     cli = CLI(
         description='Voice activity detection task.',
-        actionDesc='Detect voice'
+        actionDesc='Detect voice',
+        argv=argv
     )
     cli.add_local_arg(
         '--Vocals_only', required=True, help='Path to separated vocal file'
     )
     task = VoiceActivity(run_id=cli.get_run_id())
-    cli.execute(task)
\ No newline at end of file
+    return cli.execute(task)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
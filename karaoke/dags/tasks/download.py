@@ -91,10 +91,11 @@ class DownloadYoutubeTask(Task):
 
         self.logger.info('Download successful')
 
-if __name__ == "__main__":
+def main(argv: list[str] | None = None) -> str | None:
     cli = CLI(
         description='Download task.',
-        actionDesc='Download media'
+        actionDesc='Download media',
+        argv=argv
     )
     cli.add_common_args(
         '--type', choices=['video', 'audio'], required=True, help='Media type'
@@ -103,5 +104,8 @@ if __name__ == "__main__":
         '--url', required=True, help='Link to target'
     )
     task = DownloadYoutubeTask(format_key=cli.get('type'), run_id=cli.get_run_id())
-    cli.execute(task)
+    return cli.execute(task)
+
+if __name__ == "__main__":
+    main()
     
\ No newline at end of file
@@ -50,10 +50,11 @@ class IdentifyMusic(Task):
         
         self.logger.info("Music identification successful")
 
-if __name__ == "__main__":
+def main(argv: list[str] | None = None) -> str | None:
     cli = CLI(
         description='Identify song name from audio.',
-        actionDesc='Identify audio'
+        actionDesc='Identify audio',
+        argv=argv
     )
     cli.add_local_arg(
         '--source_audio', required=True, help='Path to target audio'
@@ -61,4 +62,7 @@ if __name__ == "__main__":
     cli.parse_args()
     
     task = IdentifyMusic(run_id=cli.get_run_id())
-    cli.execute(task)
\ No newline at end of file
+    return cli.execute(task)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -54,10 +54,11 @@ class FetchLyrics(Task):
         )
         self.logger.info('Lyrics retrieval completed')
 
-if __name__ == "__main__":
+def main(argv: list[str] | None = None) -> str | None:
     cli = CLI(
         description='Retrive song lyrics from metadata.',
-        actionDesc='Retrive song lyrics'
+        actionDesc='Retrive song lyrics',
+        argv=argv
     )
     cli.add_local_arg(
         '--title', required=True, help='Title of the song'
@@ -69,5 +70,8 @@ if __name__ == "__main__":
         'metadata', '--metadata', required=True, help='Metada of the song in json format'
     )
     task = FetchLyrics(run_id=cli.get_run_id())
-    cli.execute(task)
+    return cli.execute(task)
+
+if __name__ == "__main__":
+    main()
     
\ No newline at end of file
@@ -1,13 +1,13 @@
-import json
 import re
-import difflib
+import logging
 
-from pypinyin import lazy_pinyin
 from collections import defaultdict
 from typing import Any
 from .base import Task
 from .cli import CLI
+from .utils.alignment import align
 from .utils.artifact import ArtifactType
+from .utils.timeline import load_timeline
 
 def fill_unmatched_pair(sentences: list[list[list[str | int]]], target_len: int):
     words = [word for sentence in sentences for word in sentence]
@@ -26,7 +26,6 @@ def fill_unmatched_pair(sentences: list[list[list[str | int]]], target_len: int)
     for a in range(len(anchors) - 1):
         idx1, idx2 = anchors[a], anchors[a+1]
         val1, val2 = int(words[idx1][1]), int(words[idx2][1])
-        print(idx1, idx2, val1, val2)
         distance = idx2 - idx1
         gap = val2 - val1
         step = distance / gap
@@ -98,95 +97,84 @@ def separate_sentence(lyrics: str) -> list[str]:
     """
     return [token for token in re.split(r'([^\x00-\x7F])|\s+', lyrics) if token and not token.isspace()]
 
-class MapLyrics(Task):
-    task_method_name = "merge"
-    def __init__(self, run_id: str):
-        super().__init__("Merge transcription and lyrics", run_id, arglist=['transcription', 'lyrics'])
+def match_words(lyrics_words: list[str], transcription_words: list[str]) -> list[int]:
+    """
+    Maps every lyrics word to the index of a transcription word, or -1.
+    """
+    matched = align(lyrics_words, transcription_words)
+    # remove incorrect mapping with large gap
+    last_matched = None
+    for i in range(len(matched)):
+        if matched[i] == -1:
+            continue
+        if last_matched is not None:
+            is_next_unassigned = (i + 1 < len(matched)) and (matched[i + 1] == -1)
+            if (matched[i] - last_matched > 3) and is_next_unassigned:
+                matched[i] = -1
+                continue
+        last_matched = matched[i]
+    # fill sequence
+    fill_typo_sequence(matched, len(transcription_words))
+    return matched
 
-    def do_mapping(self, transcription_sentences: list[dict[str, Any]], lyrics: str) -> list[list[dict]]:
-        lyrics_sentences = lyrics.splitlines()
+def do_mapping(transcription_sentences: list[dict[str, Any]], lyrics: str, logger: logging.Logger) -> list[list[dict]]:
+    lyrics_sentences = lyrics.splitlines()
 
-        # convert sentences to words
-        lyrics_maps = [
-            {'word': w, 'group': idx}
-            for idx, sentence in enumerate(lyrics_sentences)
-            for w in separate_sentence(sentence)
-        ]
-        transcription_maps = [
-            {'word': w, 'start': s['start'], 'end': s['end']}
-            for s in transcription_sentences
-            for w in separate_sentence(s['text'])
-        ]
-        
-        # extract word list
-        lyrics_words = [
-            lyrics_map['word']
-            for lyrics_map in lyrics_maps
-        ]
-        transcription_words = [
-            transcription_map['word']
-            for transcription_map in transcription_maps
-        ]
-        
-        # match two list
-        matcher = difflib.SequenceMatcher(None, lazy_pinyin(lyrics_words), lazy_pinyin(transcription_words))
-        
-        matched = [-1] * len(lyrics_words)
-        for blocks in matcher.get_matching_blocks():
-            matched[blocks.a:blocks.a+blocks.size] = list(range(blocks.b, blocks.b+blocks.size))
-        # remove incorrect mapping with large gap
-        for i in range(len(matched)):
-            if matched[i] == -1:
-                continue
-            target_val = next((matched[prev] for prev in range(i - 1, -1, -1) if matched[prev] != -1), None)
-            if target_val is not None:
-                is_next_unassigned = (i + 1 < len(matched)) and (matched[i + 1] == -1)
-                if (matched[i] - target_val > 3) and is_next_unassigned:
-                    matched[i] = -1
-        # fill sequence
-        fill_typo_sequence(matched, len(transcription_words))
-        # convert back to sentences
-        sentences = defaultdict(list[list[str | int]])
-        for is_matched, lyrics_map in zip(matched, lyrics_maps):
-            sentences[lyrics_map['group']].append([lyrics_map['word'], is_matched])
-        sentences = list(sentences.values())
-        
-        # fill head and tailing space
-        expand_sentence(sentences, transcription_maps)
-       
-        # final edit
-        fill_unmatched_pair(sentences, len(transcription_words))
+    # convert sentences to words
+    lyrics_maps = [
+        {'word': w, 'group': idx}
+        for idx, sentence in enumerate(lyrics_sentences)
+        for w in separate_sentence(sentence)
+    ]
+    transcription_maps = [
+        {'word': w, 'start': s['start'], 'end': s['end']}
+        for s in transcription_sentences
+        for w in separate_sentence(s['text'])
+    ]
 
-        for line in sentences:
-            self.logger.debug('  '.join([str(l[0]) for l in line]))
-            self.logger.debug(''.join([transcription_words[int(l[1])].ljust(3) if l[1] != -1 else '    ' for l in line]))
-            self.logger.debug(''.join([str(l[1]).ljust(4) if l[1] != -1 else '    ' for l in line]))
-        
+    # extract word list
+    lyrics_words = [
+        lyrics_map['word']
+        for lyrics_map in lyrics_maps
+    ]
+    transcription_words = [
+        transcription_map['word']
+        for transcription_map in transcription_maps
+    ]
 
-        resutls = []
-        for sentence in sentences:
-            timed_sentence = []
-            fisrt_timestamp = next((i for i, word in enumerate(sentence) if word[1] != -1), None)
-            # Skip non matching sentences
-            if fisrt_timestamp is None:
-                continue
-            text = [str(sentence[i][0]) for i in range(fisrt_timestamp + 1)]
-            target = transcription_maps[int(sentence[fisrt_timestamp][1])]
-            for i in range(fisrt_timestamp + 1, len(sentence)):
-                if sentence[i][1] == -1:
-                    text.append(str(sentence[i][0]))
-                else:
-                    timed_sentence += [
-                        {
-                            "start": target["start"] + (idx * (target["end"] - target["start"]) / len(text)),
-                            "end": target["start"] + ((idx + 1) * (target["end"] - target["start"]) / len(text)),
-                            "word": word
-                        }
-                        for idx, word in enumerate(text)
-                    ]
-                    text = [sentence[i][0]]
-                    target = transcription_maps[int(sentence[i][1])]
-            if text:
+    # match two list
+    matched = match_words(lyrics_words, transcription_words)
+    # convert back to sentences
+    sentences = defaultdict(list[list[str | int]])
+    for is_matched, lyrics_map in zip(matched, lyrics_maps):
+        sentences[lyrics_map['group']].append([lyrics_map['word'], is_matched])
+    sentences = list(sentences.values())
+
+    # fill head and tailing space
+    expand_sentence(sentences, transcription_maps)
+
+    # final edit
+    fill_unmatched_pair(sentences, len(transcription_words))
+
+    for line in sentences:
+        logger.debug('  '.join([str(l[0]) for l in line]))
+        logger.debug(''.join([transcription_words[int(l[1])].ljust(3) if l[1] != -1 else '    ' for l in line]))
+        logger.debug(''.join([str(l[1]).ljust(4) if l[1] != -1 else '    ' for l in line]))
+
+
+    resutls = []
+    for sentence in sentences:
+        timed_sentence = []
+        fisrt_timestamp = next((i for i, word in enumerate(sentence) if word[1] != -1), None)
+        # Skip non matching sentences
+        if fisrt_timestamp is None:
+            continue
+        text = [str(sentence[i][0]) for i in range(fisrt_timestamp + 1)]
+        target = transcription_maps[int(sentence[fisrt_timestamp][1])]
+        for i in range(fisrt_timestamp + 1, len(sentence)):
+            if sentence[i][1] == -1:
+                text.append(str(sentence[i][0]))
+            else:
                 timed_sentence += [
                     {
                         "start": target["start"] + (idx * (target["end"] - target["start"]) / len(text)),
@@ -195,24 +183,78 @@ class MapLyrics(Task):
                     }
                     for idx, word in enumerate(text)
                 ]
-            resutls.append(timed_sentence)
-                
-        return resutls
-
-    def do_fallback(self, transcription: list[dict[str, Any]]) -> list[list[dict]]:
-        return [
-            [
+                text = [sentence[i][0]]
+                target = transcription_maps[int(sentence[i][1])]
+        if text:
+            timed_sentence += [
                 {
-                    "start": line["start"] + (idx * (line["end"] - line["start"]) / len(words)),
-                    "end": line["start"] + ((idx + 1) * (line["end"] - line["start"]) / len(words)),
+                    "start": target["start"] + (idx * (target["end"] - target["start"]) / len(text)),
+                    "end": target["start"] + ((idx + 1) * (target["end"] - target["start"]) / len(text)),
                     "word": word
                 }
-                for idx, word in enumerate(words)
+                for idx, word in enumerate(text)
             ]
-            for line in transcription
-            for words in [separate_sentence(line['text'])]
-            if words
+        resutls.append(timed_sentence)
+
+    return resutls
+
+def do_fallback(transcription: list[dict[str, Any]]) -> list[list[dict]]:
+    return [
+        [
+            {
+                "start": line["start"] + (idx * (line["end"] - line["start"]) / len(words)),
+                "end": line["start"] + ((idx + 1) * (line["end"] - line["start"]) / len(words)),
+                "word": word
+            }
+            for idx, word in enumerate(words)
         ]
+        for line in transcription
+        for words in [separate_sentence(line['text'])]
+        if words
+    ]
+
+def map_lyrics(transcription: list[dict[str, Any]], lyrics: str, logger: logging.Logger) -> list[list[dict]]:
+    """
+    Maps the lyrics onto the transcription, falls back to the words of the
+    transcription when there are no lyrics or they cannot be mapped.
+    """
+    sentences = None
+    if lyrics:
+        try:
+            sentences = do_mapping(transcription, lyrics, logger)
+        except Exception as e:
+            logger.error(f"{e}", exc_info=True)
+    else:
+        logger.warning('No lyrics found')
+
+    if not sentences:
+        # if no lyrics found, use the transcription as the lyrics directly
+        logger.warning('Fallback to use raw transcription')
+        sentences = do_fallback(transcription)
+    return sentences
+
+def add_mapped_lyrics(task: Task, sentences: list[list[dict]]) -> None:
+    viewer_key = task.add_timeline_artifact(
+        key='mapped_lyrics',
+        name='Mapped lyrics',
+        value=sentences,
+        attached=False
+    )
+    task.add_result(
+        key='mapped_lyrics_viewer',
+        name='Mapped lyrics',
+        value={
+            'segment': viewer_key,
+            'audio': 'Vocals_only'
+        },
+        type=ArtifactType.SENTENCE,
+        attached=True
+    )
+
+class MapLyrics(Task):
+    task_method_name = "merge"
+    def __init__(self, run_id: str):
+        super().__init__("Merge transcription and lyrics", run_id, arglist=['transcription', 'lyrics'])
 
     def merge(self, transcription_path: str, lyrics: str) -> None:
         """
@@ -227,47 +269,17 @@ class MapLyrics(Task):
             - word (str): The word in the sentence.
         """
         self.logger.info('Mapping transcription with lyrics')
-        with open(transcription_path) as f:
-            transcription: list[dict[str, Any]] = json.loads(f.read())
-
-        sentences = None
-        if not lyrics:
-            try:
-                sentences = self.do_mapping(transcription, lyrics)
-            except Exception as e:
-                self.logger.error(f"{e}", exc_info=True)
-        else:
-            self.logger.warning('No lyrics found')
-
-        if not sentences:
-            # if no lyrics found, use the transcription as the lyrics directly
-            self.logger.warning('Fallback to use raw transcription')
-            sentences = self.do_fallback(transcription)
-            
-        self.add_json_artifact(
-            key='mapped_lyrics',
-            name='Mapped lyrics',
-            value=sentences,
-            type=ArtifactType.JSON,
-            attached=False
-        )
-        self.add_result(
-            key='mapped_lyrics_viewer',
-            name='Mapped lyrics',
-            value={
-                'segment': 'mapped_lyrics',
-                'audio': 'Vocals_only'
-            },
-            type=ArtifactType.SENTENCE,
-            attached=True
-        )
+        transcription: list[dict[str, Any]] = load_timeline(transcription_path)
+        sentences = map_lyrics(transcription, lyrics, self.logger)
+        add_mapped_lyrics(self, sentences)
         self.logger.info('Mapping completed')
 
 
-if __name__ == "__main__":
+def main(argv: list[str] | None = None) -> str | None:
     cli = CLI(
         description='Map transcription and lyrics.',
-        actionDesc='Merge'
+        actionDesc='Merge',
+        argv=argv
     )
     cli.add_local_arg(
         '--transcription', required=True, help='Path to transcription result'
@@ -277,4 +289,7 @@ if __name__ == "__main__":
     )
    
     task = MapLyrics(run_id=cli.get_run_id())
-    cli.execute(task)
\ No newline at end of file
+    return cli.execute(task)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,68 @@
+from typing import Any, Optional
+from .base import Task
+from .cli import CLI
+from .mapping import map_lyrics, add_mapped_lyrics
+from .sentence import build_sentences, add_sentences_block
+from .subtitle import build_subtitle, add_subtitle
+from .utils.timeline import load_timeline
+
+class PostProcess(Task):
+    """
+    Runs lyrics mapping, sentence generation and subtitle generation in one
+    task, passing the timelines in memory instead of through storage.
+    """
+    task_method_name = "process"
+    def __init__(self, run_id: str):
+        super().__init__(
+            name='Post-processing', run_id=run_id,
+            arglist=['title', 'artist', 'metadata', 'transcription', 'lyrics']
+        )
+
+    def process(self, title: Optional[str], artist: Optional[str], metadata: dict, transcription_path: str, lyrics: str):
+        """
+        Generate subtitles from the transcription and lyrics.
+
+        Output:
+            - mapped_lyrics, sentences_block and subtitle, the same as
+              the lyrics_mapping, generate_sentence and generate_subtitle tasks.
+        """
+        self.logger.info('Mapping transcription with lyrics')
+        transcription: list[dict[str, Any]] = load_timeline(transcription_path)
+        sentences = map_lyrics(transcription, lyrics, self.logger)
+        # Artifacts are written when added, before the next stage edits the timeline in place
+        add_mapped_lyrics(self, sentences)
+
+        build_sentences(sentences, self.logger)
+        add_sentences_block(self, sentences)
+
+        self.logger.info('Generating subtitles')
+        add_subtitle(self, build_subtitle(title, artist, metadata, sentences, self.logger))
+        self.logger.info("Post-processing completed")
+
+def main(argv: list[str] | None = None) -> str | None:
+    cli = CLI(
+        description='Generate subtitle from transcription and lyrics.',
+        actionDesc='Generate',
+        argv=argv
+    )
+    cli.add_local_arg(
+        '--title', required=True, help='Title of the song'
+    )
+    cli.add_local_arg(
+        '--artist', required=True, help='Artist of the song'
+    )
+    cli.add_local_json_arg(
+        'metadata', '--metadata', required=True, help='Metada of the song in json format'
+    )
+    cli.add_local_arg(
+        '--transcription', required=True, help='Path to transcription result'
+    )
+    cli.add_local_arg(
+        '--lyrics', required=True, help='Lyric text'
+    )
+
+    task = PostProcess(run_id=cli.get_run_id())
+    return cli.execute(task)
+
+if __name__ == "__main__":
+    main()
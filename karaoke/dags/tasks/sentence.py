@@ -1,10 +1,11 @@
 import jieba
-import json
+import logging
 import re
 
 from .base import Task
 from .cli import CLI
 from .utils.artifact import ArtifactType
+from .utils.timeline import load_timeline
 
 def merge_small_chunks(aligned_lyrics: list[list[dict]]):
     idx = 0
@@ -100,6 +101,33 @@ def split_long_lines(aligned_lyrics: list[list[dict]]):
         else:
             idx+=1
 
+def build_sentences(aligned_lyrics: list[list[dict]], logger: logging.Logger) -> None:
+    """
+    Groups the aligned lyrics into sentences in place.
+    """
+    logger.info('Building sentences from aligned lyrics')
+    merge_small_chunks(aligned_lyrics)
+    logger.info('Splitting long lines')
+    split_long_lines(aligned_lyrics)
+
+def add_sentences_block(task: Task, sentences_block: list[list[dict]]) -> None:
+    viewer_key = task.add_timeline_artifact(
+        key='sentences_block',
+        name='Generated Sentences',
+        value=sentences_block,
+        attached=False
+    )
+    task.add_result(
+        key='sentences_block_viewer',
+        name='Generated Sentences',
+        value={
+            'segment': viewer_key,
+            'audio': 'Vocals_only'
+        },
+        type=ArtifactType.SENTENCE,
+        attached=True
+    )
+
 class GenerateSentence(Task):
     task_method_name="generate"
     def __init__(self, run_id: str):
@@ -112,41 +140,23 @@ class GenerateSentence(Task):
         Output:
             - sentences_block (list[list[Word]]): List of sentences, where each sentence is a list of aligned lyric characters.
         """
-        with open(aligned_lyrics_path) as f:
-            aligned_lyrics: list[list[dict]] = json.loads(f.read())
-
-        self.logger.info('Building sentences from aligned lyrics')
-        merge_small_chunks(aligned_lyrics)
-        self.logger.info('Splitting long lines')
-        split_long_lines(aligned_lyrics)
-
-        self.add_json_artifact(
-            key='sentences_block',
-            name='Generated Sentences',
-            value=aligned_lyrics,
-            type=ArtifactType.JSON,
-            attached=False
-        )
-        self.add_result(
-            key='sentences_block_viewer',
-            name='Generated Sentences',
-            value={
-                'segment': 'sentences_block',
-                'audio': 'Vocals_only'
-            },
-            type=ArtifactType.SENTENCE,
-            attached=True
-        )
+        aligned_lyrics: list[list[dict]] = load_timeline(aligned_lyrics_path)
+        build_sentences(aligned_lyrics, self.logger)
+        add_sentences_block(self, aligned_lyrics)
         self.logger.info("Subtitle generation complete")
     
-if __name__ == "__main__":
+def main(argv: list[str] | None = None) -> str | None:
     cli = CLI(
         description='Generate sentence from aligned segments.',
-        actionDesc='Generate'
+        actionDesc='Generate',
+        argv=argv
     )
     cli.add_local_arg(
         '--mapped_lyrics', required=True, help='Path to aligned lyrics result'
     )
     
     task = GenerateSentence(run_id=cli.get_run_id())
-    cli.execute(task)
\ No newline at end of file
+    return cli.execute(task)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
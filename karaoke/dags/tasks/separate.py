@@ -1,70 +1,39 @@
 import os
-import torch
-from concurrent.futures import ThreadPoolExecutor
+import uuid
+import socket
 
-from demucs.pretrained import get_model
-from demucs.separate import load_track
-from demucs.apply import apply_model
-from demucs.audio import save_audio
 from .base import Task
 from .cli import CLI
 from .utils.artifact import ExportedArtifactTag, ArtifactType
+from .utils.protocol import send_message, recv_message
 
 class SeparateAudio(Task):
-    task_method_name = "seperate"
+    task_method_name = "seperate_api"
     def __init__(self, run_id: str):
         super().__init__(name='Stem Separation', run_id=run_id, arglist=['source_audio'])
-        self.model_name = 'htdemucs'
-    
-    def seperate(self, audio_path: str) -> None:
-        """
-        Separate the audio into primary and secondary stems according to the model used.
-        Run in a separate process so that we can capture the output and error streams.
-        See https://github.com/nomadkaraoke/python-audio-separator for more details.
 
-        Output:
-            - Vocals_only (str): Path to the separated vocals audio file.
-            - Instrumental_only (str): Path to the separated instrumental audio file.
+    def seperate_api(self, audio_path: str) -> None:
         """
-        self.logger.info('Seperate audio')
-        self.logger.info('Loading model')
-
-        model = get_model(name=self.model_name)
-        model.cpu()
-        model.eval()
-
-        self.logger.info('Model loaded')
-
-        wav = load_track(audio_path, model.audio_channels, model.samplerate)
-        ref = wav.mean(0)
-        wav = (wav - ref.mean()) / ref.std()
-        self.logger.info('Starting separation')
-        sources = apply_model(model, wav[None], device="cuda" if torch.cuda.is_available() else "cpu",
-                              shifts=1, split=True, overlap=0.25, progress=True, num_workers=4)[0]
-        self.logger.info('Separation done, saving stems')
-        sources = sources * ref.std() + ref.mean()
-        kwargs = {
-            'samplerate': model.samplerate,
-            'bitrate': 320,
-            'clip': 'rescale',
-            'as_float': False,
-            'bits_per_sample': 16
-        }
-        output_dir = self.config.cache_dir
+        Separate the audio with the resident model of the separation daemon,
+        which batches tracks queued by concurrent tasks.
+        """
+        self.logger.info('Seperate audio with separation daemon')
+        # Stems of concurrent tasks must not overwrite each other
+        output_dir = os.path.join(self.config.cache_dir, uuid.uuid4().hex)
+        self.temp_dirs.append(output_dir)
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.connect((self.config.separation.host, self.config.separation.port))
+            send_message(s, {
+                "audio_path": audio_path,
+                "output_dir": output_dir
+            })
+            data = recv_message(s)
+        if "error" in data:
+            raise RuntimeError(f"Separation failed: {data['error']}")
+        self.logger.info(f"Separation stats: {data['stats']}")
+        self.add_stems(data["vocals_path"], data["instrumental_path"])
 
-        sources = list(sources)
-        vocal_tensor = sources.pop(model.sources.index('vocals'))
-        # Warning : after poping the stem, selected stem is no longer in the list 'sources'
-        instr_tensor = torch.zeros_like(sources[0])
-        for i in sources:
-            instr_tensor += i
-        
-        with ThreadPoolExecutor(max_workers=2) as executor:
-            vocal_stem_filepath = os.path.join(output_dir, 'vocals.mp3')
-            executor.submit(save_audio, vocal_tensor, vocal_stem_filepath, preset=9, **kwargs)
-            instrumental_stem_filepath = os.path.join(output_dir, 'instrumental.mp3')
-            executor.submit(save_audio, instr_tensor, instrumental_stem_filepath, preset=5, **kwargs)
-        
+    def add_stems(self, vocal_stem_filepath: str, instrumental_stem_filepath: str) -> None:
         self.add_artifact(
             key='Vocals_only',
             name=f'Vocals Stem',
@@ -86,14 +55,18 @@ class SeparateAudio(Task):
 
         self.logger.info('Separation completed')
 
-if __name__ == "__main__":
+def main(argv: list[str] | None = None) -> str | None:
     cli = CLI(
         description='Audio separation task.',
-        actionDesc='Separate auido'
+        actionDesc='Separate auido',
+        argv=argv
     )
     cli.add_local_arg(
         '--source_audio', required=True, help='Path to source audio'
     )
     
     task = SeparateAudio(run_id=cli.get_run_id())
-    cli.execute(task)
\ No newline at end of file
+    return cli.execute(task)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
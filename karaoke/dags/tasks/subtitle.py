@@ -1,9 +1,10 @@
-import json
+import logging
 
 from typing import Optional
 from .base import Task
 from .cli import CLI
 from .utils.artifact import ArtifactType, ExportedArtifactTag
+from .utils.timeline import load_timeline
 
 class SubtitleGenerator:
     def __init__(self, duration: str):
@@ -120,6 +121,38 @@ class SubtitleGenerator:
     def export(self) -> list[dict]:
         return self.lines
 
+def build_subtitle(
+    title: Optional[str], artist: Optional[str], metadata: dict,
+    sentences_block: list[list[dict]], logger: logging.Logger
+) -> list[dict]:
+    """
+    Lays out the sentences as subtitle lines after a poster of the song.
+    """
+    duration = metadata.get('duration', sentences_block[-1][-1]['end'])
+    title = title or metadata.get('title', 'Unknown title')
+    artist = artist or metadata.get('channel', 'Unknown artist')
+
+    generator = SubtitleGenerator(duration)
+    generator.add_poster(title, artist)
+
+    logger.info("Start generating ...")
+    for sentence, next_sentence in zip(sentences_block, sentences_block[1:] + [None]):
+        generator.add_line(sentence, next_sentence)
+    return generator.export()
+
+def add_subtitle(task: Task, subtitle: list[dict]) -> None:
+    task.add_json_artifact(
+        key='subtitle',
+        name='Subtitle',
+        value=subtitle,
+        type=ArtifactType.JSON,
+        attached=False
+    )
+    task.add_export(
+        result_key='subtitle',
+        tag=ExportedArtifactTag.SUBTITLES
+    )
+
 class GenerateSubtitle(Task):
     task_method_name="generate"
     def __init__(self, run_id: str):
@@ -131,38 +164,15 @@ class GenerateSubtitle(Task):
         """
         self.logger.info('Generating subtitles')
         
-        with open(sentences_block_path) as f:
-            sentences_block: list[list[dict]] = json.loads(f.read())
-        
-        duration = metadata.get('duration', sentences_block[-1][-1]['end'])
-        title = title or metadata.get('title', 'Unknown title')
-        artist = artist or metadata.get('channel', 'Unknown artist')
-
-        generator = SubtitleGenerator(duration)
-        generator.add_poster(title, artist)
-
-        self.logger.info("Start generating ...")
-        for sentence, next_sentence in zip(sentences_block, sentences_block[1:] + [None]):
-            generator.add_line(sentence, next_sentence)
-        
-
-        self.add_json_artifact(
-            key='subtitle',
-            name='Subtitle',
-            value=generator.export(),
-            type=ArtifactType.JSON,
-            attached=False
-        )
-        self.add_export(
-            result_key='subtitle',
-            tag=ExportedArtifactTag.SUBTITLES
-        )
+        sentences_block: list[list[dict]] = load_timeline(sentences_block_path)
+        add_subtitle(self, build_subtitle(title, artist, metadata, sentences_block, self.logger))
         self.logger.info("Subtitle generation completed")
 
-if __name__ == "__main__":
+def main(argv: list[str] | None = None) -> str | None:
     cli = CLI(
         description='Generate subtitle from sentences.',
-        actionDesc='Generate'
+        actionDesc='Generate',
+        argv=argv
     )
     cli.add_local_arg(
         '--title', required=True, help='Title of the song'
@@ -178,4 +188,7 @@ if __name__ == "__main__":
     )
     
     task = GenerateSubtitle(run_id=cli.get_run_id())
-    cli.execute(task)
\ No newline at end of file
+    return cli.execute(task)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -4,13 +4,16 @@ import whisper
 import torch
 import stable_whisper
 import socket
+import uuid
+import time
 
 from typing import Optional, cast, Any
 from whisper.model import Whisper
-from .base import Task
+from .base import Task, check_cancelled
 from .utils.translate import convert_simplified_to_traditional
 from .cli import CLI
 from .utils.artifact import ArtifactType
+from .utils.protocol import send_message, recv_message, ProtocolError
 
 class TranscriptLyrics(Task):
     task_method_name = 'transcribe_api'
@@ -85,32 +88,87 @@ class TranscriptLyrics(Task):
         self.post_process(result)
 
     def transcribe_api(self, vocal_path: str, vad_segments_path: str, lyrics: str) -> None:
+        """
+        Transcribe with the transcription daemon, words are collected
+        from the segments it streams while the song is transcribed.
+        """
+        request_id = uuid.uuid4().hex
+        words: list[dict[str, Any]] = []
+        segment_count = 0
+        request, payload = self.build_request(vocal_path, vad_segments_path, lyrics)
+        request["id"] = request_id
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
             s.connect((self.config.transcription.host, self.config.transcription.port))
-            send_data = json.dumps({
-                "vocal_path": vocal_path,
-                "vad_segments_path": vad_segments_path,
-                "lyrics": lyrics
-            }).encode("utf-8")
-            self.logger.info(f"Sending data length: {len(send_data)}")
-            s.sendall(len(send_data).to_bytes(4, "big"))
-            s.sendall(send_data)
+            started = time.perf_counter()
+            send_message(s, request, payload)
+            self.logger.info(
+                f"Sent {request['transfer']} request with {memoryview(payload).nbytes if payload is not None else 0} "
+                f"bytes of audio in {time.perf_counter() - started:.3f}s"
+            )
 
-            data_len = s.recv(4)
-            data_len = int.from_bytes(data_len, "big")
-            data = b''
-            while len(data) < data_len:
-                data += s.recv(data_len - len(data))
-            data = data.decode("utf-8")
-            data = json.loads(data)
-            self.post_process(data)
+            while True:
+                # Leaving closes the connection, which cancels the job on the daemon
+                check_cancelled()
+                message = recv_message(s)
+                if message.get("id") != request_id:
+                    raise ProtocolError(f"Received frame of request {message.get('id')}, expected {request_id}")
+                if message["type"] == "received":
+                    self.logger.info(
+                        f"Daemon received {message['bytes']} bytes in {message['receive']:.3f}s "
+                        f"and loaded the audio in {message['decode']:.3f}s"
+                    )
+                elif message["type"] == "queued":
+                    self.logger.info(f"Waiting at position {message['position']} of {message['queue_size']}")
+                elif message["type"] == "started":
+                    self.logger.info("Transcription started")
+                elif message["type"] == "progress":
+                    self.logger.info(f"Transcription progress: {message['current']:.1f}/{message['total']:.1f}")
+                elif message["type"] == "segments":
+                    segment_count += len(message["segments"])
+                    words += self.collect_words(message["segments"])
+                    self.logger.info(f"Received {segment_count} segments, {len(words)} words")
+                elif message["type"] == "result":
+                    if message["segment_count"] != segment_count:
+                        raise ProtocolError(f"Received {segment_count} of {message['segment_count']} segments")
+                    self.store_transcription(words)
+                    return
+                else:
+                    raise RuntimeError(f"Transcription failed: {message.get('message')}")
 
+    def build_request(self, vocal_path: str, vad_segments_path: str, lyrics: str) -> tuple[dict, Any]:
+        """
+        Builds a transcription request for the configured transfer mode.
+        Except for the path mode, the audio and VAD segments are sent along
+        so that the daemon does not need access to local files.
+        """
+        transfer = self.config.transcription.transfer
+        request: dict[str, Any] = {
+            "type": "transcribe",
+            "transfer": transfer,
+            "vocal_path": vocal_path,
+            "lyrics": lyrics,
+            "timeout": self.config.transcription.timeout
+        }
+        if transfer == "path":
+            request["vad_segments_path"] = vad_segments_path
+            return request, None
 
-    def post_process(self, result: dict) -> None:
-        segments_data = cast(list[dict[str, Any]], result.get('segments', []))
+        started = time.perf_counter()
+        with open(vad_segments_path) as f:
+            request["vad_segments"] = json.loads(f.read())
+        if transfer == "file":
+            with open(vocal_path, 'rb') as f:
+                payload = f.read()
+        elif transfer == "pcm":
+            # 16 kHz mono float32 samples, the daemon reads them in place
+            payload = memoryview(whisper.audio.load_audio(vocal_path))
+        else:
+            raise ValueError(f"Unknown transfer mode {transfer}")
+        self.logger.info(f"Prepared {transfer} audio in {time.perf_counter() - started:.3f}s")
+        return request, payload
 
-        self.logger.info("Collecting transcription results")
-        segments = [
+    def collect_words(self, segments_data: list[dict[str, Any]]) -> list[dict[str, Any]]:
+        return [
             {
                 "start": words["start"],
                 "end": words["end"],
@@ -121,18 +179,24 @@ class TranscriptLyrics(Task):
             for words in segment.get('words', [])
         ]
 
-        self.add_json_artifact(
+    def post_process(self, result: dict) -> None:
+        segments_data = cast(list[dict[str, Any]], result.get('segments', []))
+
+        self.logger.info("Collecting transcription results")
+        self.store_transcription(self.collect_words(segments_data))
+
+    def store_transcription(self, segments: list[dict[str, Any]]) -> None:
+        viewer_key = self.add_timeline_artifact(
             key='transcription',
             name='Transcription',
             value=segments,
-            type=ArtifactType.JSON,
             attached=False
         )
         self.add_result(
             key='transcription_viewer',
             name='Transcription',
             value={
-                'segment': 'transcription',
+                'segment': viewer_key,
                 'audio': 'Vocals_only'
             },
             type=ArtifactType.SEGMENT,
@@ -140,10 +204,11 @@ class TranscriptLyrics(Task):
         )
         self.logger.info('Transcription completed')
 
-if __name__ == "__main__":
+def main(argv: list[str] | None = None) -> str | None:
     cli = CLI(
         description='Audio transcription task.',
-        actionDesc='transcribe auido'
+        actionDesc='transcribe auido',
+        argv=argv
     )
     cli.add_local_arg(
         '--Vocals_only', required=True, help='Path to separated vocal file'
@@ -155,4 +220,7 @@ if __name__ == "__main__":
         '--lyrics', required=True, help='Lyric text'
     )
     task = TranscriptLyrics(run_id=cli.get_run_id())
-    cli.execute(task)
\ No newline at end of file
+    return cli.execute(task)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
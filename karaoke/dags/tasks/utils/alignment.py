@@ -0,0 +1,144 @@
+"""
+Phonetic alignment of lyrics words to transcription words.
+
+Words are encoded as integer codes of their toneless pinyin, so homophones
+share a code, and a similarity matrix over the codes scores near
+homophones (zh/z, ch/c, sh/s, n/l, -ng/-n) and rhymes in between a match
+and a mismatch. The words are aligned by Needleman-Wunsch restricted to a
+band around the diagonal: each row is computed with NumPy, the horizontal
+gaps of a row in one pass with a running maximum, so the cost grows with
+the number of words times the band width instead of their product.
+"""
+import numpy as np
+
+from pypinyin import lazy_pinyin
+
+MATCH = 2
+FUZZY = 1
+PARTIAL = 0
+MISMATCH = -1
+GAP = -1
+# Half width of the band beyond the difference of the lengths
+BAND = 64
+
+INITIALS = ('zh', 'ch', 'sh', 'b', 'p', 'm', 'f', 'd', 't', 'n', 'l', 'g', 'k', 'h', 'j', 'q', 'x', 'r', 'z', 'c', 's', 'y', 'w')
+# Sounds transcription commonly confuses, mapped to one of them
+FUZZY_INITIALS = {'zh': 'z', 'ch': 'c', 'sh': 's', 'l': 'n'}
+FUZZY_FINALS = {'ing': 'in', 'eng': 'en', 'ang': 'an', 'iang': 'ian', 'uang': 'uan'}
+
+DIAGONAL = 0
+UP = 1
+LEFT = 2
+# Far below any reachable score, without overflowing when gaps are added
+UNREACHABLE = np.iinfo(np.int64).min // 4
+
+def split_syllable(syllable: str) -> tuple[str, str]:
+    """
+    Splits a toneless pinyin syllable into its fuzzy initial and final.
+    """
+    initial = next((initial for initial in INITIALS if syllable.startswith(initial)), '')
+    final = syllable[len(initial):]
+    return FUZZY_INITIALS.get(initial, initial), FUZZY_FINALS.get(final, final)
+
+def encode(words: list[str]) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Encodes words as codes of their pinyin.
+
+    Returns:
+        The code of every word and the similarity of every pair of codes.
+    """
+    codes = np.empty(len(words), dtype=np.intp)
+    word_codes: dict[str, int] = {}
+    syllable_codes: dict[str, int] = {}
+    initials: list[str | int] = []
+    finals: list[str | int] = []
+    for k, word in enumerate(words):
+        code = word_codes.get(word)
+        if code is None:
+            syllable = ''.join(lazy_pinyin(word)).lower()
+            code = syllable_codes.get(syllable)
+            if code is None:
+                code = syllable_codes[syllable] = len(syllable_codes)
+                if syllable != word.lower():
+                    initial, final = split_syllable(syllable)
+                else:
+                    # Not Chinese, only matches itself
+                    initial, final = -code - 1, -code - 1
+                initials.append(initial)
+                finals.append(final)
+            word_codes[word] = code
+        codes[k] = code
+
+    _, initial_ids = np.unique(np.array([str(initial) for initial in initials]), return_inverse=True)
+    _, final_ids = np.unique(np.array([str(final) for final in finals]), return_inverse=True)
+    same_initial = initial_ids[:, None] == initial_ids[None, :]
+    same_final = final_ids[:, None] == final_ids[None, :]
+    similarity = np.where(
+        same_initial & same_final, FUZZY, np.where(same_final, PARTIAL, MISMATCH)
+    ).astype(np.int64)
+    np.fill_diagonal(similarity, MATCH)
+    return codes, similarity
+
+def align(words: list[str], targets: list[str], band: int = BAND) -> list[int]:
+    """
+    Aligns two word sequences monotonically.
+
+    Returns:
+        For every word, the index of the target it is aligned to and sounds
+        like, or -1.
+    """
+    n, m = len(words), len(targets)
+    matched = [-1] * n
+    if not n or not m:
+        return matched
+    codes, similarity = encode(words + targets)
+    a, b = codes[:n], codes[n:]
+
+    # Band of every row around the diagonal from (0, 0) to (n, m), wide
+    # enough for consecutive rows to overlap
+    width = band + abs(n - m)
+    centers = np.rint(np.arange(n + 1) * (m / n)).astype(np.int64)
+    los = np.maximum(centers - width, 0).tolist()
+    his = np.minimum(centers + width, m).tolist()
+
+    gaps = np.arange(m + 1, dtype=np.int64) * GAP
+    previous = gaps[:his[0] + 1]
+    pointers = np.empty((n, 2 * width + 1), dtype=np.int8)
+    up = np.empty(2 * width + 1, dtype=np.int64)
+    diagonal = np.empty(2 * width + 1, dtype=np.int64)
+    for i in range(1, n + 1):
+        lo, hi, plo, phi = los[i], his[i], los[i - 1], his[i - 1]
+        size = hi - lo + 1
+        row_up, row_diagonal = up[:size], diagonal[:size]
+        row_up.fill(UNREACHABLE)
+        row_diagonal.fill(UNREACHABLE)
+        start, end = max(lo, plo), min(hi, phi)
+        if start <= end:
+            np.add(previous[start - plo:end - plo + 1], GAP, out=row_up[start - lo:end - lo + 1])
+        start, end = max(lo, plo + 1), min(hi, phi + 1)
+        if start <= end:
+            np.add(
+                previous[start - 1 - plo:end - plo], similarity[a[i - 1], b[start - 1:end]],
+                out=row_diagonal[start - lo:end - lo + 1]
+            )
+        best = np.maximum(row_diagonal, row_up)
+        # Gaps along the row: row[j] = max over k <= j of best[k] + GAP * (j - k)
+        row_gaps = gaps[lo:hi + 1]
+        row = np.maximum.accumulate(best - row_gaps) + row_gaps
+        # LEFT where a gap along the row wins, else UP where it beats the diagonal
+        np.maximum((row > best) * LEFT, row_diagonal < row_up, out=pointers[i - 1, :size], casting='unsafe')
+        previous = row
+
+    i, j = n, m
+    while i > 0 and j > 0:
+        pointer = pointers[i - 1][j - los[i]]
+        if pointer == DIAGONAL:
+            if similarity[a[i - 1], b[j - 1]] >= FUZZY:
+                matched[i - 1] = j - 1
+            i -= 1
+            j -= 1
+        elif pointer == UP:
+            i -= 1
+        else:
+            j -= 1
+    return matched
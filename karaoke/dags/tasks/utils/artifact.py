@@ -6,6 +6,7 @@ class ArtifactType(Enum):
     JSON = 'json'
     SEGMENT = 'segment'
     SENTENCE = 'sentence'
+    TIMELINE = 'timeline'
 
 class ExportedArtifactTag(Enum):
     METADATA = 'metadata'
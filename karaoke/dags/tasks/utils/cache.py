@@ -0,0 +1,170 @@
+import errno
+import fcntl
+import hashlib
+import logging
+import os
+import shutil
+import time
+import uuid
+
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+PART_SUFFIX = ".part"
+LOCK_DIR = "locks"
+EVICTION_LOCK = ".eviction.lock"
+# Downloads left behind by a killed process
+STALE_PART_AGE = 3600
+# Entries share their inode with the links handed to tasks
+ENTRY_MODE = 0o444
+
+def link_file(source: str, target: str) -> None:
+    """
+    Hard-links a file, copies it when both paths are on different filesystems.
+    """
+    try:
+        os.link(source, target)
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+            raise
+        shutil.copyfile(source, target)
+
+class ArtifactCache:
+    """
+    Node-local cache of artifacts shared by every task process on the node.
+
+    Entries are named after the object path and its etag, so a rewritten
+    object is never served from an older entry. Files are handed to tasks
+    as hard links, a task removing its copy leaves the entry in place.
+    Entries are read-only, so a task cannot write through its link into
+    the entry other tasks read.
+
+    Fetches of the same entry are serialized by a lock file per entry, so
+    concurrent processes download it once. The total size is bounded and
+    the least recently used entries, by mtime, are evicted first.
+    """
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.logger = logging.getLogger(__name__)
+        os.makedirs(os.path.join(directory, LOCK_DIR), exist_ok=True)
+
+    def _get_name(self, path: str, etag: str) -> str:
+        etag = etag.strip('"')
+        return hashlib.sha1(f"{path}|{etag}".encode('utf-8')).hexdigest()
+
+    @contextmanager
+    def _lock(self, name: str, blocking: bool = True) -> Iterator[bool]:
+        with open(os.path.join(self.directory, LOCK_DIR, name), 'a') as f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def link(self, path: str, etag: str, filepath: str) -> bool:
+        """
+        Links the cached copy of an object to `filepath`, False on a miss.
+        """
+        entry = os.path.join(self.directory, self._get_name(path, etag))
+        try:
+            # The mtime orders entries for eviction
+            os.utime(entry)
+            link_file(entry, filepath)
+        except FileNotFoundError:
+            return False
+        self.logger.debug('Linked cached %s to %s', path, filepath)
+        return True
+
+    def fetch(self, path: str, etag: str, filepath: str, download: Callable[[str], None]) -> bool:
+        """
+        Places an object at `filepath`, downloading it with `download` into
+        a given file once across processes on a miss.
+
+        Returns:
+            Whether the object was already cached on this node.
+        """
+        name = self._get_name(path, etag)
+        with self._lock(name):
+            if self.link(path, etag, filepath):
+                return True
+            part_path = os.path.join(self.directory, f"{name}.{uuid.uuid4().hex}{PART_SUFFIX}")
+            try:
+                started = time.perf_counter()
+                download(part_path)
+                os.chmod(part_path, ENTRY_MODE)
+                link_file(part_path, filepath)
+                os.replace(part_path, os.path.join(self.directory, name))
+            finally:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+            self.logger.debug('Cached %s in %.3fs', path, time.perf_counter() - started)
+        self.evict()
+        return False
+
+    def put(self, path: str, etag: str, filepath: str) -> None:
+        """
+        Adds a file just uploaded as the object at `path` without copying it,
+        the file becomes read-only.
+        """
+        name = self._get_name(path, etag)
+        part_path = os.path.join(self.directory, f"{name}.{uuid.uuid4().hex}{PART_SUFFIX}")
+        try:
+            link_file(filepath, part_path)
+            os.chmod(part_path, ENTRY_MODE)
+            os.replace(part_path, os.path.join(self.directory, name))
+        finally:
+            if os.path.exists(part_path):
+                os.remove(part_path)
+        self.logger.debug('Cached uploaded %s', path)
+        self.evict()
+
+    def evict(self) -> None:
+        """
+        Removes the least recently used entries and their lock files until the
+        cache fits in `max_bytes`. Skipped while another process is evicting,
+        entries being fetched are kept.
+        """
+        with self._lock(EVICTION_LOCK, blocking=False) as locked:
+            if not locked:
+                return
+            now = time.time()
+            entries = []
+            for entry in os.scandir(self.directory):
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+                if entry.name.endswith(PART_SUFFIX):
+                    if now - stat.st_mtime > STALE_PART_AGE:
+                        try:
+                            os.remove(entry.path)
+                        except FileNotFoundError:
+                            pass
+                    continue
+                entries.append((stat.st_mtime, entry.path, stat.st_size))
+            entries.sort()
+            size = sum(entry[2] for entry in entries)
+            evicted = 0
+            # The newest entry is kept even when it alone exceeds the bound
+            for _, entry_path, entry_size in entries[:-1]:
+                if size <= self.max_bytes:
+                    break
+                name = os.path.basename(entry_path)
+                with self._lock(name, blocking=False) as locked:
+                    if not locked:
+                        continue
+                    try:
+                        os.remove(entry_path)
+                    except FileNotFoundError:
+                        pass
+                    # A process already waiting on the removed lock file may download
+                    # the entry again alongside a new one, the result is the same
+                    os.remove(os.path.join(self.directory, LOCK_DIR, name))
+                size -= entry_size
+                evicted += 1
+            if evicted:
+                self.logger.debug('Evicted %d cached artifacts', evicted)
@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from .protocol import DEFAULT_WORKER_SOCKET
 from pydantic_settings import (
     BaseSettings, 
     SettingsConfigDict
@@ -24,6 +25,38 @@ class TranscriptionConfig(BaseModel):
     initial_prompt: str = ""
     host: str = "127.0.0.1"
     port: int = 5000
+    timeout: float = 3600
+    # How the audio reaches the daemon: path (shared filesystem), file or pcm
+    transfer: str = "path"
+
+class SeparationConfig(BaseModel):
+    host: str = "127.0.0.1"
+    port: int = 5001
+
+class ArtifactCacheConfig(BaseModel):
+    # Node-local artifact cache shared by the task processes of a node
+    enabled: bool = True
+    # Keep on the filesystem of cache_dir so files are hard-linked instead of copied
+    directory: str = "/tmp/artifact-cache"
+    max_bytes: int = 10 * 1024 ** 3
+
+class TransferConfig(BaseModel):
+    # Artifacts and args loaded or stored at once by a task
+    concurrency: int = 4
+    # Larger uploads are sent as multipart uploads of parts of this size
+    part_size: int = 8 * 1024 ** 2
+    part_concurrency: int = 4
+
+class TimelineConfig(BaseModel):
+    # Pass word timelines between tasks in the binary format of tasks.utils.timeline,
+    # viewers still get a JSON copy
+    binary: bool = True
+
+class WorkerConfig(BaseModel):
+    # Unix socket of the warm task worker, see tasks.worker
+    socket_path: str = DEFAULT_WORKER_SOCKET
+    # Requests run at once, each in its own forked process, further ones wait
+    max_children: int = 8
 
 class AppConfig(BaseSettings):
     log_level: str = 'INFO'
@@ -33,6 +66,11 @@ class AppConfig(BaseSettings):
     storage: StorageConfig = StorageConfig()
     provider: ProviderConfig = ProviderConfig()
     transcription: TranscriptionConfig = TranscriptionConfig()
+    separation: SeparationConfig = SeparationConfig()
+    worker: WorkerConfig = WorkerConfig()
+    artifact_cache: ArtifactCacheConfig = ArtifactCacheConfig()
+    transfer: TransferConfig = TransferConfig()
+    timeline: TimelineConfig = TimelineConfig()
 
     # Configuration to handle case sensitivity and env files
     model_config = SettingsConfigDict(
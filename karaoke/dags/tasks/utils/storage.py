@@ -2,11 +2,13 @@ import json
 import io
 
 from enum import Enum
+from functools import cache
 from minio import Minio
 from minio.helpers import ObjectWriteResult
 from minio.datatypes import Object
 from pathlib import Path
 from typing import Tuple, Any
+from .cache import ArtifactCache
 from .config import config
 
 class BucketType(Enum):
@@ -21,6 +23,9 @@ class Storage:
             config.storage.secret_key,
             secure=config.storage.secure
         )
+        self.cache: ArtifactCache | None = None
+        if config.artifact_cache.enabled:
+            self.cache = ArtifactCache(config.artifact_cache.directory, config.artifact_cache.max_bytes)
     
     def _split_path(self, path: str) -> Tuple[str, str]:
         """
@@ -59,16 +64,20 @@ class Storage:
             data = response.read().decode("utf-8")
             return json.loads(data)
 
-    def download(self, path: str,  filepath: str) -> Object:
+    def download(self, path: str,  filepath: str) -> Tuple[Object, bool]:
         """
         Downloads an object from Minio directly to the local filesystem.
 
+        With the artifact cache enabled a copy on this node is linked instead,
+        only the object's stat is fetched to check it is current.
+
         Args:
             path: String in 'bucket/object' format.
             filepath: The local path where the file should be saved.
 
         Returns:
-            The Minio Stat object containing metadata about the downloaded file.
+            The Minio Stat object containing metadata about the downloaded file,
+            and whether it was linked from the artifact cache instead.
         """
         
         bucket, key = self._split_path(path)
@@ -76,26 +85,53 @@ class Storage:
         dest_path = Path(filepath)
         dest_path.parent.mkdir(parents=True, exist_ok=True)
 
-        return self.client.fget_object(
-            bucket,
-            key,
-            filepath
-        )
+        if self.cache is None:
+            return self.client.fget_object(
+                bucket,
+                key,
+                filepath
+            ), False
+
+        stat = self.client.stat_object(bucket, key)
+        etag = stat.etag or ''
+        cached = self.cache.fetch(path, etag, filepath, lambda part_path: self._download_etag(bucket, key, etag, part_path))
+        return stat, cached
+
+    def _download_etag(self, bucket: str, key: str, etag: str, filepath: str) -> None:
+        """
+        Downloads the version of an object with the given etag, fails if it was rewritten since.
+        """
+        quoted_etag = '"' + etag.strip('"') + '"'
+        response = self.client.get_object(bucket, key, request_headers={"If-Match": quoted_etag})
+        try:
+            with open(filepath, 'wb') as f:
+                for chunk in response.stream(1024 * 1024):
+                    f.write(chunk)
+        finally:
+            response.close()
+            response.release_conn()
 
     def upload_file(self, bucket_type: BucketType, key: str, filepath: str) -> ObjectWriteResult:
         """
-        Uploads file to a specific path.
+        Uploads file to a specific path, files larger than the configured
+        part size are sent as a multipart upload with parts in parallel.
         
         Args:
             bucket: bucket string.
             key: key string
             filepath: file to upload.
         """
-        return self.client.fput_object(
+        result = self.client.fput_object(
             bucket_type.value,
             key,
-            filepath
+            filepath,
+            part_size=config.transfer.part_size,
+            num_parallel_uploads=config.transfer.part_concurrency
         )
+        if self.cache is not None and result.etag:
+            # Downstream tasks on this node read the file from the cache
+            self.cache.put(f"{bucket_type.value}/{key}", result.etag, filepath)
+        return result
     
     def put_binary(self, bucket_type: BucketType, key: str, data: bytes, content_type: str = "application/octet-stream") -> ObjectWriteResult:
         """
@@ -117,5 +153,10 @@ class Storage:
             content_type=content_type
         )
 
-   
-            
\ No newline at end of file
+@cache
+def get_storage() -> Storage:
+    """
+    Returns a process-wide storage client so that tasks sharing a
+    long-lived worker also share its connection pool.
+    """
+    return Storage()
@@ -0,0 +1,200 @@
+"""
+Columnar binary format of word timelines passed between tasks.
+
+A timeline is either a flat list of words, like the transcription, or a
+list of lines of words, like the mapped lyrics. Every word is a dict with
+the same keys: numbers (or None) are stored as float64 or int64 columns and
+strings as one UTF-8 blob with a character offset table. Lines are stored
+as an offset table into the words.
+
+Layout: magic, header length (uint32 LE), JSON header, then every buffer
+aligned to 8 bytes, so columns are read straight from a memory map.
+"""
+import json
+import mmap
+import struct
+import numpy as np
+
+from typing import Any
+
+MAGIC = b"KTVTIME1"
+ALIGNMENT = 8
+FORMAT_VERSION = 1
+
+class TimelineFormatError(ValueError):
+    pass
+
+def is_timeline_file(path: str) -> bool:
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+def _get_kind(key: str, values: list) -> str:
+    if all(isinstance(value, str) for value in values):
+        return "text"
+    if any(isinstance(value, bool) or not isinstance(value, (int, float, type(None))) for value in values):
+        raise TimelineFormatError(f"Unsupported values of {key}")
+    if all(isinstance(value, int) for value in values):
+        return "int"
+    return "float"
+
+def write_timeline(path: str, timeline: list) -> None:
+    """
+    Writes a flat or nested timeline.
+
+    Raises:
+        TimelineFormatError: If words have different keys or values other
+            than strings and numbers.
+    """
+    nested = bool(timeline) and isinstance(timeline[0], list)
+    words: list[dict[str, Any]] = [word for line in timeline for word in line] if nested else timeline
+    keys = list(words[0].keys()) if words else []
+    if any(len(word) != len(keys) for word in words):
+        raise TimelineFormatError("Words have different keys")
+
+    buffers: list[bytes] = []
+    columns = []
+    def add_buffer(data: bytes) -> dict:
+        buffers.append(data)
+        return {"index": len(buffers) - 1, "length": len(data)}
+
+    for key in keys:
+        try:
+            values = [word[key] for word in words]
+        except KeyError:
+            raise TimelineFormatError(f"Missing {key} in some words")
+        kind = _get_kind(key, values)
+        column: dict[str, Any] = {"name": key, "kind": kind}
+        if kind == "text":
+            offsets = np.zeros(len(values) + 1, dtype='<u4')
+            np.cumsum([len(value) for value in values], out=offsets[1:])
+            column["offsets"] = add_buffer(offsets.tobytes())
+            column["data"] = add_buffer(''.join(values).encode('utf-8'))
+        elif kind == "int":
+            column["data"] = add_buffer(np.asarray(values, dtype='<i8').tobytes())
+        else:
+            # None is stored as NaN
+            column["data"] = add_buffer(np.asarray(
+                [np.nan if value is None else value for value in values], dtype='<f8'
+            ).tobytes())
+        columns.append(column)
+
+    header: dict[str, Any] = {"version": FORMAT_VERSION, "count": len(words), "columns": columns}
+    if nested:
+        line_offsets = np.zeros(len(timeline) + 1, dtype='<u4')
+        np.cumsum([len(line) for line in timeline], out=line_offsets[1:])
+        header["lines"] = add_buffer(line_offsets.tobytes())
+
+    # Positions are relative to the first buffer, which follows the header
+    position = 0
+    positions = []
+    for data in buffers:
+        positions.append(position)
+        position += -(-len(data) // ALIGNMENT) * ALIGNMENT
+    header["buffers"] = positions
+    raw_header = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    data_start = -(-(len(MAGIC) + 4 + len(raw_header)) // ALIGNMENT) * ALIGNMENT
+
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(raw_header)))
+        f.write(raw_header)
+        f.write(b'\0' * (data_start - f.tell()))
+        for data in buffers:
+            f.write(data)
+            f.write(b'\0' * (-len(data) % ALIGNMENT))
+
+class Timeline:
+    """
+    Memory-mapped timeline, columns are NumPy arrays over the mapped file.
+    """
+    def __init__(self, path: str):
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise TimelineFormatError(f"{path} is not a timeline")
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        header_length, = struct.unpack_from('<I', self._mmap, len(MAGIC))
+        header_end = len(MAGIC) + 4 + header_length
+        self.header = json.loads(self._mmap[len(MAGIC) + 4:header_end])
+        if self.header["version"] != FORMAT_VERSION:
+            raise TimelineFormatError(f"Unsupported timeline version {self.header['version']}")
+        self._data_start = -(-header_end // ALIGNMENT) * ALIGNMENT
+        self.count: int = self.header["count"]
+        self.columns: dict[str, dict] = {column["name"]: column for column in self.header["columns"]}
+
+    def __enter__(self) -> "Timeline":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Arrays handed out still reference the map, it is closed once they are released
+            pass
+
+    def _buffer(self, ref: dict, dtype: str) -> np.ndarray:
+        offset = self._data_start + self.header["buffers"][ref["index"]]
+        return np.frombuffer(self._mmap, dtype=dtype, count=ref["length"] // np.dtype(dtype).itemsize, offset=offset) # type: ignore
+
+    @property
+    def nested(self) -> bool:
+        return "lines" in self.header
+
+    @property
+    def line_offsets(self) -> np.ndarray | None:
+        return self._buffer(self.header["lines"], '<u4') if self.nested else None
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Returns a numeric column without copying it.
+        """
+        column = self.columns[name]
+        if column["kind"] == "text":
+            raise TimelineFormatError(f"{name} is a text column")
+        return self._buffer(column["data"], '<i8' if column["kind"] == "int" else '<f8')
+
+    def texts(self, name: str) -> list[str]:
+        column = self.columns[name]
+        ref = column["data"]
+        start = self._data_start + self.header["buffers"][ref["index"]]
+        text = self._mmap[start:start + ref["length"]].decode('utf-8') # type: ignore
+        offsets = self._buffer(column["offsets"], '<u4').tolist()
+        return [text[begin:end] for begin, end in zip(offsets, offsets[1:])]
+
+    def to_list(self) -> list:
+        """
+        Decodes the timeline back into the lists of dicts it was written from.
+        """
+        values = []
+        for name, column in self.columns.items():
+            if column["kind"] == "text":
+                values.append(self.texts(name))
+            elif column["kind"] == "int":
+                values.append(self.column(name).tolist())
+            else:
+                floats = self.column(name)
+                decoded = floats.tolist()
+                if np.isnan(floats).any():
+                    decoded = [None if value != value else value for value in decoded]
+                values.append(decoded)
+        names = list(self.columns)
+        words = [dict(zip(names, word)) for word in zip(*values)] if names else [{} for _ in range(self.count)]
+        if not self.nested:
+            return words
+        offsets = self.line_offsets.tolist() # type: ignore
+        return [words[begin:end] for begin, end in zip(offsets, offsets[1:])]
+
+def read_timeline(path: str) -> list:
+    with Timeline(path) as timeline:
+        return timeline.to_list()
+
+def load_timeline(path: str) -> list:
+    """
+    Reads a timeline artifact in either the binary or the JSON format.
+    """
+    if is_timeline_file(path):
+        return read_timeline(path)
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
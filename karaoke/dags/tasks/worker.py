@@ -0,0 +1,170 @@
+import argparse
+import contextvars
+import importlib
+import logging
+import os
+import re
+import socket
+import socketserver
+import threading
+import time
+import traceback
+
+from types import ModuleType
+from .base import TaskCancelled, cancel_event
+from .cli import setup_logging, mark_started
+from .utils.config import config
+from .utils.protocol import send_message, recv_message
+
+TASK_MODULE_PATTERN = re.compile(r'^[a-z_]+$')
+NON_TASK_MODULES = ('base', 'cli', 'client', 'worker')
+
+logger = logging.getLogger('worker')
+
+class RequestContext:
+    """
+    Connection of the client of a request, shared by the threads of its task
+    in the process forked for the request.
+    """
+    def __init__(self, conn: socket.socket):
+        self.conn = conn
+        # Log frames of several threads must not interleave
+        self.send_lock = threading.Lock()
+        self.cancelled = threading.Event()
+
+    def send(self, message: dict) -> None:
+        with self.send_lock:
+            send_message(self.conn, message)
+
+    def watch(self) -> None:
+        """
+        Waits for the client to disconnect, clients send nothing after their request.
+        """
+        try:
+            while self.conn.recv(1024):
+                pass
+        except OSError:
+            pass
+        self.cancelled.set()
+
+# Request of the task running in the current context, copied into its transfer threads
+current_request: contextvars.ContextVar[RequestContext | None] = contextvars.ContextVar('current_request', default=None)
+
+class ForwardingHandler(logging.Handler):
+    """
+    Sends log records emitted by a request's task back to the client
+    that issued the request, so they end up in the Airflow task log.
+    """
+    def emit(self, record: logging.LogRecord) -> None:
+        request = current_request.get()
+        if request is None or request.cancelled.is_set():
+            return
+        try:
+            request.send({
+                "type": "log",
+                "message": self.format(record)
+            })
+        except OSError:
+            # The client disconnected, the watcher cancels the task
+            pass
+        except Exception:
+            self.handleError(record)
+
+forwarder = ForwardingHandler()
+import_times: dict[str, float] = {}
+import_lock = threading.Lock()
+
+def load_task_module(name: str) -> tuple[ModuleType, float]:
+    """
+    Imports a task module once and returns it with the time the import took.
+    """
+    if not TASK_MODULE_PATTERN.match(name) or name in NON_TASK_MODULES:
+        raise ValueError(f"Invalid task module: {name}")
+    with import_lock:
+        if name in import_times:
+            return importlib.import_module(f"{__package__}.{name}"), 0.0
+        started = time.perf_counter()
+        module = importlib.import_module(f"{__package__}.{name}")
+        import_times[name] = time.perf_counter() - started
+        logger.info(f"Imported {name} in {import_times[name]:.3f}s")
+        return module, import_times[name]
+
+class TaskRequestHandler(socketserver.BaseRequestHandler):
+    """
+    Runs `tasks.<module>.main(argv)` for one request and reports the result.
+    """
+    def handle(self) -> None:
+        conn: socket.socket = self.request
+        received_at = time.perf_counter()
+        request = recv_message(conn)
+        module_name = request.get("module")
+        argv = request.get("argv", [])
+
+        context = RequestContext(conn)
+        request_token = current_request.set(context)
+        cancel_token = cancel_event.set(context.cancelled)
+        threading.Thread(target=context.watch, daemon=True).start()
+        try:
+            module, import_time = load_task_module(module_name)
+            mark_started(received_at, in_worker=True)
+            started = time.perf_counter()
+            value = module.main(argv)
+            timing = {
+                "import": import_time,
+                "startup": started - received_at,
+                "execution": time.perf_counter() - started
+            }
+            response = {"type": "result", "value": value, "timing": timing}
+        except SystemExit as e:
+            # argparse exits on invalid arguments or --help
+            response = {"type": "error", "message": f"Task exited with {e.code}"} if e.code else \
+                {"type": "result", "value": None, "timing": {}}
+        except TaskCancelled:
+            logger.warning(f"Task {module_name} cancelled, its client disconnected")
+            return
+        except Exception as e:
+            logger.error(f"Task {module_name} failed: {e}", exc_info=True)
+            response = {"type": "error", "message": ''.join(traceback.format_exception(e))}
+        finally:
+            cancel_event.reset(cancel_token)
+            current_request.reset(request_token)
+
+        logger.info(f"Finished {module_name} with {response['type']}: {response.get('timing')}")
+        try:
+            context.send(response)
+        except OSError as e:
+            logger.warning(f"Could not return the result of {module_name}: {e}")
+
+class TaskServer(socketserver.ForkingMixIn, socketserver.UnixStreamServer):
+    """
+    Handles every request in a child forked from the worker, which shares the
+    task modules preloaded by the worker instead of importing them again.
+    Tasks run in parallel without contending for one GIL, and a crash or leak
+    of a task ends with its child. Beyond `max_children` running requests,
+    new connections wait in the listen backlog.
+    """
+    block_on_close = False
+
+def main():
+    parser = argparse.ArgumentParser(description='Long-lived worker executing task requests from tasks.client.')
+    parser.add_argument('--socket', default=config.worker.socket_path, help='Unix socket to listen on')
+    parser.add_argument('--preload', nargs='*', default=[], help='Task modules to import at startup')
+    args = parser.parse_args()
+
+    setup_logging()
+    forwarder.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s"))
+    logging.getLogger().addHandler(forwarder)
+
+    # Imported before any request is forked, other modules are imported by each child
+    for name in args.preload:
+        load_task_module(name)
+
+    if os.path.exists(args.socket):
+        os.remove(args.socket)
+    with TaskServer(args.socket, TaskRequestHandler) as server:
+        server.max_children = config.worker.max_children
+        logger.info(f"Task worker listening on {args.socket}, running up to {server.max_children} tasks at once")
+        server.serve_forever()
+
+if __name__ == "__main__":
+    main()
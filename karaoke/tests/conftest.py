@@ -0,0 +1,9 @@
+import os
+import sys
+
+KARAOKE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DAEMON_DIR = os.path.join(KARAOKE_DIR, "workers", "gpu", "daemon")
+BENCHMARKS_DIR = os.path.join(KARAOKE_DIR, "benchmarks")
+
+# Tasks are imported as `tasks.*`, the same as with PYTHONPATH=dags
+sys.path.insert(0, os.path.join(KARAOKE_DIR, "dags"))
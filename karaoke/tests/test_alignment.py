@@ -0,0 +1,78 @@
+"""
+Accuracy of matching lyrics words to transcription words on the regression
+corpus of the alignment benchmark, and mapping lyrics onto a transcription
+with the fallback to the transcription's own words.
+
+Run from the `karaoke` directory:
+
+    python -m pytest tests
+"""
+import json
+import logging
+import importlib.util
+import pytest
+
+from unittest import mock
+from tasks import mapping
+from tasks.mapping import map_lyrics, match_words, separate_sentence
+from conftest import BENCHMARKS_DIR
+
+spec = importlib.util.spec_from_file_location("lyrics_alignment", f"{BENCHMARKS_DIR}/lyrics_alignment.py")
+benchmark = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(benchmark)
+
+# Same floor as `lyrics_alignment.py --check`
+MIN_ACCURACY = 0.95
+
+with open(benchmark.CORPUS, encoding="utf-8") as f:
+    CASES = {case["name"]: case for case in json.load(f)["cases"]}
+
+logger = logging.getLogger(__name__)
+
+@pytest.mark.parametrize("name", CASES)
+def test_match_words_accuracy(name):
+    case = CASES[name]
+    lyrics_words, transcription_words = benchmark.get_words(case)
+    matched = match_words(lyrics_words, transcription_words)
+
+    assert len(matched) == len(lyrics_words)
+    assert all(-1 <= index < len(transcription_words) for index in matched)
+    assert benchmark.get_accuracy(matched, case["expected"]) >= MIN_ACCURACY
+
+def test_map_lyrics_with_lyrics():
+    case = CASES["homophones"]
+    transcription = case["transcription"]
+    sentences = map_lyrics(transcription, case["lyrics"], logger)
+
+    # The lyrics are timed, not the misheard transcription
+    assert [''.join(word["word"] for word in sentence) for sentence in sentences] == case["lyrics"].splitlines()
+    starts = [word["start"] for sentence in sentences for word in sentence]
+    assert starts == sorted(starts)
+    assert transcription[0]["start"] <= starts[0] and starts[-1] < transcription[-1]["end"]
+    assert all(word["start"] < word["end"] for sentence in sentences for word in sentence)
+
+@pytest.mark.parametrize("lyrics", ["", None])
+def test_map_lyrics_without_lyrics(lyrics):
+    transcription = CASES["clean"]["transcription"]
+    sentences = map_lyrics(transcription, lyrics, logger)
+
+    assert [[word["word"] for word in sentence] for sentence in sentences] == [
+        separate_sentence(line["text"]) for line in transcription
+    ]
+    assert sentences[0][0]["start"] == transcription[0]["start"]
+    assert sentences[-1][-1]["end"] == transcription[-1]["end"]
+
+def test_map_lyrics_falls_back_when_mapping_fails():
+    transcription = CASES["clean"]["transcription"]
+    with mock.patch.object(mapping, "do_mapping", side_effect=IndexError("list index out of range")):
+        sentences = map_lyrics(transcription, CASES["clean"]["lyrics"], logger)
+
+    assert sentences == map_lyrics(transcription, "", logger)
+
+@pytest.mark.parametrize("transcription, lyrics", [
+    ([], ""),
+    ([], "夜色慢慢落在城市的邊緣"),
+    ([{"start": 1.0, "end": 2.0, "text": " "}], ""),
+])
+def test_map_lyrics_empty_inputs(transcription, lyrics):
+    assert map_lyrics(transcription, lyrics, logger) == []
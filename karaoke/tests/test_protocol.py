@@ -0,0 +1,218 @@
+"""
+Round trips of the framing protocol shared by the task workers and the GPU
+daemons, and of transcription requests through the daemon's request handler
+with a stub model in place of whisper.
+
+Run from the `karaoke` directory:
+
+    python -m pytest tests
+"""
+import sys
+import time
+import types
+import socket
+import importlib.util
+import threading
+import numpy as np
+import pytest
+
+from unittest import mock
+from tasks.utils import protocol as task_protocol
+from conftest import DAEMON_DIR
+
+def load_daemon_module(name: str) -> types.ModuleType:
+    spec = importlib.util.spec_from_file_location(f"daemon_{name}", f"{DAEMON_DIR}/{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+# The daemon keeps its own copy of the protocol, both must speak the same frames
+PROTOCOLS = [task_protocol, load_daemon_module("protocol")]
+
+@pytest.fixture
+def connection():
+    client, server = socket.socketpair()
+    yield client, server
+    client.close()
+    server.close()
+
+@pytest.mark.parametrize("sender", PROTOCOLS)
+@pytest.mark.parametrize("receiver", PROTOCOLS)
+def test_message_round_trip(connection, sender, receiver):
+    client, server = connection
+    message = {"id": "abc", "type": "segments", "segments": [{"text": "你好", "start": 0.5}]}
+    sender.send_message(client, message)
+    assert receiver.recv_frame(server) == (message, None)
+
+@pytest.mark.parametrize("protocol", PROTOCOLS)
+def test_payload_round_trip(connection, protocol):
+    client, server = connection
+    samples = np.linspace(-1, 1, 4096, dtype=np.float32)
+    protocol.send_message(client, {"transfer": "pcm"}, payload=samples)
+    protocol.send_message(client, {"transfer": "file"}, payload=b"")
+    protocol.send_message(client, {"type": "cancel"})
+
+    message, payload = protocol.recv_frame(server)
+    assert message == {"transfer": "pcm"}
+    np.testing.assert_array_equal(np.frombuffer(payload, np.float32), samples)
+    assert protocol.recv_frame(server) == ({"transfer": "file"}, bytearray())
+    # A frame following payloads is still in sync
+    assert protocol.recv_message(server) == {"type": "cancel"}
+
+@pytest.mark.parametrize("protocol", PROTOCOLS)
+@pytest.mark.parametrize("header, error", [
+    ((b"XX", task_protocol.PROTOCOL_VERSION, 0, 2), "magic"),
+    ((task_protocol.MAGIC, task_protocol.PROTOCOL_VERSION + 1, 0, 2), "version"),
+    ((task_protocol.MAGIC, task_protocol.PROTOCOL_VERSION, 0, task_protocol.MAX_FRAME_SIZE + 1), "exceeds"),
+])
+def test_rejects_invalid_header(connection, protocol, header, error):
+    client, server = connection
+    client.sendall(protocol.HEADER.pack(*header) + b"{}")
+    with pytest.raises(protocol.ProtocolError, match=error):
+        protocol.recv_frame(server)
+
+@pytest.mark.parametrize("protocol", PROTOCOLS)
+def test_rejects_oversized_payload(connection, protocol):
+    client, server = connection
+    client.sendall(
+        protocol.HEADER.pack(protocol.MAGIC, protocol.PROTOCOL_VERSION, protocol.FLAG_PAYLOAD, 2) + b"{}"
+        + protocol.PAYLOAD_HEADER.pack(protocol.MAX_PAYLOAD_SIZE + 1)
+    )
+    with pytest.raises(protocol.ProtocolError, match="exceeds"):
+        protocol.recv_frame(server)
+
+@pytest.mark.parametrize("protocol", PROTOCOLS)
+def test_closed_mid_frame(connection, protocol):
+    client, server = connection
+    client.sendall(protocol.HEADER.pack(protocol.MAGIC, protocol.PROTOCOL_VERSION, 0, 100) + b'{"id"')
+    client.close()
+    with pytest.raises(ConnectionError, match="after 5 of 100 bytes"):
+        protocol.recv_frame(server)
+
+class StubResult:
+    def __init__(self, segments: list[dict]):
+        self.segments = segments
+
+    def to_dict(self) -> dict:
+        return {"segments": self.segments}
+
+class StubModel:
+    """
+    Stands in for the whisper model, one segment per clip or lyrics line.
+    `delay` keeps a transcription reporting progress for that many seconds.
+    """
+    def __init__(self):
+        self.delay = 0.0
+
+    def progress(self, progress_callback) -> None:
+        ends_at = time.perf_counter() + self.delay
+        while True:
+            progress_callback(0.5, 1)
+            if time.perf_counter() >= ends_at:
+                return
+            time.sleep(0.01)
+
+    def transcribe(self, audio, clip_timestamps, progress_callback, **kwargs) -> StubResult:
+        self.progress(progress_callback)
+        clips = list(zip(clip_timestamps[::2], clip_timestamps[1::2])) or [(0.0, len(audio) / 16000)]
+        return StubResult([
+            {"start": start, "end": end, "words": [{"start": start, "end": end, "word": "好"}]}
+            for start, end in clips
+        ])
+
+    def align(self, audio, lyrics, progress_callback, **kwargs) -> StubResult:
+        self.progress(progress_callback)
+        return StubResult([
+            {"start": float(i), "end": i + 1.0, "words": [{"start": float(i), "end": i + 1.0, "word": line}]}
+            for i, line in enumerate(lyrics.splitlines())
+        ])
+
+@pytest.fixture(scope="module")
+def daemon():
+    """
+    The transcription daemon with whisper and torch replaced by stubs.
+    """
+    whisper = types.ModuleType("whisper")
+    whisper.audio = types.ModuleType("whisper.audio")
+    whisper.audio.SAMPLE_RATE = 16000
+    whisper.audio.load_audio = lambda path: np.zeros(16000, np.float32)
+    stubs = {
+        "torch": types.SimpleNamespace(cuda=types.SimpleNamespace(is_available=lambda: False)),
+        "stable_whisper": types.SimpleNamespace(load_model=lambda *args, **kwargs: StubModel()),
+        "whisper": whisper,
+        "whisper.audio": whisper.audio,
+    }
+    with mock.patch.dict(sys.modules, stubs), mock.patch.object(sys, "path", [DAEMON_DIR, *sys.path]):
+        module = load_daemon_module("transcribe")
+    module.config.transcription.poll_interval = 0.05
+    threading.Thread(target=module.scheduler.run, daemon=True).start()
+    return module
+
+def request(daemon, message: dict, samples: np.ndarray) -> list[dict]:
+    """
+    Sends a request to the daemon's handler and returns the frames up to the terminal one.
+    """
+    client, server = socket.socketpair()
+    handler = threading.Thread(target=daemon.TranscriptionRequestHandler, args=(server, "stub", None))
+    handler.start()
+    try:
+        task_protocol.send_message(client, message, payload=samples)
+        frames = []
+        while not frames or frames[-1]["type"] not in daemon.TERMINAL_FRAMES:
+            frames.append(task_protocol.recv_message(client))
+        handler.join(timeout=5)
+        return frames
+    finally:
+        client.close()
+        server.close()
+
+def pcm_request(request_id: str, vad_segments: list[dict], lyrics: str = "", timeout: float = 10) -> dict:
+    return {
+        "id": request_id, "transfer": "pcm", "vocal_path": f"{request_id}.wav",
+        "vad_segments": vad_segments, "lyrics": lyrics, "timeout": timeout
+    }
+
+def test_streams_segments_per_clip_group(daemon):
+    daemon.model.delay = 0
+    duration = daemon.config.transcription.stream_chunk_duration
+    vad_segments = [{"start": i * duration, "duration": duration} for i in range(3)]
+    samples = np.zeros(1600, np.float32)
+    frames = request(daemon, pcm_request("clips", vad_segments), samples)
+
+    assert all(frame["id"] == "clips" for frame in frames)
+    assert frames[0]["type"] == "received" and frames[0]["bytes"] == samples.nbytes
+    segments = [frame["segments"] for frame in frames if frame["type"] == "segments"]
+    assert [[segment["start"] for segment in batch] for batch in segments] == [[0.0], [duration], [2 * duration]]
+    assert frames[-1] == {"type": "result", "segment_count": 3, "id": "clips"}
+
+def test_streams_alignment_in_batches(daemon):
+    daemon.model.delay = 0
+    lyrics = "\n".join(f"第{i}句" for i in range(daemon.STREAM_BATCH_SIZE * 2 + 5))
+    frames = request(daemon, pcm_request("align", [], lyrics), np.zeros(1600, np.float32))
+
+    sizes = [len(frame["segments"]) for frame in frames if frame["type"] == "segments"]
+    assert sizes == [daemon.STREAM_BATCH_SIZE, daemon.STREAM_BATCH_SIZE, 5]
+    assert frames[-1]["type"] == "result" and frames[-1]["segment_count"] == len(lyrics.splitlines())
+
+def test_times_out_while_reporting_progress(daemon):
+    daemon.model.delay = 5
+    started = time.perf_counter()
+    frames = request(daemon, pcm_request("slow", [], timeout=0.3), np.zeros(1600, np.float32))
+
+    assert any(frame["type"] == "progress" for frame in frames)
+    assert frames[-1]["type"] == "error" and "Timed out" in frames[-1]["message"]
+    assert time.perf_counter() - started < 2
+
+def test_rejects_missing_payload(daemon):
+    client, server = socket.socketpair()
+    handler = threading.Thread(target=daemon.TranscriptionRequestHandler, args=(server, "stub", None))
+    handler.start()
+    try:
+        task_protocol.send_message(client, pcm_request("empty", []))
+        assert task_protocol.recv_message(client) == {
+            "type": "error", "message": "Missing audio payload for pcm transfer", "id": "empty"
+        }
+        handler.join(timeout=5)
+    finally:
+        client.close()
+        server.close()
@@ -0,0 +1,9 @@
+#!/bin/sh
+set -e
+
+echo "Running task worker..."
+
+PYTHONPATH=/opt/airflow/dags python -m tasks.worker \
+    --preload download identify lyric detect mapping sentence subtitle &
+
+exec "$@"
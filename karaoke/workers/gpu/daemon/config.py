@@ -8,6 +8,26 @@ class TranscriptionConfig(BaseModel):
     cpu_model: str = "large-v3-turbo"
     gpu_model: str = "medium"
     initial_prompt: str = ""
+    port: int = 5000
+    # Requests waiting for the model, further requests are rejected
+    max_queue_size: int = 16
+    # Upper bound of the time (seconds) a request may wait and run
+    request_timeout: float = 3600
+    # Interval (seconds) of queue position updates and cancel checks
+    poll_interval: float = 0.5
+    # VAD clips are transcribed in groups of this length (seconds) to stream segments
+    stream_chunk_duration: float = 60
+
+class SeparationConfig(BaseModel):
+    model: str = "htdemucs"
+    port: int = 5001
+    # Tracks queued within this window (seconds) are separated together
+    batch_window: float = 0.5
+    max_batch_size: int = 4
+    # Longest / shortest track allowed in one batch, shorter tracks are zero padded
+    max_pad_ratio: float = 1.5
+    shifts: int = 1
+    overlap: float = 0.25
 
 class AppConfig(BaseSettings):
     log_level: str = 'INFO'
@@ -15,6 +35,7 @@ class AppConfig(BaseSettings):
     model_dir: str = "/data/models"
 
     transcription: TranscriptionConfig = TranscriptionConfig()
+    separation: SeparationConfig = SeparationConfig()
 
     # Configuration to handle case sensitivity and env files
     model_config = SettingsConfigDict(
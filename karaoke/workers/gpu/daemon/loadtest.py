@@ -0,0 +1,157 @@
+"""
+Load test of the transcription daemon with concurrent fake clients.
+
+Start the daemon with a small CPU model, e.g.
+
+    CUDA_VISIBLE_DEVICES= transcription__cpu_model=tiny python transcribe.py
+
+and fire requests at it:
+
+    python loadtest.py --clients 8 --cancel 2 --timeout 60
+
+Each client transcribes a generated tone, reports the queue positions it was
+told about and its latency. `--cancel` clients send a cancel message as soon
+as they are queued behind another request. Run with `--transfer file` or
+`--transfer pcm` to compare the overhead of sending the audio inline with
+the default shared path mode.
+"""
+import os
+import json
+import math
+import time
+import wave
+import array
+import socket
+import argparse
+import tempfile
+import threading
+import statistics
+
+from typing import Any
+from protocol import send_message, recv_message
+
+SAMPLE_RATE = 16000
+
+def generate_samples(duration: float) -> array.array:
+    """
+    Generates mono float samples of alternating tones.
+    """
+    return array.array('f', (
+        0.25 * math.sin(2 * math.pi * (220 if int(i / SAMPLE_RATE) % 2 else 330) * i / SAMPLE_RATE)
+        for i in range(int(duration * SAMPLE_RATE))
+    ))
+
+def write_test_audio(path: str, samples: array.array) -> None:
+    """
+    Writes samples as a mono 16-bit wav.
+    """
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(SAMPLE_RATE)
+        f.writeframes(array.array('h', (int(32767 * sample) for sample in samples)).tobytes())
+
+def build_request(args: argparse.Namespace, samples: array.array, audio_path: str, vad_path: str) -> tuple[dict, Any]:
+    request = {
+        "type": "transcribe",
+        "transfer": args.transfer,
+        "vocal_path": audio_path,
+        "lyrics": args.lyrics,
+        "timeout": args.timeout
+    }
+    if args.transfer == "path":
+        request["vad_segments_path"] = vad_path
+        return request, None
+    with open(vad_path) as f:
+        request["vad_segments"] = json.load(f)
+    if args.transfer == "pcm":
+        return request, memoryview(samples)
+    with open(audio_path, 'rb') as f:
+        return request, f.read()
+
+def run_client(index: int, args: argparse.Namespace, samples: array.array, audio_path: str, vad_path: str,
+               results: list[dict]) -> None:
+    cancel = index < args.cancel
+    report: dict[str, Any] = {"client": index, "positions": [], "cancel": cancel}
+    started = time.perf_counter()
+    try:
+        request, payload = build_request(args, samples, audio_path, vad_path)
+        request["id"] = f"loadtest-{index}"
+        with socket.create_connection((args.host, args.port)) as s:
+            send_message(s, request, payload)
+            report["sent"] = time.perf_counter() - started
+            while True:
+                message = recv_message(s)
+                if message["type"] == "received":
+                    report["received"] = {key: message[key] for key in ("bytes", "receive", "decode")}
+                elif message["type"] == "queued":
+                    report["positions"].append(message["position"])
+                    if cancel and message["position"] > 1:
+                        send_message(s, {"type": "cancel"})
+                elif message["type"] == "started":
+                    report["started"] = time.perf_counter() - started
+                elif message["type"] == "segments":
+                    report.setdefault("first_segments", time.perf_counter() - started)
+                    report["segments"] = report.get("segments", 0) + len(message["segments"])
+                elif message["type"] == "progress":
+                    continue
+                else:
+                    report["status"] = message["type"]
+                    if message["type"] == "error":
+                        report["error"] = message["message"]
+                    break
+    except Exception as e:
+        report["status"] = "error"
+        report["error"] = str(e)
+    report["latency"] = time.perf_counter() - started
+    results.append(report)
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test of the transcription daemon.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--clients', type=int, default=8, help='Number of concurrent clients')
+    parser.add_argument('--cancel', type=int, default=0, help='Number of clients cancelling their request')
+    parser.add_argument('--timeout', type=float, default=600, help='Timeout of each request in seconds')
+    parser.add_argument('--duration', type=float, default=10, help='Length of the test audio in seconds')
+    parser.add_argument('--lyrics', default='', help='Lyrics to align instead of transcribing')
+    parser.add_argument('--transfer', default='path', choices=['path', 'file', 'pcm'], help='How audio is sent')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # In path mode the daemon reads the files, so both must share this directory
+        audio_path = os.path.join(tmp_dir, 'loadtest.wav')
+        vad_path = os.path.join(tmp_dir, 'vad_segments.json')
+        samples = generate_samples(args.duration)
+        write_test_audio(audio_path, samples)
+        with open(vad_path, 'w') as f:
+            json.dump([{"start": 0, "duration": args.duration}], f)
+
+        results: list[dict] = []
+        threads = [
+            threading.Thread(target=run_client, args=(i, args, samples, audio_path, vad_path, results))
+            for i in range(args.clients)
+        ]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+    for report in sorted(results, key=lambda r: r["client"]):
+        print(json.dumps(report))
+
+    succeeded = [r["latency"] for r in results if r["status"] == "result"]
+    print(f"{len(succeeded)}/{args.clients} succeeded in {elapsed:.2f}s")
+    transfers = [r["received"]["receive"] + r["received"]["decode"] for r in results if "received" in r]
+    if transfers:
+        print(f"{args.transfer} transfer: median {statistics.median(transfers) * 1000:.1f}ms to load audio on the daemon")
+    if succeeded:
+        print(
+            f"latency min {min(succeeded):.2f}s, median {statistics.median(succeeded):.2f}s, "
+            f"max {max(succeeded):.2f}s, throughput {len(succeeded) / elapsed:.2f} req/s"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import json
+import socket
+import struct
+
+from typing import Any
+
+# Frame header: magic, protocol version, flags, message length
+HEADER = struct.Struct(">2sBBI")
+# Length of the binary payload following the message
+PAYLOAD_HEADER = struct.Struct(">Q")
+MAGIC = b"KT"
+PROTOCOL_VERSION = 1
+FLAG_PAYLOAD = 0x01
+MAX_FRAME_SIZE = 256 * 1024 * 1024
+MAX_PAYLOAD_SIZE = 2 * 1024 * 1024 * 1024
+
+class ProtocolError(ConnectionError):
+    """
+    Raised when the peer sends a frame this side cannot read.
+    """
+    pass
+
+def recv_exact(conn: socket.socket, size: int) -> bytearray:
+    """
+    Reads exactly `size` bytes from a socket.
+
+    Raises:
+        ConnectionError: If the peer closes the connection early.
+    """
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        count = conn.recv_into(view[received:], size - received)
+        if count == 0:
+            raise ConnectionError(f"Connection closed after {received} of {size} bytes")
+        received += count
+    return buffer
+
+def send_message(conn: socket.socket, message: Any, payload: bytes | bytearray | memoryview | None = None) -> None:
+    """
+    Sends a JSON message as one frame, optionally followed by a binary payload.
+    The payload is sent from its own buffer without being copied.
+    """
+    data = json.dumps(message).encode("utf-8")
+    if payload is None:
+        conn.sendall(HEADER.pack(MAGIC, PROTOCOL_VERSION, 0, len(data)) + data)
+        return
+    view = memoryview(payload).cast("B")
+    conn.sendall(
+        HEADER.pack(MAGIC, PROTOCOL_VERSION, FLAG_PAYLOAD, len(data)) + data + PAYLOAD_HEADER.pack(view.nbytes)
+    )
+    conn.sendall(view)
+
+def recv_frame(conn: socket.socket) -> tuple[Any, bytearray | None]:
+    """
+    Receives a message sent by `send_message` with its binary payload, if any.
+
+    Raises:
+        ProtocolError: If the frame is not a supported protocol frame.
+    """
+    magic, version, flags, size = HEADER.unpack(recv_exact(conn, HEADER.size))
+    if magic != MAGIC:
+        raise ProtocolError(f"Invalid frame magic {magic!r}")
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f"Unsupported protocol version {version}, expected {PROTOCOL_VERSION}")
+    if size > MAX_FRAME_SIZE:
+        raise ProtocolError(f"Frame of {size} bytes exceeds {MAX_FRAME_SIZE} bytes")
+    message = json.loads(recv_exact(conn, size))
+    if not flags & FLAG_PAYLOAD:
+        return message, None
+
+    (payload_size,) = PAYLOAD_HEADER.unpack(recv_exact(conn, PAYLOAD_HEADER.size))
+    if payload_size > MAX_PAYLOAD_SIZE:
+        raise ProtocolError(f"Payload of {payload_size} bytes exceeds {MAX_PAYLOAD_SIZE} bytes")
+    return message, recv_exact(conn, payload_size)
+
+def recv_message(conn: socket.socket) -> Any:
+    """
+    Receives a message sent by `send_message`, ignoring its payload.
+    """
+    return recv_frame(conn)[0]
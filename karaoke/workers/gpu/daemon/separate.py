@@ -0,0 +1,281 @@
+import os
+import time
+import queue
+import socketserver
+import threading
+import logging
+import logging.config
+import torch
+import torch.nn.functional as F
+
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+from demucs.pretrained import get_model
+from demucs.separate import load_track
+from demucs.apply import apply_model
+from demucs.audio import save_audio
+from config import config
+from protocol import send_message, recv_message
+
+logging.config.dictConfig({
+            "version": 1,
+            "formatters": {
+                "standard": {"format": "%(asctime)s [%(levelname)s] %(name)s: %(message)s"},
+                "detailed": {"format": "%(asctime)s [%(levelname)s] %(module)s.%(funcName)s:%(lineno)d: %(message)s"},
+            },
+            "handlers": {
+                "console": {
+                    "class": "logging.StreamHandler",
+                    "formatter": "standard",
+                    "level": config.log_level,
+                },
+            },
+            "loggers": {
+                "": {
+                    "handlers": ["console"],
+                    "level": config.log_level,
+                },
+            }
+        })
+
+logger = logging.getLogger("separate")
+
+device = "cuda" if torch.cuda.is_available() else "cpu"
+
+logger.info("Loading demucs model")
+model = get_model(name=config.separation.model)
+model.to(device)
+model.eval()
+logger.info("Demucs model loaded")
+
+@dataclass(eq=False)
+class SeparationJob:
+    """
+    A decoded and normalized track waiting to be separated.
+    """
+    wav: torch.Tensor
+    mean: float
+    std: float
+    queued_at: float = field(default_factory=time.perf_counter)
+    done: threading.Event = field(default_factory=threading.Event)
+    sources: torch.Tensor | None = None
+    error: str | None = None
+    stats: dict = field(default_factory=dict)
+
+    @property
+    def length(self) -> int:
+        return self.wav.shape[-1]
+
+class Stats:
+    """
+    Running counters reported by the `stats` command.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tracks = 0
+        self.batches = 0
+        self.failed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def add_batch(self, jobs: list[SeparationJob]) -> None:
+        with self.lock:
+            self.batches += 1
+            self.tracks += len(jobs)
+
+    def add_track(self, latency: float, failed: bool) -> None:
+        with self.lock:
+            self.failed += int(failed)
+            self.total_latency += latency
+            self.max_latency = max(self.max_latency, latency)
+
+    def to_dict(self) -> dict:
+        with self.lock:
+            return {
+                "queue_depth": batcher.get_queue_depth(),
+                "tracks": self.tracks,
+                "batches": self.batches,
+                "failed": self.failed,
+                "average_batch_size": self.tracks / self.batches if self.batches else 0,
+                "average_latency": self.total_latency / self.tracks if self.tracks else 0,
+                "max_latency": self.max_latency
+            }
+
+stats = Stats()
+
+class Batcher:
+    """
+    Collects queued tracks and separates them in a single `apply_model` call.
+
+    Tracks of a batch are zero padded to the longest one, so only tracks of
+    similar length (see `max_pad_ratio`) are grouped together. The oldest
+    waiting track always leads the next batch.
+    """
+    def __init__(self):
+        self.queue: queue.Queue[SeparationJob] = queue.Queue()
+        self.pending: list[SeparationJob] = []
+
+    def submit(self, job: SeparationJob) -> int:
+        self.queue.put(job)
+        return self.get_queue_depth()
+
+    def get_queue_depth(self) -> int:
+        return self.queue.qsize() + len(self.pending)
+
+    def collect(self) -> list[SeparationJob]:
+        if not self.pending:
+            self.pending.append(self.queue.get())
+        deadline = time.perf_counter() + config.separation.batch_window
+        while len(self.pending) < config.separation.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                self.pending.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        batch = [self.pending[0]]
+        shortest = longest = batch[0].length
+        for job in self.pending[1:]:
+            if len(batch) >= config.separation.max_batch_size:
+                break
+            low, high = min(shortest, job.length), max(longest, job.length)
+            if high <= low * config.separation.max_pad_ratio:
+                batch.append(job)
+                shortest, longest = low, high
+        self.pending = [job for job in self.pending if job not in batch]
+        return batch
+
+    def separate(self, batch: list[SeparationJob]) -> None:
+        length = max(job.length for job in batch)
+        mix = torch.stack([F.pad(job.wav, (0, length - job.length)) for job in batch])
+        started = time.perf_counter()
+        sources = apply_model(
+            model, mix, device=device,
+            shifts=config.separation.shifts, split=True, overlap=config.separation.overlap,
+            progress=False, num_workers=4
+        )
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"Separated batch of {len(batch)} tracks ({length / model.samplerate:.1f}s padded) "
+            f"in {elapsed:.3f}s, {self.get_queue_depth()} waiting"
+        )
+        for job, job_sources in zip(batch, sources):
+            job.sources = job_sources[..., :job.length]
+            job.stats.update({
+                "batch_size": len(batch),
+                "queue_wait": started - job.queued_at,
+                "separation": elapsed
+            })
+
+    def run(self) -> None:
+        while True:
+            batch = self.collect()
+            try:
+                self.separate(batch)
+            except Exception as e:
+                logger.error(f"Failed to separate batch of {len(batch)} tracks: {e}", exc_info=True)
+                for job in batch:
+                    job.error = str(e)
+            finally:
+                stats.add_batch(batch)
+                for job in batch:
+                    job.done.set()
+
+batcher = Batcher()
+
+def save_stems(job: SeparationJob, output_dir: str) -> tuple[str, str]:
+    """
+    Writes the vocals and the sum of all other stems as mp3 files.
+    """
+    if job.sources is None:
+        raise RuntimeError('Track is not separated')
+    sources = list(job.sources * job.std + job.mean)
+    vocal_tensor = sources.pop(model.sources.index('vocals'))
+    # Warning : after poping the stem, selected stem is no longer in the list 'sources'
+    instr_tensor = torch.zeros_like(sources[0])
+    for i in sources:
+        instr_tensor += i
+
+    kwargs = {
+        'samplerate': model.samplerate,
+        'bitrate': 320,
+        'clip': 'rescale',
+        'as_float': False,
+        'bits_per_sample': 16
+    }
+    os.makedirs(output_dir, exist_ok=True)
+    vocal_stem_filepath = os.path.join(output_dir, 'vocals.mp3')
+    instrumental_stem_filepath = os.path.join(output_dir, 'instrumental.mp3')
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [
+            executor.submit(save_audio, vocal_tensor, vocal_stem_filepath, preset=9, **kwargs),
+            executor.submit(save_audio, instr_tensor, instrumental_stem_filepath, preset=5, **kwargs)
+        ]
+    for future in futures:
+        future.result()
+    return vocal_stem_filepath, instrumental_stem_filepath
+
+def separate(audio_path: str, output_dir: str) -> dict:
+    """
+    Separate the audio into vocals and instrumental stems.
+    Decoding and encoding run in the calling thread, only the model
+    inference goes through the shared batch queue.
+
+    Output:
+        - vocals_path (str): Path to the separated vocals audio file.
+        - instrumental_path (str): Path to the separated instrumental audio file.
+        - stats (dict): Queue depth, batch size and timings of this track.
+    """
+    received_at = time.perf_counter()
+    wav = load_track(audio_path, model.audio_channels, model.samplerate)
+    ref = wav.mean(0)
+    mean, std = ref.mean().item(), ref.std().item()
+    job = SeparationJob(wav=(wav - mean) / std, mean=mean, std=std)
+    job.stats["decode"] = job.queued_at - received_at
+    job.stats["queue_depth"] = batcher.submit(job)
+    logger.info(f"Queued {audio_path}, {job.stats['queue_depth']} waiting")
+
+    job.done.wait()
+    failed = job.error is not None
+    try:
+        if failed:
+            raise RuntimeError(job.error)
+        saving_started = time.perf_counter()
+        vocal_path, instrumental_path = save_stems(job, output_dir)
+        job.stats["encode"] = time.perf_counter() - saving_started
+    finally:
+        job.stats["latency"] = time.perf_counter() - received_at
+        stats.add_track(job.stats["latency"], failed)
+        logger.info(f"Finished {audio_path}: {job.stats}")
+
+    return {
+        "vocals_path": vocal_path,
+        "instrumental_path": instrumental_path,
+        "stats": job.stats
+    }
+
+class SeparationRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self) -> None:
+        logger.info(f"Connected to {self.client_address}")
+        try:
+            data = recv_message(self.request)
+            if data.get("command") == "stats":
+                result = stats.to_dict()
+            else:
+                result = separate(data["audio_path"], data["output_dir"])
+        except Exception as e:
+            logger.error(f"Error: {e}", exc_info=True)
+            result = {"error": str(e)}
+        send_message(self.request, result)
+
+class SeparationServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+threading.Thread(target=batcher.run, name="batcher", daemon=True).start()
+
+with SeparationServer(("0.0.0.0", config.separation.port), SeparationRequestHandler) as server:
+    logger.info("GPU separation worker started")
+    server.serve_forever()
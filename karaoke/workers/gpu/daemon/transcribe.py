@@ -1,11 +1,23 @@
 import os
 import json
+import time
+import queue
+import select
 import socket
+import subprocess
+import socketserver
+import threading
 import logging
 import logging.config
+import numpy as np
 import torch
 import stable_whisper
+
+from whisper.audio import load_audio, SAMPLE_RATE
+from collections import deque
+from dataclasses import dataclass, field
 from config import config
+from protocol import send_message, recv_message, recv_frame
 
 logging.config.dictConfig({
             "version": 1,
@@ -30,14 +42,8 @@ logging.config.dictConfig({
 
 logger = logging.getLogger("transcribe")
 
-server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-server.bind(("0.0.0.0", 5000))
-server.listen(1)
-
-logger.info("GPU transcription worker started")
-
 logger.info("Loading whisper model")
-        
+
 if torch.cuda.is_available():
     model_name = config.transcription.gpu_model
 else:
@@ -48,70 +54,320 @@ model = stable_whisper.load_model(
 )
 logger.info("Whisper model loaded")
 
-def transcribe(vocal_path: str, vad_segments_path: str, lyrics: str) -> None:
+class QueueFull(Exception):
+    pass
+
+class Cancelled(Exception):
+    pass
+
+TERMINAL_FRAMES = ("result", "error")
+# Segments per frame when streaming a completed alignment
+STREAM_BATCH_SIZE = 20
+
+@dataclass(eq=False)
+class TranscriptionJob:
+    """
+    A queued request. Frames for the client are put into `frames` by the
+    model thread and sent by the connection thread, ending with a result
+    or error frame.
+    """
+    vocal_path: str
+    audio: np.ndarray
+    vad_segments: list[dict]
+    lyrics: str
+    deadline: float
+    queued_at: float = field(default_factory=time.perf_counter)
+    started_at: float | None = None
+    cancel_reason: str | None = None
+    frames: queue.Queue[dict] = field(default_factory=queue.Queue)
+    last_progress_at: float = 0.0
+
+    def emit(self, frame: dict) -> None:
+        self.frames.put(frame)
+
+    def on_progress(self, current: float, total: float) -> None:
+        """
+        Progress callback of whisper, aborts a running transcription once cancelled.
+        """
+        if self.cancel_reason is not None:
+            raise Cancelled(self.cancel_reason)
+        now = time.perf_counter()
+        if now - self.last_progress_at >= config.transcription.poll_interval:
+            self.last_progress_at = now
+            self.emit({"type": "progress", "current": current, "total": total})
+
+class Scheduler:
+    """
+    Bounded FIFO queue in front of the single loaded model.
+    """
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.jobs: deque[TranscriptionJob] = deque()
+        self.condition = threading.Condition()
+
+    def submit(self, job: TranscriptionJob) -> int:
+        with self.condition:
+            if len(self.jobs) >= self.max_size:
+                raise QueueFull(f"Transcription queue is full ({self.max_size} requests)")
+            self.jobs.append(job)
+            self.condition.notify()
+            return len(self.jobs)
+
+    def position(self, job: TranscriptionJob) -> int:
+        """
+        Returns the 1-based position of a waiting job, 0 once it left the queue.
+        """
+        with self.condition:
+            try:
+                return self.jobs.index(job) + 1
+            except ValueError:
+                return 0
+
+    def size(self) -> int:
+        with self.condition:
+            return len(self.jobs)
+
+    def cancel(self, job: TranscriptionJob, reason: str) -> None:
+        job.cancel_reason = reason
+        with self.condition:
+            if job in self.jobs:
+                self.jobs.remove(job)
+                job.emit({"type": "error", "message": reason})
+
+    def next(self) -> TranscriptionJob:
+        with self.condition:
+            while not self.jobs:
+                self.condition.wait()
+            return self.jobs.popleft()
+
+    def run(self) -> None:
+        while True:
+            job = self.next()
+            job.started_at = time.perf_counter()
+            logger.info(f"Transcribing {job.vocal_path} after {job.started_at - job.queued_at:.3f}s in queue")
+            job.emit({"type": "started"})
+            try:
+                segment_count = transcribe(job)
+                job.emit({"type": "result", "segment_count": segment_count})
+            except Cancelled as e:
+                logger.info(f"Transcription of {job.vocal_path} cancelled: {e}")
+                job.emit({"type": "error", "message": str(e)})
+            except Exception as e:
+                logger.error(f"Error: {e}", exc_info=True)
+                job.emit({"type": "error", "message": str(e)})
+            finally:
+                logger.info(f"Finished {job.vocal_path} in {time.perf_counter() - job.started_at:.3f}s")
+
+scheduler = Scheduler(config.transcription.max_queue_size)
+
+def group_clips(vad_segments: list[dict]) -> list[list[float]]:
+    """
+    Groups VAD segments into clip timestamps spanning at least `stream_chunk_duration`
+    seconds each, the segments of a group are streamed once it is transcribed.
+    """
+    groups: list[list[float]] = []
+    group: list[float] = []
+    for segment in vad_segments:
+        start = float(segment['start'])
+        group += [start, start + float(segment['duration'])]
+        if group[-1] - group[0] >= config.transcription.stream_chunk_duration:
+            groups.append(group)
+            group = []
+    if group:
+        groups.append(group)
+    return groups
+
+def transcribe(job: TranscriptionJob) -> int:
     """
     Transcribe the lyrics using whisper.
     See https://github.com/openai/whisper for more details.
-    
-    Output:
-        - transcription (Word[]): List of words with their start and end times.
-    
+
+    Segments are emitted as `segments` frames while they are produced and
+    the number of segments is returned.
+
+    Segment:
+        - words (Word[]): List of words with their start and end times.
+        - no_speech_prob (float): Probability of no speech in the segment.
+
     Word:
         - start (float): Start time of the word in seconds.
         - end (float): End time of the word in seconds.
-        - text (str): The word itself.
-        - no_speech_prob (float): Probability of no speech in the corresponding segment.
+        - word (str): The word itself.
     """
     initial_prompt = config.transcription.initial_prompt
+    job.on_progress(0, 1)
 
     result = None
-    if lyrics:
+    if job.lyrics:
         logger.info("Starting transcription with lyrics")
         result = model.align(
-            vocal_path, lyrics, language="zh",
-            verbose=False
+            job.audio, job.lyrics, language="zh",
+            verbose=False,
+            progress_callback=job.on_progress
         )
-    if result is None:
-        logger.info("Starting transcription without lyrics")
-        with open(vad_segments_path) as f:
-            vad_segments = json.loads(f.read())
-        clip_timestamps = [
-            float(ts)
-            for segment in vad_segments
-            for ts in [segment['start'], segment['start'] + segment['duration']]
-        ]
+    if result is not None:
+        # Alignment only completes as a whole
+        segments = result.to_dict()['segments']
+        for i in range(0, len(segments), STREAM_BATCH_SIZE):
+            job.emit({"type": "segments", "segments": segments[i:i + STREAM_BATCH_SIZE]})
+        return len(segments)
+
+    logger.info("Starting transcription without lyrics")
+    segment_count = 0
+    # Without VAD segments the whole audio is transcribed at once
+    groups = group_clips(job.vad_segments) or [[]]
+    for index, clip_timestamps in enumerate(groups):
         result = model.transcribe(
-            vocal_path, language="zh", initial_prompt=initial_prompt, 
+            job.audio, language="zh", initial_prompt=initial_prompt,
             clip_timestamps=clip_timestamps,
             condition_on_previous_text=False,
             word_timestamps=True,
-            verbose=False
+            verbose=False,
+            progress_callback=job.on_progress
+        )
+        segments = result.to_dict()['segments']
+        segment_count += len(segments)
+        job.emit({"type": "segments", "segments": segments})
+        job.emit({"type": "progress", "current": index + 1, "total": len(groups)})
+    return segment_count
+
+def decode_audio(data: bytearray) -> np.ndarray:
+    """
+    Decodes an audio file received in memory to 16 kHz mono samples.
+    """
+    process = subprocess.run(
+        ["ffmpeg", "-nostdin", "-threads", "0", "-i", "pipe:0",
+         "-f", "f32le", "-ac", "1", "-ar", str(SAMPLE_RATE), "pipe:1"],
+        input=data, capture_output=True, check=True
+    )
+    return np.frombuffer(process.stdout, np.float32)
+
+def load_request_audio(data: dict, payload: bytearray | None) -> tuple[np.ndarray, list[dict]]:
+    """
+    Loads the audio and VAD segments of a request in one of the transfer modes:
+        - path: Files on a filesystem shared with the client.
+        - file: The encoded audio file is sent as payload, segments inline.
+        - pcm: 16 kHz mono float32 samples are sent as payload, segments inline.
+    """
+    transfer = data.get("transfer", "path")
+    if transfer == "path":
+        with open(data["vad_segments_path"]) as f:
+            vad_segments = json.loads(f.read())
+        return load_audio(data["vocal_path"]), vad_segments
+    if payload is None:
+        raise ValueError(f"Missing audio payload for {transfer} transfer")
+    if transfer == "file":
+        return decode_audio(payload), data["vad_segments"]
+    if transfer == "pcm":
+        # Zero-copy view of the received buffer
+        return np.frombuffer(payload, np.float32), data["vad_segments"]
+    raise ValueError(f"Unknown transfer mode {transfer}")
+
+def is_cancelled_by_client(conn: socket.socket) -> bool:
+    """
+    Checks without blocking whether the client sent a cancel message or disconnected.
+    """
+    readable, _, _ = select.select([conn], [], [], 0)
+    if not readable:
+        return False
+    if not conn.recv(1, socket.MSG_PEEK):
+        return True
+    return recv_message(conn).get("type") == "cancel"
+
+class TranscriptionRequestHandler(socketserver.BaseRequestHandler):
+    """
+    Streams the frames of a queued request to its client.
+
+    Every frame carries the `id` of the request:
+        - {"type": "received", "bytes": int, "receive": float, "decode": float}
+        - {"type": "queued", "position": int, "queue_size": int}
+        - {"type": "started"}
+        - {"type": "progress", "current": float, "total": float}
+        - {"type": "segments", "segments": Segment[]}
+        - {"type": "result", "segment_count": int}
+        - {"type": "error", "message": str}
+    """
+    def handle(self) -> None:
+        conn: socket.socket = self.request
+        logger.info(f"Connected to {self.client_address}")
+        self.request_id = None
+        try:
+            started = time.perf_counter()
+            data, payload = recv_frame(conn)
+            received = time.perf_counter()
+            self.request_id = data.get("id")
+            logger.info(f"Received request {self.request_id}: {json.dumps(list(data.keys()), indent=4)}")
+            audio, vad_segments = load_request_audio(data, payload)
+            decoded = time.perf_counter()
+        except (OSError, ValueError, KeyError, subprocess.CalledProcessError) as e:
+            logger.warning(f"Rejected request of {self.client_address}: {e}")
+            try:
+                self.send({"type": "error", "message": str(e)})
+            except OSError:
+                pass
+            return
+        transfer_stats = {
+            "bytes": len(payload) if payload is not None else 0,
+            "receive": received - started,
+            "decode": decoded - received
+        }
+        logger.info(f"Loaded audio of request {self.request_id} ({data.get('transfer', 'path')}): {transfer_stats}")
+        self.send({"type": "received", **transfer_stats})
+
+        timeout = min(float(data.get("timeout") or config.transcription.request_timeout),
+                      config.transcription.request_timeout)
+        job = TranscriptionJob(
+            vocal_path=data["vocal_path"],
+            audio=audio,
+            vad_segments=vad_segments,
+            lyrics=data["lyrics"],
+            deadline=time.perf_counter() + timeout
         )
-    result = result.to_dict()
-    return result
-
-while True:
-    conn, addr = server.accept()
-    try:
-        logger.info(f"Connected to {addr}")
-
-        data_len = conn.recv(4)
-        data_len = int.from_bytes(data_len, "big")
-        logger.info(f"Received data length: {data_len}")
-        data = conn.recv(data_len)
-        data = data.decode("utf-8")
-        data = json.loads(data)
-        logger.info(f"Received data: {json.dumps(list(data.keys()), indent=4)}")
-        vocal_path = data["vocal_path"]
-        lyrics = data["lyrics"]
-        vad_segments_path = data["vad_segments_path"]
-        
-        result = transcribe(vocal_path, vad_segments_path, lyrics)
-
-        send_data = json.dumps(result).encode("utf-8")
-        conn.sendall(len(send_data).to_bytes(4, "big"))
-        conn.sendall(send_data)
-    except Exception as e:
-        logger.error(f"Error: {e}")
-    finally:
-        conn.close()
\ No newline at end of file
+        try:
+            scheduler.submit(job)
+        except QueueFull as e:
+            logger.warning(str(e))
+            self.send({"type": "error", "message": str(e)})
+            return
+
+        try:
+            self.stream(job, timeout)
+        except OSError as e:
+            logger.warning(f"Lost connection of request {self.request_id}: {e}")
+            scheduler.cancel(job, f"Client connection lost: {e}")
+
+    def send(self, frame: dict) -> None:
+        send_message(self.request, {**frame, "id": self.request_id})
+
+    def stream(self, job: TranscriptionJob, timeout: float) -> None:
+        position = None
+        while True:
+            current = scheduler.position(job)
+            if current and current != position:
+                position = current
+                self.send({"type": "queued", "position": position, "queue_size": scheduler.size()})
+            # Checked between frames too, so steady progress cannot outlive the deadline
+            # or the client; once cancelled, wait for the model thread to stop
+            if job.cancel_reason is None:
+                if time.perf_counter() > job.deadline:
+                    scheduler.cancel(job, f"Timed out after {timeout}s")
+                elif is_cancelled_by_client(self.request):
+                    scheduler.cancel(job, "Cancelled by client")
+            try:
+                frame = job.frames.get(timeout=config.transcription.poll_interval)
+            except queue.Empty:
+                continue
+            self.send(frame)
+            if frame["type"] in TERMINAL_FRAMES:
+                return
+
+class TranscriptionServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+if __name__ == "__main__":
+    threading.Thread(target=scheduler.run, name="scheduler", daemon=True).start()
+
+    with TranscriptionServer(("0.0.0.0", config.transcription.port), TranscriptionRequestHandler) as server:
+        logger.info("GPU transcription worker started")
+        server.serve_forever()
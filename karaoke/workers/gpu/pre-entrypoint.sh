@@ -5,4 +5,10 @@ echo "Running daemon..."
 
 python /app/daemon/transcribe.py &
 
+python /app/daemon/separate.py &
+
+echo "Running task worker..."
+
+PYTHONPATH=/opt/airflow/dags python -m tasks.worker --preload separate transcript &
+
 exec "$@"
\ No newline at end of file
@@ -11,7 +11,10 @@ export default function ProgressTab() {
     <table className="table table-striped table-hover text-center" style={{ tableLayout: 'fixed' }}>
       <tbody>
         {
-          Object.values(jobs).map((job) => (
+          Object.values(jobs)
+            // Jobs arrive in the order they are ready, show the newest first
+            .sort((a, b) => b.created_at.localeCompare(a.created_at))
+            .map((job) => (
             <tr key={job.jid}>
               <td>
                 <div className='d-flex align-items-center'>
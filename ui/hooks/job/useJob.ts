@@ -3,6 +3,10 @@ import { io, Socket } from 'socket.io-client';
 import { JobInfo } from '@/models/JobInfo';
 import { TaskInfo } from '@/models/TaskInfo';
 
+// Updates emitted from webhooks only carry the changed fields and a version
+// which increases by one for every update of a job
+type Versioned<T> = Partial<T> & { version?: number; partial?: boolean };
+
 export const useJob = (jobId: string | null, fetchTask: boolean) => {
     const [jobs, setJobs] = useState<{ [key: string]: JobInfo }>({});
     const [rawTasks, setRawTasks] = useState<Record<string, Record<string, TaskInfo>>>({});
@@ -28,6 +32,8 @@ export const useJob = (jobId: string | null, fetchTask: boolean) => {
     }, [jobs, rawTasks]);
 
     const socketRef = useRef<Socket | null>(null);
+    const versionsRef = useRef<Record<string, number>>({});
+    const resyncingRef = useRef<Set<string>>(new Set());
 
     useEffect(() => {
         if (!jobId) return;
@@ -44,24 +50,56 @@ export const useJob = (jobId: string | null, fetchTask: boolean) => {
                 socket.emit('join_task', jobId);
         });
 
-        socket.on('update_job', (data: Partial<JobInfo>) => {
-            const job = new JobInfo();
-            job.applyUpdate(data);
-            if (job.jid == jobId)
+        const resync = (jid: string) => {
+            if (resyncingRef.current.has(jid))
+                return;
+            resyncingRef.current.add(jid);
+            socket.emit('sync_job', jid);
+            if (fetchTask)
+                socket.emit('sync_task', jid);
+        };
+
+        socket.on('update_job', ({ version = 0, partial = false, ...data }: Versioned<JobInfo>) => {
+            const jid = data.jid ?? '';
+            const lastVersion = versionsRef.current[jid];
+            if (partial) {
+                if (lastVersion === undefined || version > lastVersion + 1) {
+                    // Missed an update, fetch the full state again
+                    resync(jid);
+                    return;
+                }
+                if (version <= lastVersion)
+                    return;
+            } else {
+                resyncingRef.current.delete(jid);
+            }
+            versionsRef.current[jid] = version;
+
+            setJobs((prevJobs) => {
+                const job = new JobInfo();
+                if (partial)
+                    Object.assign(job, prevJobs[jid]);
+                job.applyUpdate(data);
+                return { ...prevJobs, [jid]: job };
+            });
+            if (jid == jobId)
                 setIsLoading(false);
-            setJobs((prevJobs) => ({ ...prevJobs, [job.jid]: job }));
         });
 
-        socket.on('update_task', (data: Partial<TaskInfo>) => {
-            const newTask = new TaskInfo();
-            newTask.applyUpdate(data);
-
+        // Tasks share the version of their job, gaps are detected from job updates
+        socket.on('update_task', ({ version, partial = false, ...data }: Versioned<TaskInfo>) => {
             setRawTasks(prevTasks => {
+                const jid = data.jid ?? '';
+                const tid = data.tid ?? '';
+                const newTask = new TaskInfo();
+                if (partial)
+                    Object.assign(newTask, prevTasks[jid]?.[tid]);
+                newTask.applyUpdate(data);
                 return {
                     ...prevTasks,
-                    [newTask.jid]: {
-                        ...(prevTasks[newTask.jid] || {}),
-                        [newTask.tid]: newTask
+                    [jid]: {
+                        ...(prevTasks[jid] || {}),
+                        [tid]: newTask
                     }
                 }
             });
@@ -82,6 +120,8 @@ export const useJob = (jobId: string | null, fetchTask: boolean) => {
             socket.off('updated_job');
             socket.disconnect();
             socketRef.current = null;
+            versionsRef.current = {};
+            resyncingRef.current.clear();
             setJobs({});
         };
     }, [jobId]);
@@ -91,6 +131,8 @@ export const useJob = (jobId: string | null, fetchTask: boolean) => {
         setJobs({});
         setRawTasks({});
         setError(null);
+        versionsRef.current = {};
+        resyncingRef.current.clear();
 
         if (socketRef.current) {
             if (!socketRef.current.connected) {
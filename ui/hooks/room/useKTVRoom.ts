@@ -2,12 +2,39 @@ import KareokeRoomModel from '@/models/KareokeRoomModel';
 import { useEffect, useState, useRef, useCallback } from 'react';
 import { io, Socket } from 'socket.io-client';
 import useRoomNavigation from '../route/useRoomParams';
-import { ActionResponse, SocketUpdate } from "@/types/updates/room";
+import { ActionResponse, PlaylistChange, SocketUpdate } from "@/types/updates/room";
 
 
+const applyPlaylistChange = (playlist: PlaylistRecord[], data: PlaylistChange) => {
+    if (data.action == 'added') {
+        playlist.push({
+            id: data.item.item_id,
+            item: data.item
+        });
+    } else if (data.action == 'cleared_to') {
+        const index = playlist.findIndex(p => p.id === data.item_id);
+        if (index !== -1) {
+            playlist.splice(0, index + 1);
+        }
+    } else if (data.action == 'moved_to_top') {
+        const index = playlist.findIndex(p => p.id === data.item_id);
+        if (index !== -1) {
+            const [item] = playlist.splice(index, 1);
+            playlist.unshift(item);
+        }
+    } else if (data.action == 'removed') {
+        const index = playlist.findIndex(p => p.id === data.item_id);
+        if (index !== -1) {
+            playlist.splice(index, 1);
+        }
+    }
+};
+
 export const useKTVRoom = () => {
     const { roomID, navigateToRoom } = useRoomNavigation();
     const [roomModel, setRoomModel] = useState<KareokeRoomModel | null>(null);
+    // Last applied version, the server only replays the updates after it on reconnect
+    const versionRef = useRef<number | null>(null);
 
     useEffect(() => {
         const socket: Socket = io('/ktv', {
@@ -16,7 +43,7 @@ export const useKTVRoom = () => {
         });
 
         socket.on('connect', () => {
-            socket.emit('join', roomID);
+            socket.emit('join', roomID, versionRef.current);
         });
 
         socket.on('connect_error', (err) => {
@@ -25,15 +52,27 @@ export const useKTVRoom = () => {
 
         socket.on('error', (data: { message: string; }) => {
             console.log(data.message);
+            versionRef.current = null;
             setRoomModel(null);
             socket.emit('sync', roomID);
         })
 
+        // Keeps the current model and asks for the updates it missed
+        const catchUp = (prev: KareokeRoomModel, version: number) => {
+            if (version > prev.version + 1) {
+                console.warn(`Version mismatch! Expected ${prev.version + 1}, got ${version}. Syncing...`);
+                socket.emit('sync', roomID, prev.version);
+            }
+            // Older versions were already applied
+            return prev;
+        };
+
         socket.on('update', (data: SocketUpdate) => {
             if (data.target == 'sync') {
                 const model = new KareokeRoomModel(socket);
                 model.applyUpdate(data.version, data.item);
                 if (model.room_name == roomID) {
+                    versionRef.current = model.version;
                     setRoomModel(model)
                 } else {
                     navigateToRoom(model.room_name);
@@ -42,51 +81,51 @@ export const useKTVRoom = () => {
                 setRoomModel((prev) => {
                     if (!prev) return null;
                     if (data.version !== prev.version + 1) {
-                        console.warn(`Version mismatch! Expected ${prev.version + 1}, got ${data.version}. Syncing...`);
-                        socket.emit('sync', roomID);
-                        return null;
+                        return catchUp(prev, data.version);
                     }
                     const nextModel = new KareokeRoomModel(socket);
                     Object.assign(nextModel, prev);
                     nextModel.applyUpdate(data.version, data.changes);
+                    versionRef.current = nextModel.version;
                     return nextModel;
                 });
             } else if (data.target == 'playlist') {
                 setRoomModel((prev) => {
                     if (!prev) return null;
                     if (data.version !== prev.version + 1) {
-                        console.warn(`Version mismatch! Expected ${prev.version + 1}, got ${data.version}. Syncing...`);
-                        socket.emit('sync', roomID);
-                        return null;
+                        return catchUp(prev, data.version);
                     }
                     const nextModel = new KareokeRoomModel(socket);
                     Object.assign(nextModel, prev);
                     const playlist = [...nextModel.playlist];
-                    if (data.action == 'added') {
-                        playlist.push({
-                            id: data.item.item_id,
-                            item: data.item
-                        });
-                    } else if (data.action == 'cleared_to') {
-                        const index = playlist.findIndex(p => p.id === data.item_id);
-                        if (index !== -1) {
-                            playlist.splice(0, index + 1);
-                        }
-                    } else if (data.action == 'moved_to_top') {
-                        const index = playlist.findIndex(p => p.id === data.item_id);
-                        if (index !== -1) {
-                            const [item] = playlist.splice(index, 1);
-                            playlist.unshift(item);
-                        }
-                    } else if (data.action == 'removed') {
-                        const index = playlist.findIndex(p => p.id === data.item_id);
-                        if (index !== -1) {
-                            playlist.splice(index, 1);
+                    applyPlaylistChange(playlist, data);
+                    nextModel.applyUpdate(data.version, {
+                        playlist: playlist
+                    });
+                    versionRef.current = nextModel.version;
+                    return nextModel;
+                });
+            } else if (data.target == 'batch') {
+                // Actions coalesced by the server under a single version
+                setRoomModel((prev) => {
+                    if (!prev) return null;
+                    if (data.version !== prev.version + 1) {
+                        return catchUp(prev, data.version);
+                    }
+                    const nextModel = new KareokeRoomModel(socket);
+                    Object.assign(nextModel, prev);
+                    const playlist = [...nextModel.playlist];
+                    for (const update of data.updates) {
+                        if (update.target == 'metadata') {
+                            nextModel.applyUpdate(data.version, update.changes);
+                        } else {
+                            applyPlaylistChange(playlist, update);
                         }
                     }
                     nextModel.applyUpdate(data.version, {
                         playlist: playlist
                     });
+                    versionRef.current = nextModel.version;
                     return nextModel;
                 });
             }
@@ -100,6 +139,7 @@ export const useKTVRoom = () => {
                     return prev;
                 });
             } else {
+                versionRef.current = null;
                 setRoomModel(null);
                 socket.emit('sync', roomID);
             }
@@ -110,6 +150,7 @@ export const useKTVRoom = () => {
             socket.off('connect');
             socket.off('update');
             socket.disconnect();
+            versionRef.current = null;
             setRoomModel(null);
         };
     }, [roomID]);
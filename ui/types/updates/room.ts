@@ -20,6 +20,14 @@ type PlaylistAddedUpdate = {
   item: PlaylistItem;
 };
 
+export type PlaylistChange = Omit<PlaylistUpdate, "version"> | Omit<PlaylistAddedUpdate, "version">;
+
+type BatchUpdate = {
+  version: number;
+  target: "batch";
+  updates: (Omit<MetadataUpdate, "version"> | PlaylistChange)[];
+};
+
 type SyncUpdate = {
   version: number;
   target: "sync";
@@ -28,7 +36,7 @@ type SyncUpdate = {
 
 export type UpdateActionType = 'UPDATE_METADATA' | 'REMOVE_SONG' | 'SKIP_TO' | 'PLAY_NEXT';
 
-export type SocketUpdate = MetadataUpdate | PlaylistUpdate | PlaylistAddedUpdate | SyncUpdate;
+export type SocketUpdate = MetadataUpdate | PlaylistUpdate | PlaylistAddedUpdate | BatchUpdate | SyncUpdate;
 
 export type ActionResponse = 
   | {